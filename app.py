@@ -1,18 +1,20 @@
+import os
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from get_data_script import (
-    login, update_basic_hero_stats, update_portfolio, update_last_trades, 
-    update_listings, update_hero_stats, update_hero_supply, update_bids, 
-    update_hero_trades, update_tournament_status, update_star_history, 
-    update_tournament_history, DATA_FOLDER
-)
-from data_compiler import compile_data
-import glob
-import os
-import feedparser
+import numpy as np
+from get_data_script import UPDATE_JOBS, DATA_FOLDER
+from data_compiler import compile_data, VALUE_RARITIES
+from deck_optimizer import optimize_decks
+from app_data import (load_all_heroes, load_portfolio, load_tournament_standings, load_latest_file, load_score_correlation,
+                      load_tournament_window_index, load_latest_changes, load_price_volatility, load_hero_details, load_hero_candles,
+                      clear_data_cache)
+from tweet_feed import TweetFeed
+from table_view import render_table
+from job_runner import JobRunner, get_jobs_path
+from update_scheduler import UpdateJob, UpdateScheduler
+from score_chart import build_tournament_chart
+from hero_charts import build_hero_score_chart, build_candle_chart
 import streamlit.components.v1 as components
-from datetime import datetime
 
 ###########################
 # RSS Feed Parsing
@@ -20,31 +22,19 @@ from datetime import datetime
 # Set the number of initial tweets to load
 INITIAL_TWEET_COUNT = 50
 
-# RSS Feed Parsing with sorting by time
-def extract_and_sort_tweets(feed_urls):
-    tweets = []
-    for feed_url in feed_urls:
-        feed = feedparser.parse(feed_url)
-        for entry in feed.entries:
-            if "twitter.com" in entry.link or "x.com" in entry.link:
-                published_time = datetime(*entry.published_parsed[:6])
-                tweets.append({
-                    "url": entry.link,
-                    "published": published_time
-                })
-    
-    # Sort tweets by published time in descending order (latest first)
-    tweets.sort(key=lambda x: x["published"], reverse=True)
-    
-    return [tweet["url"] for tweet in tweets]
-
 # Combine and sort multiple RSS feed URLs by time
 rss_feed_urls = [
     "https://rss.app/feeds/AmeRmN5MSkkwKGXN.xml", # hk
     "https://rss.app/feeds/EDa6EjIpUa04bSdv.xml", # themolt
     "https://rss.app/feeds/9B7xDvOc7CaqUm76.xml"  #FantasyTop
 ]
-tweet_urls = extract_and_sort_tweets(rss_feed_urls)
+
+# One feed per server, refreshed in the background, so reruns never wait on rss.app
+@st.cache_resource(show_spinner=False)
+def get_tweet_feed(feed_urls):
+    return TweetFeed(feed_urls).start()
+
+tweet_urls = get_tweet_feed(tuple(rss_feed_urls)).get_tweet_urls()
 
 # Function to generate HTML for tweets
 def generate_tweet_html(tweet_urls, count=INITIAL_TWEET_COUNT):
@@ -87,13 +77,6 @@ def generate_tweet_html(tweet_urls, count=INITIAL_TWEET_COUNT):
 ###########################
 # Functions for Deck layout
 ###########################
-def load_latest_file(pattern):
-    files = glob.glob(pattern)
-    if not files:
-        return None
-    latest_file = max(files, key=os.path.getmtime)
-    return pd.read_csv(latest_file)
-
 def display_deck(deck_df):
     # Calculate the total for 'Main_Last_4_Ave'
     total_main_last_4_ave = deck_df['Main_Last_4_Ave'].sum()
@@ -110,7 +93,7 @@ def display_deck(deck_df):
         if idx < len(deck_df):  # If there's data for this column
             row = deck_df.iloc[idx]
             with cols[idx]:
-                st.image(row['picture_url'], caption=row['hero name'], width=100)
+                st.image(row['picture_url'], caption=row['hero_name'], width=100)
                 st.write(f"Stars: {row['hero_stars']}")
                 st.write(f"Rank: {row['current_rank']}")
                 st.write(f"Gliding Score: {row['gliding_score']}")
@@ -131,126 +114,65 @@ st.set_page_config(
     layout="wide"
     )
 
-# Initialize WebDriver and Token placeholders in session state
-if 'driver' not in st.session_state:
-    st.session_state.driver = None
-    st.session_state.token = None
-
-if 'is_updating' not in st.session_state:
-    st.session_state.is_updating = False
-
-# Initialize rerun key in session state
-if 'rerun_key' not in st.session_state:
-    st.session_state.rerun_key = 0
-
-# Function to update and compile data
-def run_update_and_compile(selected_updates):
-    st.session_state.is_updating = True
-    st.session_state.update_status = "Starting update and compilation..."
-
-    # Update the status message in the sidebar
-    with st.sidebar:
-        st.sidebar.info(st.session_state.update_status)
-
-    try:
-        if "Update Tournament Status" in selected_updates:
-            st.session_state.update_status = "Updating Tournament Status..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_tournament_status(st.session_state.driver, st.session_state.token)
-
-        if st.session_state.driver is None or st.session_state.token is None:
-            st.session_state.update_status = "Logging in..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            st.session_state.driver, st.session_state.token = login()
-
-        if "Update Tournament Hero History" in selected_updates:
-            st.session_state.update_status = "Updating Hero Tournament Histories..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_tournament_history(st.session_state.driver, st.session_state.token)
-
-        if "Update Basic Hero Stats" in selected_updates:
-            st.session_state.update_status = "Updating Basic Hero Stats..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_basic_hero_stats(st.session_state.driver, st.session_state.token)
-        
-        if "Update Portfolio" in selected_updates:
-            st.session_state.update_status = "Updating Portfolio..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_portfolio(st.session_state.driver, st.session_state.token)
-        
-        if "Update Last Trades" in selected_updates:
-            st.session_state.update_status = "Updating Last Trades..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_last_trades(st.session_state.driver, st.session_state.token)
-        
-        if "Update Listings" in selected_updates:
-            st.session_state.update_status = "Updating Listings..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_listings(st.session_state.driver)
-        
-        if "Update Hero Stats" in selected_updates:
-            st.session_state.update_status = "Updating Hero Stats..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_hero_stats(st.session_state.driver, st.session_state.token)
-        
-        if "Update Hero Trades" in selected_updates:
-            st.session_state.update_status = "Updating Hero Trades..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_hero_trades(st.session_state.driver, st.session_state.token)
-        
-        if "Update Hero Supply" in selected_updates:
-            st.session_state.update_status = "Updating Hero Supply..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_hero_supply(st.session_state.driver, st.session_state.token)
-        
-        if "Update Bids" in selected_updates:
-            st.session_state.update_status = "Updating Bids..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_bids(st.session_state.driver, st.session_state.token)
-
-        if "Update Star History" in selected_updates:
-            st.session_state.update_status = "Updating Star History..."
-            with st.sidebar:
-                st.sidebar.info(st.session_state.update_status)
-            update_star_history(st.session_state.driver, st.session_state.token)
-        
-        st.session_state.update_status = "Compiling Data..."
-        with st.sidebar:
-            st.sidebar.info(st.session_state.update_status)
-        compile_data()
-
-        st.sidebar.success("Data update and compilation completed successfully!")
-
-        # Simulate rerun by updating the session state key
-        st.session_state.rerun_key = st.session_state.get('rerun_key', 0) + 1
-
-    except Exception as e:
-        st.sidebar.error(f"An error occurred: {str(e)}")
-    finally:
-        st.session_state.is_updating = False
+###########################
+# Background data updates
+###########################
+# Seconds between refreshes of the update status while a job is running
+JOB_POLL_INTERVAL = 2
+
+def compile_step(session):
+    compile_data()
+    optimize_decks(DATA_FOLDER)
+    clear_data_cache()
+
+# The update jobs of get_data_script, then a compile of whatever they downloaded
+APP_JOBS = UPDATE_JOBS + [UpdateJob("Compile Data", compile_step, after=[job.name for job in UPDATE_JOBS])]
+
+# One runner per server: jobs run in its thread, so the page stays usable and refreshing it does not stop them
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    return JobRunner(get_jobs_path(DATA_FOLDER), UpdateScheduler(APP_JOBS)).start()
+
+job_runner = get_job_runner()
+active_job = job_runner.get_active_job()
+
+# Polls the job table while a job is active and reruns the page once it finishes, to show the new data
+@st.fragment(run_every=JOB_POLL_INTERVAL if active_job else None)
+def show_update_status():
+    job = job_runner.get_active_job()
+    if job is not None:
+        st.session_state.watched_job = job['id']
+        st.info(job['message'])
+        st.progress(job['completed_steps'] / job['total_steps'], text=f"{job['completed_steps']} of {job['total_steps']} jobs done")
+        if job['status'] != 'cancelling' and st.button("Cancel Update", key=f"cancel_job_{job['id']}"):
+            job_runner.cancel(job['id'])
+            st.rerun()
+        return
+
+    job = job_runner.get_last_job()
+    if job is not None and st.session_state.get('watched_job') == job['id']:
+        st.session_state.watched_job = None
+        st.session_state.finished_job = job['id']
+        st.rerun()
+    if job is not None and st.session_state.get('finished_job') == job['id']:
+        if job['status'] == 'completed':
+            st.success("Data update and compilation completed successfully!")
+        elif job['status'] == 'cancelled':
+            st.warning("Data update cancelled.")
+        else:
+            st.error(f"An error occurred: {job['error']}")
 
 
 # Sidebar for page navigation
 st.sidebar.title("Navigation")
 
 # Show the update status at the top of the sidebar
-if st.session_state.is_updating:
-    st.sidebar.info(st.session_state.update_status)
+with st.sidebar:
+    show_update_status()
 
-page_selection = st.sidebar.selectbox("Go to", ["Portfolio Data", "All Heroes", "Tournament Scores Over Time", "Best Decks"], index=0)
+page_selection = st.sidebar.selectbox("Go to", ["Portfolio Data", "All Heroes", "Tournament Scores Over Time", "Best Decks", "What Changed", "Hero Details"], index=0)
 
-# Common CSS styling for the tables
+# Common CSS styling for the page headers
 def apply_table_styling():
     st.markdown("""
         <style>
@@ -264,174 +186,13 @@ def apply_table_styling():
             padding-bottom: 10px;
             margin-bottom: 20px; /* Added margin to prevent overlap */
         }
-                
-        .dataframe thead tr:first-child {
-            z-index: 6 !important; /* Ensure the first column is above the sticky header */
-            position: sticky;
-        }
-
-        /* Styling for the DataFrame container */
-        .dataframe-container {
-            max-height: calc(100vh - 200px); /* Adjust height dynamically */
-            overflow-y: auto;
-            overflow-x: auto; /* Allow horizontal scrolling */
-        }
-
-        /* Table styling */
-        .dataframe {
-            border-collapse: separate;
-            border-spacing: 0;
-            width: 100%;
-        }
-        .dataframe th, .dataframe td {
-            padding: 8px;
-            text-align: left;
-            border: 1px solid #ddd;
-        }
-        .dataframe th {
-            position: sticky;
-            top: 0;
-            z-index: 3; /* Ensure the header is above other elements */
-            background-color: #f1f1f1;
-            color: #333;
-        }
-
-        /* Make the first column sticky */
-        .dataframe td:first-child, .dataframe th:first-child {
-            position: sticky;
-            left: 0;
-            z-index: 5; /* Keep the first column below the header */
-            background-color: #f9f9f9; /* Ensure the sticky column has a background */
-        }
         </style>
     """, unsafe_allow_html=True)
 
 
-
-
-def apply_hover_highlight():
-    st.markdown("""
-        <style>
-        .dataframe-container {
-            position: relative;
-        }
-        .dataframe-container table {
-            border-collapse: collapse;
-            width: 100%;
-        }
-        .dataframe-container th,
-        .dataframe-container td {
-            padding: 8px;
-            border: 1px solid #ddd;
-            text-align: left;
-            white-space: nowrap;
-            overflow: hidden;
-        }
-        .dataframe-container tr:hover {
-            background-color: #f1f1f1;
-            color: #333;
-        }
-        .highlighted-cell {
-            background-color: #ffeb3b !important;
-        }
-        .highlighted-row td {
-            background-color: #f1f1f1 !important;
-            color: #333 !important;
-        }
-        .highlighted-column {
-            background-color: #ffeb3b !important;
-            color: #333 !important;
-        }
-        .highlighted-header {
-            border: 2px solid #ff5722 !important;  /* Add a border to the header cell */
-            background-color: #ffeb3b !important;
-            color: #333 !important;
-        }
-        </style>
-        <script>
-        document.addEventListener("DOMContentLoaded", function() {
-            const table = document.querySelector('.dataframe-container table');
-            const rows = table.querySelectorAll('tr');
-            let hoveredRowIndex = -1;
-            let hoveredColumnIndex = -1;
-
-            table.addEventListener('mousemove', function(e) {
-                const rect = table.getBoundingClientRect();
-                const y = e.clientY - rect.top;
-                const x = e.clientX - rect.left;
-
-                let newRowIdx = -1;
-                let newColIdx = -1;
-
-                // Detect the hovered row
-                for (let i = 1; i < rows.length; i++) {
-                    const rowRect = rows[i].getBoundingClientRect();
-                    if (y >= rowRect.top - rect.top && y <= rowRect.bottom - rect.top) {
-                        newRowIdx = i;
-                        break;
-                    }
-                }
-
-                // Detect the hovered column
-                if (newRowIdx >= 0) {
-                    const cells = rows[newRowIdx].querySelectorAll('td, th');
-                    for (let i = 0; i < cells.length; i++) {
-                        const cellRect = cells[i].getBoundingClientRect();
-                        if (x >= cellRect.left - rect.left && x <= cellRect.right - rect.left) {
-                            newColIdx = i;
-                            break;
-                        }
-                    }
-                }
-
-                // Update highlighting
-                if (newRowIdx !== hoveredRowIndex || newColIdx !== hoveredColumnIndex) {
-                    // Remove old highlights
-                    if (hoveredRowIndex >= 0) {
-                        rows[hoveredRowIndex].classList.remove('highlighted-row');
-                    }
-                    if (hoveredColumnIndex >= 0) {
-                        rows.forEach(row => row.querySelectorAll('td, th')[hoveredColumnIndex].classList.remove('highlighted-cell', 'highlighted-column'));
-                        table.querySelectorAll('th')[hoveredColumnIndex].classList.remove('highlighted-header');
-                    }
-
-                    // Add new highlights
-                    if (newRowIdx >= 0) {
-                        rows[newRowIdx].classList.add('highlighted-row');
-                    }
-                    if (newColIdx >= 0) {
-                        rows.forEach(row => row.querySelectorAll('td, th')[newColIdx].classList.add('highlighted-cell', 'highlighted-column'));
-                        table.querySelectorAll('th')[newColIdx].classList.add('highlighted-header');
-                    }
-
-                    hoveredRowIndex = newRowIdx;
-                    hoveredColumnIndex = newColIdx;
-                }
-            });
-
-            table.addEventListener('mouseleave', function() {
-                if (hoveredRowIndex >= 0) {
-                    rows[hoveredRowIndex].classList.remove('highlighted-row');
-                    hoveredRowIndex = -1;
-                }
-                if (hoveredColumnIndex >= 0) {
-                    rows.forEach(row => row.querySelectorAll('td, th')[hoveredColumnIndex].classList.remove('highlighted-cell', 'highlighted-column'));
-                    table.querySelectorAll('th')[hoveredColumnIndex].classList.remove('highlighted-header');
-                    hoveredColumnIndex = -1;
-                }
-            });
-        });
-        </script>
-    """, unsafe_allow_html=True)
-
-
-# Load your data
-all_heroes_df = pd.read_csv(DATA_FOLDER + '/allHeroData.csv', dtype={'hero_id': str})
-# Replace underscores with spaces in column headers
-all_heroes_df.columns = all_heroes_df.columns.str.replace('_', ' ')
-
-portfolio_df = pd.read_csv(DATA_FOLDER + '/portfolio.csv', dtype={'hero_id': str})
-portfolio_df.columns = portfolio_df.columns.str.replace('_', ' ')
+# Load your data (cached until the files change, with the image columns already built)
+all_heroes_df = load_all_heroes(DATA_FOLDER)
+portfolio_df = load_portfolio(DATA_FOLDER)
 
 
 ###########################
@@ -455,25 +216,14 @@ gradient_colors = {
 
 # 3. Generate CSS styles for the DataFrame rows
 def generate_css_styles(df, star_cumsum, gradient_colors):
-    styles = []
-    for i, row in df.iterrows():
-        rank = row['current rank']
-        stars = row['hero stars']
-        for star_level, cutoff in star_cumsum.items():
-            if rank <= cutoff:
-                styles.append(f'background-color: {gradient_colors[star_level]};')
-                break
-    return styles
-
-# 4. Apply styles to the DataFrame HTML
-def style_dataframe_with_gradients(df, star_cumsum, gradient_colors):
-    styles = generate_css_styles(df, star_cumsum, gradient_colors)
-    df_html = df.to_html(escape=False, index=False)
-    
-    for i, style in enumerate(styles):
-        df_html = df_html.replace('<tr>', f'<tr style="{style}">', 1)
-    
-    return df_html
+    # The cumulative cutoffs are ascending, so one searchsorted finds the first star tier that covers each rank
+    ranks = pd.to_numeric(df['current rank'], errors='coerce').to_numpy()
+    tiers = np.searchsorted(star_cumsum.to_numpy(), ranks, side='left')
+    # Ranks past the last cutoff (or missing) land on the extra empty style at the end
+    tier_styles = np.array([f'background-color: {gradient_colors[star_level]};' if star_level in gradient_colors else ''
+                            for star_level in star_cumsum.index] + [''], dtype=object)
+    return tier_styles[tiers]
+
 
 ###########################
 # End Functions for Gradient Styling
@@ -482,47 +232,31 @@ def style_dataframe_with_gradients(df, star_cumsum, gradient_colors):
 
 
 
-# Create a new column with HTML for images in both DataFrames
-def create_profile_image_links(df):
-    return df.apply(
-        lambda x: f'<a href="https://fantasy.top/hero/{x["hero handle"]}" target="_blank"><img src="{x["hero profile image url"]}" class="round-img" width="50"></a>',
-        axis=1
-    )
-
-def create_card_image_links(df):
-    return df.apply(
-        lambda x: f'<a href="https://fantasy.top/hero/{x["hero handle"]}" target="_blank"><img src="{x["picture url"]}" width="60"></a>',
-        axis=1
-    )
-
-all_heroes_df['Profile Image'] = create_profile_image_links(all_heroes_df)
-portfolio_df['Card Image'] = create_card_image_links(portfolio_df)
-
-# Drop the 'hero_profile_image_url' column as it's no longer needed
-all_heroes_df = all_heroes_df.drop(columns=['hero profile image url'])
-portfolio_df = portfolio_df.drop(columns=['hero profile image url'])
-
 # Define your column groups for all_heroes_df
 all_heroes_column_groups = {
-    'Basic Info': ['Profile Image', 'hero name', 'hero_handle'],
+    'Basic Info': ['Profile Image', 'hero name', 'Hero Page'],
     'Current Fantasy': ['current rank', 'fantasy score'],
     'Stars': ['hero stars'],
     'Supply': ['inflation degree', 'rarity1Count', 'rarity2Count', 'rarity3Count', 'rarity4Count'],
     'Social Stats': ['tweet count', 'hero followers count', 'hero fantasy score', 'hero views'],
     'Market Data': ['rarity1 lowest price', 'rarity2 lowest price', 'rarity3 lowest price', 'rarity4 lowest price'],
     'Last Trade Data': ['rarity1lastSalePrice', 'rarity2lastSalePrice', 'rarity3lastSalePrice','rarity4lastSalePrice'],
+    'Price Volatility': ['rarity1 price volatility', 'rarity2 price volatility', 'rarity3 price volatility', 'rarity4 price volatility'],
     'Tournament Averages': ['Average', 'Main Tournaments Ave', 'Main Last 4 Ave'],
     'Tournament Variances': ['Variance', 'Main Tournaments Variance', 'Main Last 4 Variance'],
     'Tournament Standard Deviations': ['Standard Deviation', 'Main Tournaments Standard Deviation', 'Main Last 4 Standard Deviation'],
     'Tournament Z-Scores': ['Z Score', 'Main Tournaments Z Score', 'Main Last 4 Z Score'],
+    'Tournament Window': ['Window Ave', 'Window Variance', 'Window Standard Deviation', 'Window Tournaments'],
     'Value Analysis Bronze':  ['Price to Performance Bronze', 'Coefficient of Variation Bronze', 'Adjusted Price to Performance Bronze', 'Market Relative Price to Perf Bronze', 'Adj Price to Performance Rank Bronze'],
-    'Value Analysis Silver':  ['Price to Performance Silver', 'Coefficient of Variation Silver', 'Adjusted Price to Performance Silver', 'Market Relative Price to Perf Silver', 'Adj Price to Performance Rank Silver']
+    'Value Analysis Silver':  ['Price to Performance Silver', 'Coefficient of Variation Silver', 'Adjusted Price to Performance Silver', 'Market Relative Price to Perf Silver', 'Adj Price to Performance Rank Silver'],
+    'Value Analysis Gold':  ['Price to Performance Gold', 'Coefficient of Variation Gold', 'Adjusted Price to Performance Gold', 'Market Relative Price to Perf Gold', 'Adj Price to Performance Rank Gold'],
+    'Value Analysis Diamond':  ['Price to Performance Diamond', 'Coefficient of Variation Diamond', 'Adjusted Price to Performance Diamond', 'Market Relative Price to Perf Diamond', 'Adj Price to Performance Rank Diamond']
 }
 
 
 # Define your column groups for portfolio_df
 portfolio_column_groups = {
-    'Portfolio Info': ['Card Image'],
+    'Portfolio Info': ['Card Image', 'Hero Page'],
     'Current Fantasy': ['current rank', 'fantasy score', 'gliding score'],
     'Ownership': ['cards number', 'listed cards number', 'in deck'],
     'Stars': ['hero stars'],
@@ -636,10 +370,9 @@ with col_main:
 
         # Apply the table styling
         apply_table_styling()
-        apply_hover_highlight()
 
-        # Display the table with the sticky header
-        st.markdown('<div class="dataframe-container">{}</div>'.format(filtered_df.to_html(escape=False, index=False)), unsafe_allow_html=True)
+        # Display the table one page at a time
+        render_table(filtered_df, key="portfolio_table")
         
     # All Heroes Page
     elif page_selection == "All Heroes":
@@ -659,6 +392,31 @@ with col_main:
 
         # Apply filters and sorting   
         st.sidebar.subheader("Table Customisation")
+
+        # Averages over any window of main tournaments, read off the compiled prefix sums for all heroes at once
+        score_index = load_tournament_window_index(DATA_FOLDER)
+        if score_index is not None and score_index.tournaments:
+            with st.sidebar.expander("Tournament Window", expanded=False):
+                window_type = st.radio("Window", ["Last N tournaments", "Since date"], key="tournament_window_type")
+                if window_type == "Last N tournaments":
+                    n_tournaments = len(score_index.tournaments)
+                    last = st.slider("Main tournaments", min_value=1, max_value=n_tournaments, value=min(4, n_tournaments), key="tournament_window_last")
+                    window_df = score_index.window_stats(last=last)
+                else:
+                    dates = pd.to_datetime([date for date in score_index.dates if date is not None])
+                    since = st.date_input("Since", value=dates[max(len(dates) - 4, 0)], min_value=dates[0], max_value=dates[-1], key="tournament_window_since")
+                    window_df = score_index.window_stats(since=since)
+            window_df = window_df.set_index('hero_handle')
+            df = df.copy()
+            for col in ['Window_Ave', 'Window_Variance', 'Window_Standard_Deviation', 'Window_Tournaments']:
+                df[col.replace('_', ' ')] = df['hero handle'].map(window_df[col])
+
+        # Volatility of the last 30 daily closes, read off the precomputed trade candles
+        volatility_df = load_price_volatility(DATA_FOLDER)
+        if volatility_df is not None:
+            df = df.copy()
+            for col in volatility_df.columns:
+                df[col] = df['hero id'].astype(str).map(volatility_df[col])
         
         with st.sidebar.expander("Select Column Groups", expanded=False):
             selected_groups = st.multiselect(
@@ -687,13 +445,12 @@ with col_main:
         filtered_df = handle_filters_and_sorting(filtered_df, column_groups, default_sort_column, default_sort_ascending)
 
         # Apply gradient styling after filtering and sorting
-        styled_html = style_dataframe_with_gradients(filtered_df, star_cumsum, gradient_colors)
+        row_styles = generate_css_styles(filtered_df, star_cumsum, gradient_colors) if 'current rank' in filtered_df.columns else None
         
         apply_table_styling()
-        apply_hover_highlight()
 
-        # Display the styled table with the sticky header
-        st.markdown(f'<div class="dataframe-container">{styled_html}</div>', unsafe_allow_html=True)
+        # Display the styled table one page at a time
+        render_table(filtered_df, key="all_heroes_table", row_styles=row_styles)
 
         
 
@@ -722,76 +479,49 @@ with col_main:
                 filtered_df = filtered_df[(filtered_df['rarity4 lowest price'] >= min_price) & (filtered_df['rarity4 lowest price'] <= max_price)]
 
             with col3:
-                average_type = st.radio("Select average type for top 5", options=["Main_Tournaments_Ave", "Main_Last_4_Ave"])
+                average_type = st.radio("Select average type for top 5", options=["Main Tournaments Ave", "Main Last 4 Ave"])
 
         selected_heroes = st.sidebar.multiselect('Select Heroes to Compare', options=filtered_df['hero name'].unique())
 
-        tournament_columns = [
-            'Main 11', 'Main 10', 'Main 9', 'Main 8', 'Main 7', 'Main 6 *Sat/Sun Only*',
-            'Main 5', 'All Rarities | 22 days', 'Main 4', 'Main 3', 'Common Only ✳️ Capped 20 🌟',
-            'Rare Only 💠', 'Main 2', 'Main 1', 'Flash Tournament'
-        ]
-
         if not selected_heroes:
             top_heroes = filtered_df.nlargest(5, average_type)['hero name'].tolist()
         else:
             top_heroes = selected_heroes
 
-        long_df = filtered_df.melt(id_vars=['hero name'], value_vars=tournament_columns,
-                                var_name='Tournament', value_name='Points')
-
-        fig = go.Figure()
-
-        for hero in long_df['hero name'].unique():
-            hero_data = long_df[long_df['hero name'] == hero]
-
-            hero_customdata = filtered_df[filtered_df['hero name'] == hero][['rarity1_lowest_price', 'rarity2_lowest_price', 'rarity3_lowest_price', 'rarity4_lowest_price']].iloc[0].values
-
-            opacity = 1.0 if hero in top_heroes else 0.2
-
-            fig.add_trace(go.Scatter(
-                x=hero_data['Tournament'],
-                y=hero_data['Points'],
-                mode='lines+markers',
-                name=hero,
-                opacity=opacity,
-                hovertemplate=(
-                    '<b>%{text}</b><br>' +
-                    'Tournament: %{x}<br>' +
-                    'Points: %{y}<br>' +
-                    'Rarity 1 Price: %{customdata[0]:.3f}<br>' +
-                    'Rarity 2 Price: %{customdata[1]:.3f}<br>' +
-                    'Rarity 3 Price: %{customdata[2]:.3f}<br>' +
-                    'Rarity 4 Price: %{customdata[3]:.3f}<extra></extra>'
-                ),
-                customdata=[hero_customdata] * len(hero_data),
-                text=[hero] * len(hero_data)
-            ))
-
-        fig.update_layout(
-            title="Tournament Scores Over Time",
-            xaxis_title="Tournament",
-            yaxis_title="Points",
-            xaxis=dict(categoryorder="array", categoryarray=tournament_columns[::-1]),
-            legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5),
-            showlegend=True,
-            width=2000,
-            height=800
-        )
+        fig = build_tournament_chart(filtered_df, top_heroes)
 
         st.plotly_chart(fig, use_container_width=True)
 
+        # Heroes whose scores rise and fall together, over the tournaments each pair both played
+        st.subheader("Score Correlation")
+        correlation_state = load_score_correlation(DATA_FOLDER)
+        hero_names = dict(zip(all_heroes_df['hero handle'], all_heroes_df['hero name']))
+        correlated_handles = [handle for handle in correlation_state.handles if handle in hero_names]
+        if correlated_handles:
+            selected_handle = st.selectbox('Hero', options=correlated_handles, format_func=lambda handle: hero_names[handle])
+            col1, col2 = st.columns(2)
+            for col, least, label in [(col1, False, "Scores most like"), (col2, True, "Scores least like")]:
+                correlated_df = correlation_state.top_correlated(selected_handle, least=least)
+                correlated_df.insert(0, 'hero name', correlated_df['hero_handle'].map(hero_names))
+                correlated_df.columns = correlated_df.columns.str.replace('_', ' ')
+                with col:
+                    st.write(f"{label} {hero_names[selected_handle]}")
+                    st.dataframe(correlated_df, hide_index=True, use_container_width=True)
+        else:
+            st.info("No score correlations yet, compile the data to build them.")
+
 
     # Adding a new page for "Best Decks"
     if page_selection == "Best Decks":
         st.title("Best Decks")
 
-        # Load the latest silver and bronze deck files
-        silver_decks = load_latest_file('data/combined_best_decks_silver_*.csv')
-        bronze_decks = load_latest_file('data/combined_best_decks_bronze_*.csv')
+        # Load the latest silver and bronze deck files (written by the deck optimizer after each compile)
+        silver_decks = load_latest_file(os.path.join(DATA_FOLDER, 'combined_best_decks_silver_*.csv'))
+        bronze_decks = load_latest_file(os.path.join(DATA_FOLDER, 'combined_best_decks_bronze_*.csv'))
 
         # Combine silver and bronze decks into one dataframe if needed
-        combined_decks = pd.concat([silver_decks, bronze_decks])
+        deck_frames = [decks for decks in [silver_decks, bronze_decks] if decks is not None]
+        combined_decks = pd.concat(deck_frames) if deck_frames else None
 
         if combined_decks is not None:
             # Display each deck by filtering by "Deck Name"
@@ -802,9 +532,95 @@ with col_main:
         else:
             st.error("No deck data available.")
 
+    # Changes between the last two snapshots of each dataset, from the change feed written at compile time
+    if page_selection == "What Changed":
+        st.title("What Changed")
+
+        changes_df = load_latest_changes(DATA_FOLDER)
+        if changes_df is None or changes_df.empty:
+            st.info("No changes recorded yet. They appear once a dataset has been refreshed twice.")
+        else:
+            hero_names = dict(zip(all_heroes_df['hero id'].astype(str), all_heroes_df['hero name']))
+            changes_df.insert(2, 'hero name', changes_df['hero_id'].map(hero_names))
+
+            with st.expander("Filters and Sorting", expanded=True):
+                col1, col2 = st.columns(2)
+                with col1:
+                    selected_datasets = st.multiselect('Datasets', options=changes_df['dataset'].unique(), default=changes_df['dataset'].unique())
+                    changes_df = changes_df[changes_df['dataset'].isin(selected_datasets)]
+                with col2:
+                    selected_fields = st.multiselect('Fields', options=sorted(changes_df['field'].unique()))
+                    if selected_fields:
+                        changes_df = changes_df[changes_df['field'].isin(selected_fields)]
+
+            st.write(f"**{len(changes_df)}** changed values, largest moves first")
+            summary_df = changes_df.groupby(['dataset', 'snapshot', 'field']).size().rename('changes').reset_index()
+            st.dataframe(summary_df, hide_index=True)
+
+            changes_df = changes_df.reindex(changes_df['pct'].abs().sort_values(ascending=False, na_position='last').index)
+            changes_df.columns = changes_df.columns.str.replace('_', ' ')
+            render_table(changes_df, key="changes_table")
+
+    # One hero in detail, from the per-hero tables and candles written at compile time
+    if page_selection == "Hero Details":
+        st.title("Hero Details")
+
+        heroes_df = all_heroes_df.sort_values('current rank')
+        hero_names = dict(zip(heroes_df['hero handle'], heroes_df['hero name']))
+        selected_handle = st.selectbox('Hero', options=list(hero_names), format_func=lambda handle: hero_names[handle], key="hero_details_hero")
+        hero = heroes_df[heroes_df['hero handle'] == selected_handle].iloc[0]
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Current Rank", f"{hero['current rank']:.0f}")
+        col2.metric("Fantasy Score", f"{hero['fantasy score']:.2f}")
+        col3.metric("Stars", f"{hero['hero stars']:.0f}")
+        col4.markdown(f"[Hero Page]({hero['Hero Page']})")
+
+        details = load_hero_details(DATA_FOLDER, int(hero['hero key']))
+        if details is None:
+            st.info("No hero history yet, compile the data to build it.")
+        else:
+            st.subheader("Tournament Results")
+            results_df = details['tournaments']
+            if results_df.empty:
+                st.info(f"{hero['hero name']} has no tournament results yet.")
+            else:
+                st.plotly_chart(build_hero_score_chart(results_df, hero['hero name']), use_container_width=True)
+                results_df = results_df.drop(columns=['hero_key']).iloc[::-1]
+                results_df.columns = results_df.columns.str.replace('_', ' ')
+                st.dataframe(results_df, hide_index=True, use_container_width=True)
+
+            st.subheader("Supply and Listings")
+            supply = details['supply'].iloc[0] if not details['supply'].empty else pd.Series(dtype=object)
+            listings = details['listings'].iloc[0] if not details['listings'].empty else pd.Series(dtype=object)
+            volatility_df = load_price_volatility(DATA_FOLDER)
+            rarities = sorted(VALUE_RARITIES)
+            market_df = pd.DataFrame({
+                'Rarity': [VALUE_RARITIES[rarity] for rarity in rarities],
+                'Supply': [supply.get(f'rarity{rarity}Count') for rarity in rarities],
+                'Lowest Price': [listings.get(f'rarity{rarity}_lowest_price') for rarity in rarities],
+                'Listed': [listings.get(f'rarity{rarity}_order_count') for rarity in rarities],
+                'Last Sale Price': [hero.get(f'rarity{rarity}lastSalePrice') for rarity in rarities],
+                'Price Volatility': [volatility_df[f'rarity{rarity} price volatility'].get(str(hero['hero id'])) if volatility_df is not None else None for rarity in rarities],
+            })
+            st.dataframe(market_df, hide_index=True, use_container_width=True)
+
+        st.subheader("Trade Candles")
+        col1, col2 = st.columns(2)
+        with col1:
+            resolution = st.radio("Resolution", ['1h', '1d', '1w'], index=1, horizontal=True, key="hero_details_resolution")
+        with col2:
+            rarity = st.selectbox("Rarity", options=sorted(VALUE_RARITIES, reverse=True), format_func=VALUE_RARITIES.get, key="hero_details_rarity")
+        candles_df = load_hero_candles(DATA_FOLDER, resolution, hero['hero id'])
+        candles_df = candles_df[candles_df['rarity'] == rarity] if candles_df is not None else None
+        if candles_df is None or candles_df.empty:
+            st.info(f"No {VALUE_RARITIES[rarity]} trades of {hero['hero name']} yet.")
+        else:
+            st.plotly_chart(build_candle_chart(candles_df, f"{hero['hero name']} {VALUE_RARITIES[rarity]} ({resolution})"), use_container_width=True)
+
 
 # Load your CSV data into a DataFrame
-tournament_status_df = pd.read_csv(DATA_FOLDER + '/current_tournament_standings.csv')
+tournament_status_df = load_tournament_standings(DATA_FOLDER)
 
 if 'Description' in tournament_status_df.columns:
     # Group by the 'Description' (which appears to be the competition name)
@@ -854,8 +670,8 @@ selected_updates = st.sidebar.multiselect(
 )
 
 # Update button
-if st.sidebar.button("Update and Compile Data"):
-    if not st.session_state.is_updating:
-        run_update_and_compile(selected_updates)
+if st.sidebar.button("Update and Compile Data", disabled=active_job is not None):
+    if job_runner.submit(selected_updates + ["Compile Data"]) is not None:
+        st.rerun()
     else:
         st.warning("An update is already in progress.")
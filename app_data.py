@@ -0,0 +1,167 @@
+import os
+import glob
+import pandas as pd
+import streamlit as st
+from score_correlation import get_score_correlation_path, load_score_correlation_state
+from score_index import get_score_index_path, load_score_index
+from snapshot_diff import DIFF_DATASETS, get_changes_folder, get_snapshot_files
+from trade_candles import get_candle_path, price_volatility
+from hero_history import HeroRows, get_hero_history_path, load_hero_history
+
+# Cached data access for the Streamlit app. Every loader takes the file's version (mtime and size) as part
+# of its cache key, so a file rewritten by compile_data is re-read on the next run and any other rerun reuses
+# the parsed and prepared frame. st.cache_data hands each caller its own copy, so the cached frames stay intact.
+
+
+def get_file_version(file_path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def create_hero_page_links(df):
+    return 'https://fantasy.top/hero/' + df['hero handle'].astype(str)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def read_csv_cached(file_path, file_version, **read_csv_kwargs):
+    return pd.read_csv(file_path, **read_csv_kwargs)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def prepare_compiled_csv(file_path, file_version, image_column, image_source):
+    """Reads a compiled CSV, replaces underscores in the headers and adds the image and hero page URL columns."""
+    df = pd.read_csv(file_path, dtype={'hero_id': str})
+    # Replace underscores with spaces in column headers
+    df.columns = df.columns.str.replace('_', ' ')
+    # Plain URLs, shown by the table as native image and link columns
+    df[image_column] = df[image_source]
+    df['Hero Page'] = create_hero_page_links(df)
+    return df.drop(columns=['hero profile image url'])
+
+
+def load_all_heroes(data_folder):
+    file_path = os.path.join(data_folder, 'allHeroData.csv')
+    return prepare_compiled_csv(file_path, get_file_version(file_path), 'Profile Image', 'hero profile image url')
+
+
+def load_portfolio(data_folder):
+    file_path = os.path.join(data_folder, 'portfolio.csv')
+    return prepare_compiled_csv(file_path, get_file_version(file_path), 'Card Image', 'picture url')
+
+
+def load_tournament_standings(data_folder):
+    file_path = os.path.join(data_folder, 'current_tournament_standings.csv')
+    return read_csv_cached(file_path, get_file_version(file_path))
+
+
+def load_latest_file(pattern):
+    files = glob.glob(pattern)
+    if not files:
+        return None
+    latest_file = max(files, key=os.path.getmtime)
+    return read_csv_cached(latest_file, get_file_version(latest_file))
+
+
+# The state is only read from, so one shared copy per file version is enough
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_score_correlation_cached(file_path, file_version):
+    return load_score_correlation_state(file_path)
+
+
+def load_score_correlation(data_folder):
+    file_path = get_score_correlation_path(data_folder)
+    return load_score_correlation_cached(file_path, get_file_version(file_path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_score_index_cached(file_path, file_version):
+    return load_score_index(file_path)
+
+
+def load_tournament_window_index(data_folder):
+    file_path = get_score_index_path(data_folder)
+    return load_score_index_cached(file_path, get_file_version(file_path))
+
+
+def load_latest_changes(data_folder):
+    """The latest change feed of every dataset combined, or None if nothing has been diffed yet."""
+    frames = []
+    for dataset in DIFF_DATASETS:
+        files = get_snapshot_files(get_changes_folder(data_folder), dataset)
+        if files:
+            file_path = files[-1][1]
+            frames.append(read_csv_cached(file_path, get_file_version(file_path), dtype={'hero_id': str, 'key': str, 'snapshot': str}))
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def read_candle_file(file_path):
+    """Reads a candle file, or returns None if it cannot be read (e.g. no Parquet engine installed)."""
+    try:
+        return pd.read_parquet(file_path)
+    except Exception as e:
+        print(f"Could not read trade candles {file_path}: {e}")
+        return None
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_price_volatility_cached(file_path, file_version):
+    candles = read_candle_file(file_path)
+    if candles is None:
+        return None
+    volatility = price_volatility(candles, resolution='1d')
+    volatility = volatility.pivot(index='hero_id', columns='rarity', values='Price_Volatility').reindex(columns=[1, 2, 3, 4])
+    volatility.columns = [f'rarity{rarity} price volatility' for rarity in volatility.columns]
+    return volatility
+
+
+def load_price_volatility(data_folder):
+    """Volatility of every hero's daily closes by rarity (indexed by hero_id), or None if there are no candles yet."""
+    file_path = get_candle_path(data_folder, '1d')
+    file_version = get_file_version(file_path)
+    if file_version is None:
+        return None
+    return load_price_volatility_cached(file_path, file_version)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_hero_history_cached(file_path, file_version):
+    return load_hero_history(file_path)
+
+
+def load_hero_details(data_folder, hero_key):
+    """Tournament results, supply and listings rows of one hero, or None before the first compile."""
+    file_path = get_hero_history_path(data_folder)
+    history = load_hero_history_cached(file_path, get_file_version(file_path))
+    return history.hero(hero_key) if history is not None else None
+
+
+# The candles are grouped by hero once per file version, so each hero's bars are a slice
+@st.cache_resource(show_spinner=False, max_entries=3)
+def load_candle_rows_cached(file_path, file_version):
+    candles = read_candle_file(file_path)
+    return HeroRows(candles, 'hero_id') if candles is not None else None
+
+
+def load_hero_candles(data_folder, resolution, hero_id):
+    """One hero's trade candles at a resolution (oldest first), or None if there are none yet."""
+    file_path = get_candle_path(data_folder, resolution)
+    file_version = get_file_version(file_path)
+    if file_version is None:
+        return None
+    candle_rows = load_candle_rows_cached(file_path, file_version)
+    return candle_rows.get(str(hero_id)) if candle_rows is not None else None
+
+
+def clear_data_cache():
+    """Drops every cached frame, e.g. after compile_data has written new outputs."""
+    read_csv_cached.clear()
+    prepare_compiled_csv.clear()
+    load_score_correlation_cached.clear()
+    load_score_index_cached.clear()
+    load_price_volatility_cached.clear()
+    load_hero_history_cached.clear()
+    load_candle_rows_cached.clear()
@@ -0,0 +1,262 @@
+import os
+import hashlib
+import inspect
+import pickle
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+
+# Content hashes keyed by (path, mtime, size), so unchanged files are only hashed once per process
+_FILE_HASHES = {}
+# Stage outputs keyed by stage name, kept for the lifetime of the process (e.g. the Streamlit server)
+_STAGE_CACHE = {}
+
+
+def hash_file(file_path):
+    """Returns the SHA-1 of a file's contents."""
+    stat = os.stat(file_path)
+    memo_key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _FILE_HASHES:
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        _FILE_HASHES[memo_key] = digest.hexdigest()
+    return _FILE_HASHES[memo_key]
+
+
+def encode_output(value, path):
+    """Prepares a stage output for another process.
+
+    DataFrames are written to an Arrow IPC file at path and passed by file name, so the
+    receiving process memory-maps them instead of unpickling a copy through a pipe.
+    Anything else (and frames Arrow cannot represent) is passed as-is and pickled.
+    """
+    if isinstance(value, pd.DataFrame):
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(value, preserve_index=True)
+            with pa.OSFile(path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            return ('arrow', path)
+        except Exception:
+            return ('value', value)
+    if isinstance(value, tuple):
+        return ('tuple', [encode_output(item, f"{path}.{i}") for i, item in enumerate(value)])
+    return ('value', value)
+
+
+def decode_output(encoded):
+    kind, payload = encoded
+    if kind == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(payload, 'r') as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    if kind == 'tuple':
+        return tuple(decode_output(item) for item in payload)
+    return payload
+
+
+def run_stage_in_worker(func, args, encoded_deps, output_path):
+    """Runs one stage in a worker process, reading its inputs from and writing its output to Arrow IPC files."""
+    output = func(*args, *[decode_output(dep) for dep in encoded_deps])
+    return encode_output(output, output_path)
+
+
+class Stage:
+    """A single step of the pipeline.
+
+    func is called as func(*args, *dep_outputs). sources are input files whose contents
+    feed the stage, and outputs are files the stage writes (it re-runs if any are missing).
+    With output_keyed, stages depending on this one are keyed on the contents of its outputs
+    instead of its key, so they only re-run when it actually writes something different.
+    """
+
+    def __init__(self, name, func, deps=(), sources=(), args=(), outputs=(), output_keyed=False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.sources = list(sources)
+        self.args = tuple(args)
+        self.outputs = list(outputs)
+        self.output_keyed = output_keyed
+
+
+class Pipeline:
+    """A DAG of stages whose outputs are cached by a hash of everything that feeds them.
+
+    A stage's key covers its own code, its arguments, the contents of its source files
+    and the keys of its dependencies, so only stages downstream of a changed input re-run.
+    Keys are worked out as stages are reached, as those downstream of an output-keyed stage
+    can only be keyed once it has run.
+    """
+
+    def __init__(self, stages, cache_dir=None):
+        self.stages = {}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise KeyError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+            self.stages[stage.name] = stage
+        self.cache_dir = cache_dir
+        self.keys = {}
+
+    def key(self, name):
+        if name not in self.keys:
+            self.keys[name] = self.stage_key(self.stages[name])
+        return self.keys[name]
+
+    def dep_key(self, name):
+        """What a dependency contributes to the keys of the stages that use it."""
+        stage = self.stages[name]
+        if stage.output_keyed:
+            return ''.join(hash_file(path) if os.path.exists(path) else '-' for path in stage.outputs)
+        return self.key(name)
+
+    def output_keyed_ancestors(self, targets):
+        """The output-keyed stages upstream of the targets, in the order they were added."""
+        seen = set()
+        stack = [dep for name in targets for dep in self.stages[name].deps]
+        while stack:
+            name = stack.pop()
+            if name not in seen:
+                seen.add(name)
+                stack.extend(self.stages[name].deps)
+        return [name for name, stage in self.stages.items() if name in seen and stage.output_keyed]
+
+    def stage_key(self, stage):
+        """Hashes the stage's code, arguments, source contents and dependency keys."""
+        digest = hashlib.sha1(stage.name.encode())
+        code_file = inspect.getsourcefile(stage.func)
+        digest.update(f"{stage.func.__module__}.{stage.func.__qualname__}".encode())
+        digest.update(hash_file(code_file).encode())
+        digest.update(repr(stage.args).encode())
+        for source in stage.sources:
+            digest.update(source.encode())
+            digest.update(hash_file(source).encode())
+        for dep in stage.deps:
+            digest.update(self.dep_key(dep).encode())
+        return digest.hexdigest()
+
+    def cache_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.pkl")
+
+    def load_cached(self, stage):
+        """Returns (True, output) if the stage's output for its current key is cached."""
+        key = self.key(stage.name)
+        if any(not os.path.exists(path) for path in stage.outputs):
+            return False, None
+
+        cached = _STAGE_CACHE.get(stage.name)
+        if cached is not None and cached[0] == key:
+            return True, cached[1]
+
+        if self.cache_dir and os.path.exists(self.cache_path(stage.name)):
+            try:
+                with open(self.cache_path(stage.name), 'rb') as file:
+                    cached = pickle.load(file)
+                if cached[0] == key:
+                    _STAGE_CACHE[stage.name] = cached
+                    return True, cached[1]
+            except Exception as e:
+                print(f"Could not load cached output for stage {stage.name}: {e}")
+        return False, None
+
+    def store(self, stage, output):
+        # A stage that returns None (e.g. a failed write) is retried on the next run
+        if output is None:
+            return
+        cached = (self.key(stage.name), output)
+        _STAGE_CACHE[stage.name] = cached
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self.cache_path(stage.name), 'wb') as file:
+                    pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                print(f"Could not write cached output for stage {stage.name}: {e}")
+
+    def run(self, targets=None, max_workers=None):
+        """Brings the target stages (default: all) up to date and returns their outputs by name.
+
+        With max_workers > 1, independent stages are run in parallel worker processes."""
+        targets = list(self.stages) if targets is None else list(targets)
+        results = {}
+
+        def resolve(name):
+            if name in results:
+                return results[name]
+            stage = self.stages[name]
+            is_cached, output = self.load_cached(stage)
+            if is_cached:
+                print(f"Stage {name}: up to date")
+            else:
+                dep_outputs = [resolve(dep) for dep in stage.deps]
+                print(f"Stage {name}: running")
+                output = stage.func(*stage.args, *dep_outputs)
+                self.store(stage, output)
+            results[name] = output
+            return output
+
+        if max_workers is not None and max_workers > 1:
+            return self.run_parallel(targets, max_workers)
+
+        # Output-keyed stages run first, so the stages after them can be keyed on what they wrote
+        for name in self.output_keyed_ancestors(targets) + targets:
+            resolve(name)
+        return {name: results[name] for name in targets}
+
+    def run_parallel(self, targets, max_workers):
+        """Like run, but independent stages run at the same time in a pool of max_workers processes."""
+        # Output-keyed stages run first, in this process, so the stages after them can be keyed on what they wrote
+        results = self.run(self.output_keyed_ancestors(targets))
+        pending = []
+
+        # Walk back from the targets, stopping at stages whose output is already cached
+        def collect(name):
+            if name in results or name in pending:
+                return
+            is_cached, output = self.load_cached(self.stages[name])
+            if is_cached:
+                print(f"Stage {name}: up to date")
+                results[name] = output
+                return
+            for dep in self.stages[name].deps:
+                collect(dep)
+            pending.append(name)
+
+        for name in targets:
+            collect(name)
+        if not pending:
+            return {name: results[name] for name in targets}
+
+        # Frames are exchanged through /dev/shm where available, so the IPC files never touch disk
+        shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        with tempfile.TemporaryDirectory(dir=shm_dir) as exchange_dir:
+            encoded = {name: encode_output(output, os.path.join(exchange_dir, f"{name}.arrow"))
+                       for name, output in results.items()
+                       if any(name in self.stages[stage].deps for stage in pending)}
+            # Spawned workers start clean instead of inheriting the threads of the caller (e.g. Streamlit)
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                running = {}
+                while pending or running:
+                    for name in [name for name in pending if all(dep in results for dep in self.stages[name].deps)]:
+                        stage = self.stages[name]
+                        print(f"Stage {name}: running")
+                        future = executor.submit(run_stage_in_worker, stage.func, stage.args,
+                                                 [encoded[dep] for dep in stage.deps],
+                                                 os.path.join(exchange_dir, f"{name}.arrow"))
+                        running[future] = name
+                        pending.remove(name)
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        encoded[name] = future.result()
+                        results[name] = decode_output(encoded[name])
+                        self.store(self.stages[name], results[name])
+
+        return {name: results[name] for name in targets}
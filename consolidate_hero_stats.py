@@ -1,66 +1,157 @@
 import pandas as pd
 import glob
 import os
+import re
+import sys
 from datetime import datetime
+from dotenv import load_dotenv
+from hero_dimension import load_hero_dimension, normalise_hero_ids, get_hero_keys, get_current_handles
 
-# Define the pattern for the files
-file_pattern = 'data/hero_stats_*.csv'  # Adjust this path as needed
-
-# Load all files matching the pattern
-files = glob.glob(file_pattern)
-
-# Initialize an empty list to hold the DataFrames
-dfs = []
-
-for file in files:
-    # Extract the date from the filename
-    basename = os.path.basename(file)
-    date_str = basename.split('_')[2]  # Extract YYMMDD
-    time_str = basename.split('_')[3].split('.')[0]  # Extract HHMM
-    
-    # Combine date and time
-    date = datetime.strptime(date_str + time_str, '%y%m%d%H%M')
-    
-    # Load the CSV into a DataFrame
-    df = pd.read_csv(file)
-    
-    # Add a column for the date-specific Inflation Degree
-    df[f'{date.strftime("%Y-%m-%d")} Inflation Degree'] = df['inflation_degree']
-    
-    # Drop the original Inflation Degree column to avoid duplication
-    df.drop(columns=['inflation_degree'], inplace=True)
-    
-    # Append the DataFrame to the list
-    dfs.append(df)
-
-# Merge all DataFrames on 'hero_handle' and 'hero_id'
-combined_df = pd.concat(dfs, axis=1)
-
-# Remove duplicate 'hero_handle' and 'hero_id' columns, keeping the first occurrence
-combined_df = combined_df.loc[:, ~combined_df.columns.duplicated()]
-
-# Function to sort columns by type and date
-def sort_columns_by_type_and_date(columns):
-    # Separate the columns into different categories
-    closing_score_columns = sorted([col for col in columns if 'Closing Score' in col], key=lambda x: x.split(' ')[0])
-    closing_rank_columns = sorted([col for col in columns if 'Closing Rank' in col], key=lambda x: x.split(' ')[0])
-    tournament_rank_columns = sorted([col for col in columns if 'Tournament Rank' in col], key=lambda x: x.split(' ')[0])
-    inflation_degree_columns = sorted([col for col in columns if 'Inflation Degree' in col], key=lambda x: x.split(' ')[0])
-
-    # Combine all sorted columns in the desired order
-    sorted_columns = closing_score_columns + closing_rank_columns + tournament_rank_columns + inflation_degree_columns
-    
-    return sorted_columns
-
-# Sort the columns by type and date
-date_columns = [col for col in combined_df.columns if col not in ['hero_handle', 'hero_id']]
-sorted_date_columns = sort_columns_by_type_and_date(date_columns)
-
-# Reorder the columns with 'hero_handle' and 'hero_id' first, followed by the sorted date columns
-final_columns = ['hero_handle', 'hero_id'] + sorted_date_columns
-combined_df = combined_df[final_columns]
-
-# Save the combined DataFrame to a CSV file
-combined_df.to_csv('data/combined_hero_stats_sorted.csv', index=False)
-
-print("Combined and sorted data saved to 'combined_hero_stats_sorted.csv'")
+load_dotenv()
+DATA_FOLDER = os.getenv("DATA_FOLDER", "data")
+
+# Long table of every hero stat ever seen: one row per (hero_id, date, metric), from the latest snapshot that had it
+LONG_FILE = 'hero_stats_long.csv'
+WIDE_FILE = 'combined_hero_stats_sorted.csv'
+LONG_COLUMNS = ['hero_id', 'date', 'metric', 'value', 'snapshot']
+KEY_COLUMNS = ['hero_id', 'date', 'metric']
+# Order of the metric groups in the wide report
+METRIC_ORDER = ['Closing Score', 'Closing Rank', 'Tournament Rank', 'Inflation Degree']
+CHUNK_SIZE = 50000
+
+DATED_COLUMN_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}) (.+)$')
+SNAPSHOT_PATTERN = re.compile(r'^hero_stats_(\d{6}_\d{4})\.csv$')
+
+
+def get_snapshot_files(folder_path):
+    """All hero_stats snapshots as (snapshot, path), oldest first."""
+    snapshots = []
+    for file_path in glob.glob(os.path.join(folder_path, 'hero_stats_*.csv')):
+        match = SNAPSHOT_PATTERN.match(os.path.basename(file_path))
+        if match:
+            snapshots.append((match.group(1), file_path))
+    # Snapshot names are zero-padded (YYMMDD_HHMM), so they sort chronologically
+    return sorted(snapshots)
+
+
+def get_metric_columns(columns, snapshot):
+    """Maps each stat column of a snapshot to its (date, metric)."""
+    snapshot_date = datetime.strptime(snapshot, '%y%m%d_%H%M').strftime('%Y-%m-%d')
+    metric_columns = {}
+    for col in columns:
+        match = DATED_COLUMN_PATTERN.match(col)
+        if match:
+            metric_columns[col] = (match.group(1), match.group(2))
+        elif col == 'inflation_degree':
+            # The inflation degree is only reported for the day of the snapshot
+            metric_columns[col] = (snapshot_date, 'Inflation Degree')
+    return metric_columns
+
+
+def read_snapshot_long(file_path, snapshot, chunksize=CHUNK_SIZE):
+    """Streams one snapshot in chunks into long (hero_id, date, metric, value, snapshot) rows."""
+    chunks = []
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        if 'hero_id' not in chunk.columns:
+            print(f"Warning: File {file_path} has no hero_id column. Skipping.")
+            return pd.DataFrame(columns=LONG_COLUMNS)
+        metric_columns = get_metric_columns(chunk.columns, snapshot)
+        chunk = chunk.assign(hero_id=normalise_hero_ids(chunk['hero_id']))
+        long_chunk = chunk.melt(id_vars=['hero_id'], value_vars=list(metric_columns), var_name='column', value_name='value')
+        # A missing value never overrides one from an earlier snapshot
+        long_chunk = long_chunk.dropna(subset=['hero_id', 'value'])
+        long_chunk['date'] = long_chunk['column'].map({col: date for col, (date, _) in metric_columns.items()})
+        long_chunk['metric'] = long_chunk['column'].map({col: metric for col, (_, metric) in metric_columns.items()})
+        long_chunk['value'] = pd.to_numeric(long_chunk['value'], errors='coerce')
+        long_chunk['snapshot'] = snapshot
+        chunks.append(long_chunk[LONG_COLUMNS])
+    if not chunks:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_snapshot_handles(folder_path):
+    """The latest hero_handle of each hero_id in the hero_stats snapshots."""
+    handles = {}
+    for _, file_path in get_snapshot_files(folder_path):
+        try:
+            snapshot_df = pd.read_csv(file_path, usecols=lambda col: col in ('hero_id', 'hero_handle'), dtype=str)
+        except Exception as e:
+            print(f"Error reading file {file_path}: {e}")
+            continue
+        if {'hero_id', 'hero_handle'}.issubset(snapshot_df.columns):
+            snapshot_df = snapshot_df.assign(hero_id=normalise_hero_ids(snapshot_df['hero_id'])).dropna()
+            handles.update(zip(snapshot_df['hero_id'], snapshot_df['hero_handle']))
+    return handles
+
+
+def load_long_table(folder_path):
+    long_path = os.path.join(folder_path, LONG_FILE)
+    if not os.path.exists(long_path):
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    return pd.read_csv(long_path, dtype={'hero_id': str, 'date': str, 'metric': str, 'snapshot': str})
+
+
+def consolidate_hero_stats(folder_path=DATA_FOLDER, chunksize=CHUNK_SIZE):
+    """Brings the long hero stats table up to date with any snapshots newer than the ones it covers.
+
+    Snapshots are processed oldest first and the table is deduplicated after each one, so memory
+    stays at the size of the result plus one snapshot."""
+    long_df = load_long_table(folder_path)
+    processed_through = long_df['snapshot'].max() if not long_df.empty else ''
+    new_snapshots = [(snapshot, file_path) for snapshot, file_path in get_snapshot_files(folder_path) if snapshot > processed_through]
+    if not new_snapshots:
+        print("Hero stats are already consolidated")
+        return long_df
+
+    for snapshot, file_path in new_snapshots:
+        print(f"Consolidating {file_path}")
+        try:
+            snapshot_df = read_snapshot_long(file_path, snapshot, chunksize)
+        except Exception as e:
+            print(f"Error reading file {file_path}: {e}")
+            continue
+        if snapshot_df.empty:
+            continue
+        long_df = pd.concat([long_df, snapshot_df], ignore_index=True) if not long_df.empty else snapshot_df
+        # The latest snapshot wins when several report the same stat
+        long_df = long_df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+    long_df = long_df.sort_values(KEY_COLUMNS).reset_index(drop=True)
+    long_df.to_csv(os.path.join(folder_path, LONG_FILE), index=False)
+    print(f"Long hero stats saved to {os.path.join(folder_path, LONG_FILE)}")
+    return long_df
+
+
+def build_wide_report(long_df, folder_path=DATA_FOLDER):
+    """Pivots the long table into one row per hero and one '{date} {metric}' column per stat."""
+    wide_df = long_df.pivot(index='hero_id', columns=['metric', 'date'], values='value')
+
+    # Metric groups in METRIC_ORDER (any other metric after them), dates ascending within each group
+    metric_rank = {metric: i for i, metric in enumerate(METRIC_ORDER)}
+    ordered = sorted(wide_df.columns, key=lambda col: (metric_rank.get(col[0], len(METRIC_ORDER)), col[0], col[1]))
+    wide_df = wide_df[ordered]
+    wide_df.columns = [f"{date} {metric}" for metric, date in ordered]
+
+    # Ranks are whole numbers, so keep them as integers in the report
+    rank_columns = [col for col in wide_df.columns if col.endswith('Rank')]
+    wide_df[rank_columns] = wide_df[rank_columns].round().astype('Int64')
+
+    wide_df = wide_df.reset_index()
+    dimension = load_hero_dimension(folder_path)
+    handles = pd.Series(get_current_handles(dimension, get_hero_keys(dimension, hero_ids=wide_df['hero_id'])), dtype=object)
+    if handles.isna().any():
+        # Heroes missing from the hero dimension (or no dimension yet) get their handle from the snapshots
+        handles = handles.fillna(wide_df['hero_id'].map(get_snapshot_handles(folder_path)))
+    wide_df.insert(0, 'hero_handle', handles)
+    return wide_df
+
+
+if __name__ == "__main__":
+    long_df = consolidate_hero_stats(DATA_FOLDER)
+
+    # The wide report is only built on request: python consolidate_hero_stats.py --wide
+    if '--wide' in sys.argv:
+        wide_df = build_wide_report(long_df, DATA_FOLDER)
+        wide_df.to_csv(os.path.join(DATA_FOLDER, WIDE_FILE), index=False)
+        print(f"Combined and sorted data saved to '{WIDE_FILE}'")
@@ -1,9 +1,22 @@
 import os
 import re
+import warnings
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from get_data_script import DATA_FOLDER
+from compile_pipeline import Pipeline, Stage
+from tournament_stats import load_tournament_stats_state, save_tournament_stats_state, update_tournament_stats_state
+from score_correlation import get_score_correlation_path, update_score_correlation
+from score_index import ScoreIndex, get_score_index_path, save_score_index
+from snapshot_diff import update_change_feed, get_snapshot_files
+from trade_candles import RESOLUTIONS, get_candle_path, update_trade_candles
+from hero_history import HeroHistory, get_hero_history_path, save_hero_history
+from hero_dimension import (
+    get_hero_dimension_path, load_hero_dimension, save_hero_dimension, register_hero_frames, add_hero_keys,
+    get_current_handles, get_hero_ids, join_on_hero_key
+)
 
 # Functions
 
@@ -64,45 +77,119 @@ def get_sorted_tournament_files(folder_path):
     csv_files.sort(key=lambda x: x[1], reverse=True)
     return [os.path.join(folder_path, file[0]) for file in csv_files]
 
-def import_all_tournament_csvs(folder_path):
-    """Imports and merges all tournament CSVs into a single DataFrame."""
-    tournament_files = get_sorted_tournament_files(folder_path)
-    all_hero_data = pd.DataFrame()
-    tournament_columns = []  # New list to keep track of tournament columns, used for calculating rarity scores laster
+# Parsed tournament files keyed by (path, mtime, size), so unchanged tournaments are never re-read
+_TOURNAMENT_FILE_CACHE = {}
+# Pivoted tournament scores keyed by the full tournament file set
+_TOURNAMENT_SCORES_CACHE = {}
+
+def get_file_cache_key(file_path):
+    """Returns a key that changes whenever the file at file_path is rewritten."""
+    stat = os.stat(file_path)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+def parse_tournament_file_name(file_path):
+    """Splits a tournament file name into its tournament name and start date."""
+    file_name = os.path.basename(file_path).split('.')[0]
+    parts = file_name.split('_')
+    return " ".join(parts[:-2]), parts[-2]
+
+def get_tournament_column_names(tournament_files):
+    """Maps each tournament file to its score column name.
+
+    Tournaments can share a name (e.g. Flash Tournament), so every one after the first of a name is
+    told apart by its start date. Names are given oldest first, so a newer tournament never renames
+    the column of an older one."""
+    column_names = {}
+    for file_path in sorted(tournament_files, key=lambda path: parse_tournament_file_name(path)[1]):
+        tournament_name, start_date = parse_tournament_file_name(file_path)
+        column_name = f"{tournament_name} Score"
+        if column_name in column_names.values():
+            column_name = f"{tournament_name} {start_date} Score"
+        column_names[file_path] = column_name
+    return column_names
+
+def read_tournament_file(file_path):
+    """Reads the hero_handle and fantasy_score columns of a single tournament CSV."""
+    print(f"Reading tournament file: {file_path}")
+    try:
+        df = pd.read_csv(file_path, usecols=lambda col: col in ('hero_handle', 'fantasy_score'))
+    except pd.errors.EmptyDataError:
+        print(f"Warning: File {file_path} is empty or has no columns to parse. Skipping.")
+        return None
+    except Exception as e:
+        print(f"Error reading file {file_path}: {e}")
+        return None
+
+    if 'hero_handle' not in df.columns or 'fantasy_score' not in df.columns:
+        print(f"Warning: File {file_path} does not have the required columns. Skipping.")
+        return None
+    if df.empty:
+        print(f"Warning: File {file_path} is empty. Skipping.")
+        return None
+    return df
 
-    for file_path in tournament_files:
-        print(f"Reading tournament file: {file_path}")
-        try:
-            df = pd.read_csv(file_path)
+def import_tournament_scores_long(folder_path):
+    """Reads all tournament CSVs in parallel into one long (hero_handle, tournament, start_date, fantasy_score) table.
 
-            if df.empty:
-                print(f"Warning: File {file_path} is empty. Skipping.")
-                continue
+    Returns the long table and the tournament column names, most recent tournament first."""
+    tournament_files = get_sorted_tournament_files(folder_path)
+    file_keys = [get_file_cache_key(file_path) for file_path in tournament_files]
+
+    # Only read the files that are new or have changed since the last call
+    stale_files = [file_path for file_path, key in zip(tournament_files, file_keys) if key not in _TOURNAMENT_FILE_CACHE]
+    if stale_files:
+        with ThreadPoolExecutor(max_workers=min(8, len(stale_files))) as executor:
+            for file_path, df in zip(stale_files, executor.map(read_tournament_file, stale_files)):
+                _TOURNAMENT_FILE_CACHE[get_file_cache_key(file_path)] = df
+
+    frames = []
+    tournament_columns = []
+    column_names = get_tournament_column_names(tournament_files)
+    for file_path, key in zip(tournament_files, file_keys):
+        df = _TOURNAMENT_FILE_CACHE.get(key)
+        if df is None:
+            continue
+        _, start_date = parse_tournament_file_name(file_path)
+        column_name = column_names[file_path]
+        tournament_columns.append(column_name)
+        frames.append(pd.DataFrame({
+            'hero_handle': df['hero_handle'].values,
+            'tournament': column_name,
+            'start_date': start_date,
+            'fantasy_score': df['fantasy_score'].values,
+        }))
+
+    # Drop cached files that are no longer part of the tournament folder
+    for key in set(_TOURNAMENT_FILE_CACHE) - set(file_keys):
+        if key[0].startswith(folder_path):
+            del _TOURNAMENT_FILE_CACHE[key]
+
+    if not frames:
+        return pd.DataFrame(columns=['hero_handle', 'tournament', 'start_date', 'fantasy_score']), tournament_columns
+    return pd.concat(frames, ignore_index=True), tournament_columns
 
-            # Extract relevant columns (hero_handle and fantasy_score)
-            if 'hero_handle' in df.columns and 'fantasy_score' in df.columns:
-                file_name = os.path.basename(file_path).split('.')[0]
-                parts = file_name.split('_')
-                tournament_name = " ".join(parts[:-2])
-                column_name = f"{tournament_name.replace('_', ' ')} Score"
-                df = df[['hero_handle', 'fantasy_score']].rename(columns={'fantasy_score': column_name})
-                
-                tournament_columns.append(column_name)
-
-                if all_hero_data.empty:
-                    all_hero_data = df
-                else:
-                    all_hero_data = pd.merge(all_hero_data, df, on='hero_handle', how='outer')
-                
-            else:
-                print(f"Warning: File {file_path} does not have the required columns. Skipping.")
+def import_all_tournament_csvs(folder_path):
+    """Imports all tournament CSVs and pivots them once into a single DataFrame with a column per tournament."""
+    file_set = tuple(get_file_cache_key(file_path) for file_path in get_sorted_tournament_files(folder_path))
+    if file_set not in _TOURNAMENT_SCORES_CACHE:
+        long_df, tournament_columns = import_tournament_scores_long(folder_path)
+        if long_df.empty:
+            all_hero_data = pd.DataFrame()
+        else:
+            all_hero_data = long_df.pivot_table(index='hero_handle', columns='tournament', values='fantasy_score', aggfunc='first', dropna=False)
+            all_hero_data = all_hero_data.reindex(columns=tournament_columns).reset_index()
+            all_hero_data.columns.name = None
+        _TOURNAMENT_SCORES_CACHE.clear()
+        _TOURNAMENT_SCORES_CACHE[file_set] = (all_hero_data, tournament_columns)
 
-        except pd.errors.EmptyDataError:
-            print(f"Warning: File {file_path} is empty or has no columns to parse. Skipping.")
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
+    all_hero_data, tournament_columns = _TOURNAMENT_SCORES_CACHE[file_set]
+    # Callers add statistics columns in place, so never hand out the cached frame itself
+    return all_hero_data.copy(), list(tournament_columns)
 
-    return all_hero_data, tournament_columns
+def get_tournament_start_dates(folder_path):
+    """Start date (YYYY-MM-DD) of each tournament column, as named by import_all_tournament_csvs."""
+    long_df, _ = import_tournament_scores_long(folder_path)
+    return long_df.drop_duplicates('tournament').set_index('tournament')['start_date'].to_dict()
 
 def generate_all_scores_list(tournament_columns):
     """Generates the ALL_SCORES list based on the actual tournament columns and calculated statistics. This list can be used as the basis for adjustment for other rarities or custom calculations."""
@@ -128,24 +215,33 @@ def generate_all_scores_list(tournament_columns):
     
     return ALL_SCORES
 
-def calculate_tournament_statistics(df):
-    """Calculates tournament statistics like averages, variances, and Z-scores."""
+def calculate_tournament_statistics(df, state_path=None):
+    """Calculates tournament statistics like averages, variances, and Z-scores.
+
+    The per-hero running statistics are kept in a TournamentStatsState. If state_path is given the
+    state is loaded from and saved to it, so only tournaments added since the last compile are processed."""
     if 'hero_handle' in df.columns:
-        numeric_df = df.drop(['hero_handle'], axis=1).apply(pd.to_numeric, errors='coerce')
+        hero_index = df['hero_key'] if 'hero_key' in df.columns else df['hero_handle']
+        numeric_df = df.drop(['hero_key', 'hero_handle'], axis=1, errors='ignore').apply(pd.to_numeric, errors='coerce')
 
-        # Manually define the columns for now based on the imported data
-        TOURNAMENT_COLUMNS = [col for col in df.columns if 'Main' in col]  # Main tournaments columns
-        df['Average'] = numeric_df.mean(axis=1)
-        df['Main_Tournaments_Ave'] = numeric_df[TOURNAMENT_COLUMNS].mean(axis=1)
-        df['Main_Last_4_Ave'] = numeric_df[TOURNAMENT_COLUMNS[:4]].mean(axis=1)
+        # Columns are ordered most recent tournament first, the state is built oldest first
+        state = load_tournament_stats_state(state_path)
+        state = update_tournament_stats_state(state, numeric_df.set_index(hero_index), list(numeric_df.columns)[::-1])
+        rows = state.get_rows(hero_index, add_missing=True)
+        if state_path:
+            save_tournament_stats_state(state, state_path)
+
+        df['Average'] = state.overall.get_mean(rows)
+        df['Main_Tournaments_Ave'] = state.main.get_mean(rows)
+        df['Main_Last_4_Ave'] = state.get_window_mean(4, rows)
 
         # Variance and standard deviation calculations
-        df['Variance'] = numeric_df.var(axis=1)
-        df['Main_Tournaments_Variance'] = numeric_df[TOURNAMENT_COLUMNS].var(axis=1)
-        df['Main_Last_4_Variance'] = numeric_df[TOURNAMENT_COLUMNS[:4]].var(axis=1)
-        df['Standard_Deviation'] = numeric_df.std(axis=1)
-        df['Main_Tournaments_Standard_Deviation'] = numeric_df[TOURNAMENT_COLUMNS].std(axis=1)
-        df['Main_Last_4_Standard_Deviation'] = numeric_df[TOURNAMENT_COLUMNS[:4]].std(axis=1)
+        df['Variance'] = state.overall.get_variance(rows)
+        df['Main_Tournaments_Variance'] = state.main.get_variance(rows)
+        df['Main_Last_4_Variance'] = state.get_window_variance(4, rows)
+        df['Standard_Deviation'] = np.sqrt(df['Variance'])
+        df['Main_Tournaments_Standard_Deviation'] = np.sqrt(df['Main_Tournaments_Variance'])
+        df['Main_Last_4_Standard_Deviation'] = np.sqrt(df['Main_Last_4_Variance'])
 
         # Z-score calculations
         z_scores = numeric_df.sub(df['Average'], axis=0).div(df['Standard_Deviation'], axis=0)
@@ -155,8 +251,8 @@ def calculate_tournament_statistics(df):
         df = pd.concat([df, z_scores], axis=1)
         df.fillna(0, inplace=True)
         
-        # Fix for the deprecation warning
-        df['Moving_Avg_3'] = numeric_df[TOURNAMENT_COLUMNS].T.rolling(window=3).mean().T.iloc[:, -1]
+        # Average of the three most recent main tournaments
+        df['Moving_Avg_3'] = state.get_moving_average(3, rows)
         
     else:
         raise KeyError("Column 'hero_handle' not found in the DataFrame")
@@ -164,71 +260,112 @@ def calculate_tournament_statistics(df):
     return df
 
 
-def merge_dataframes(dataframes):
-    """Merges all dataframes including basic hero stats, tournament scores, and other hero-related data."""
-    merged_hero_stats = dataframes['basic_hero_stats'].merge(dataframes['hero_stats'], on='hero_handle', how='left')
-    merged_hero_stats = merged_hero_stats.merge(dataframes['hero_card_supply'], on='hero_id', how='left')
-    merged_hero_stats = merged_hero_stats.merge(dataframes['listings'], on=['hero_id', 'hero_handle'], how='left')
+def key_tournament_scores(all_hero_data, hero_dimension):
+    """Keys the pivoted tournament scores by hero, combining the rows of a hero who played under several handles."""
+    keyed = add_hero_keys(all_hero_data, hero_dimension, handle_column='hero_handle')
+    keyed = keyed[keyed['hero_key'] >= 0]
+    score_columns = [col for col in keyed.columns if col not in ['hero_key', 'hero_handle']]
+    keyed = keyed.groupby('hero_key', sort=True)[score_columns].first().reset_index()
+    keyed.insert(1, 'hero_handle', get_current_handles(hero_dimension, keyed['hero_key']))
+    return keyed
+
+def merge_dataframes(dataframes, hero_dimension):
+    """Merges all dataframes including basic hero stats, tournament scores, and other hero-related data.
+
+    Every frame is keyed through the hero dimension and joined on hero_key, so a renamed handle or an id
+    stored as a float in one snapshot no longer breaks the merge."""
+    keyed = {name: add_hero_keys(df, hero_dimension) for name, df in dataframes.items() if name != 'tournament_scores'}
+    merged_hero_stats = keyed['basic_hero_stats'].drop_duplicates(subset=['hero_key'])
+    merged_hero_stats = join_on_hero_key(merged_hero_stats, keyed['hero_stats'].drop(columns=['hero_handle']))
+    merged_hero_stats = join_on_hero_key(merged_hero_stats, keyed['hero_card_supply'].drop(columns=['hero_id'], errors='ignore'))
+    merged_hero_stats = join_on_hero_key(merged_hero_stats, keyed['listings'].drop(columns=['hero_id', 'hero_handle'], errors='ignore'))
     
-    # Deduplicate hero_trades by taking the latest price per hero_id and rarity
-    latest_trades_df = dataframes['hero_trades'].sort_values(by=['hero_id', 'rarity', 'timestamp'], ascending=False)
-    latest_trades_df = latest_trades_df.drop_duplicates(subset=['hero_id', 'rarity'], keep='first')
+    # Deduplicate hero_trades by taking the latest price per hero and rarity
+    latest_trades_df = keyed['hero_trades'].sort_values(by=['hero_key', 'rarity', 'timestamp'], ascending=False)
+    latest_trades_df = latest_trades_df.drop_duplicates(subset=['hero_key', 'rarity'], keep='first')
 
     # Ensure rarity is an integer
     latest_trades_df['rarity'] = latest_trades_df['rarity'].astype(int)
 
     # Pivot the latest_trades_df so that each rarity has its own column
-    latest_trades_pivot = latest_trades_df.pivot(index='hero_id', columns='rarity', values='price').reset_index()
-    latest_trades_pivot.columns = ['hero_id'] + [f'rarity{int(col)}lastSalePrice' for col in latest_trades_pivot.columns if col != 'hero_id']
+    latest_trades_pivot = latest_trades_df.pivot(index='hero_key', columns='rarity', values='price').reset_index()
+    latest_trades_pivot.columns = ['hero_key'] + [f'rarity{int(col)}lastSalePrice' for col in latest_trades_pivot.columns if col != 'hero_key']
     
-    # Merge the latest trades with merged_hero_stats on 'hero_id'
-    merged_hero_stats = merged_hero_stats.merge(latest_trades_pivot, on='hero_id', how='left')
+    # Merge the latest trades with merged_hero_stats
+    merged_hero_stats = join_on_hero_key(merged_hero_stats, latest_trades_pivot)
 
-    # Check if 'Name' exists in tournament_scores before dropping it
-    if 'Name' in dataframes['tournament_scores'].columns:
-        dataframes['tournament_scores'].drop(columns=['Name'], inplace=True)
+    # Drop 'Name' if it exists in tournament_scores (without modifying the input, which may be cached)
+    tournament_scores = dataframes['tournament_scores'].drop(columns=['Name', 'hero_handle'], errors='ignore')
     
     # Merge with the compiled tournament scores
-    merged_hero_stats = merged_hero_stats.merge(dataframes['tournament_scores'], left_on='hero_handle', right_on='hero_handle', how='left')
-    merged_hero_stats.drop_duplicates(subset=['hero_handle'], inplace=True)
-    merged_hero_stats['hero_id'] = merged_hero_stats['hero_id'].astype(str)
+    merged_hero_stats = join_on_hero_key(merged_hero_stats, tournament_scores)
+
+    # The dimension knows the id of every hero, including those missing from hero_stats
+    hero_ids = pd.Series(get_hero_ids(hero_dimension, merged_hero_stats['hero_key'])).astype(str)
+    if 'hero_id' in merged_hero_stats.columns:
+        merged_hero_stats['hero_id'] = hero_ids
+    else:
+        merged_hero_stats.insert(merged_hero_stats.columns.get_loc('hero_handle') + 1, 'hero_id', hero_ids)
     
     return merged_hero_stats
 
-def save_final_dataframes(final_merged_df, portfolio_scores):
-    """Saves the final merged dataframe to a CSV file."""
-    try:
-        # Check if DATA_FOLDER is just a drive letter
-        if DATA_FOLDER.endswith(':\\'):
-            all_hero_path = f'{DATA_FOLDER}allHeroData.csv'
-            portfolio_path = f'{DATA_FOLDER}portfolio.csv'
-        else:
-            all_hero_path = os.path.join(DATA_FOLDER, 'allHeroData.csv')
-            portfolio_path = os.path.join(DATA_FOLDER, 'portfolio.csv')
+def get_output_path(file_name):
+    """Returns the path of a compiled output file inside DATA_FOLDER."""
+    # Check if DATA_FOLDER is just a drive letter
+    if DATA_FOLDER.endswith(':\\'):
+        return f'{DATA_FOLDER}{file_name}'
+    return os.path.join(DATA_FOLDER, file_name)
 
-        final_merged_df.to_csv(all_hero_path, index=False)
-        portfolio_scores.to_csv(portfolio_path, index=False)
-        print(f"Files successfully saved to {DATA_FOLDER}")
+def save_compiled_csv(file_path, df):
+    """Saves a compiled dataframe to file_path. Returns the path, or None if the write failed."""
+    try:
+        df.to_csv(file_path, index=False)
+        print(f"File successfully saved to {file_path}")
+        return file_path
     except PermissionError as e:
         print(f"Permission error: {e}")
         print("Please ensure you have write permissions for the specified directory.")
-        print(f"Attempted to write to: {DATA_FOLDER}")
+        print(f"Attempted to write to: {file_path}")
     except Exception as e:
-        print(f"An error occurred while saving the files: {e}")
-        print(f"Attempted to write to: {DATA_FOLDER}")
+        print(f"An error occurred while saving the file: {e}")
+        print(f"Attempted to write to: {file_path}")
+    return None
 
-
-def process_portfolio_scores(portfolio_df, final_merged_df, ALL_SCORES):
-    merged_df = portfolio_df.merge(final_merged_df, on='hero_handle', how='left')
+def save_final_dataframes(final_merged_df, portfolio_scores):
+    """Saves the final merged dataframe and the portfolio scores to CSV files."""
+    save_compiled_csv(get_output_path('allHeroData.csv'), final_merged_df)
+    save_compiled_csv(get_output_path('portfolio.csv'), portfolio_scores)
+
+
+# Tournament score multiplier for each card rarity (1 = legendary, 2 = epic, 3 = rare, 4 = common)
+RARITY_MULTIPLIERS = {1: 1.0, 2: 1.0, 3: 1.5, 4: 1.0}
+
+def gather_by_rarity(df, rarity, column_template):
+    """Picks column_template.format(rarity) for every row with a single array-indexed gather."""
+    columns = [column_template.format(level) for level in RARITY_MULTIPLIERS]
+    values = df.reindex(columns=columns).to_numpy()
+    valid = np.isin(rarity, list(RARITY_MULTIPLIERS))
+    if valid.all():
+        return values[np.arange(len(df)), rarity.astype(int) - 1]
+
+    # Rows with an unknown rarity get NaN
+    gathered = np.full(len(df), np.nan)
+    rows = np.flatnonzero(valid)
+    gathered[rows] = values[rows, rarity[rows].astype(int) - 1]
+    return gathered
+
+def process_portfolio_scores(portfolio_df, final_merged_df, ALL_SCORES, hero_dimension):
+    merged_df = join_on_hero_key(add_hero_keys(portfolio_df, hero_dimension), final_merged_df.drop(columns=['hero_handle']))
     portfolio_scores = merged_df.drop(['hero_name_y', 'hero_stars_y', 'hero_followers_count_y', 'hero_profile_image_url_y', 'token_id'], axis=1)
     portfolio_scores.columns = [col.replace('_x', '') for col in portfolio_scores.columns]
     
     columns_order = ['hero_name', 'hero_handle'] + [col for col in portfolio_scores.columns if col not in ['hero_name', 'hero_handle']]
     portfolio_scores = portfolio_scores[columns_order]
     
-    portfolio_scores['lastSalePrice'] = portfolio_scores.apply(lambda row: row[f'rarity{int(row["rarity"])}lastSalePrice'], axis=1)
-    portfolio_scores['lowestPrice'] = portfolio_scores.apply(lambda row: row[f'rarity{row["rarity"]}_lowest_price'], axis=1)
-    portfolio_scores['rarityCount'] = portfolio_scores.apply(lambda row: row[f'rarity{row["rarity"]}Count'], axis=1)
+    rarity = pd.to_numeric(portfolio_scores['rarity'], errors='coerce').to_numpy()
+    portfolio_scores['lastSalePrice'] = gather_by_rarity(portfolio_scores, rarity, 'rarity{}lastSalePrice')
+    portfolio_scores['lowestPrice'] = gather_by_rarity(portfolio_scores, rarity, 'rarity{}_lowest_price')
+    portfolio_scores['rarityCount'] = gather_by_rarity(portfolio_scores, rarity, 'rarity{}Count')
     
     columns_to_drop = [
         'rarity1_lowest_price', 'rarity2_lowest_price', 'rarity3_lowest_price', 'rarity4_lowest_price',
@@ -238,42 +375,211 @@ def process_portfolio_scores(portfolio_df, final_merged_df, ALL_SCORES):
     ]
     portfolio_scores = portfolio_scores.drop(columns=columns_to_drop)
     
-    for col in ALL_SCORES:
-        if col in portfolio_scores.columns:
-            portfolio_scores[col] = pd.to_numeric(portfolio_scores[col], errors='coerce')
-            if 'Variance' in col:
-                portfolio_scores[col] = portfolio_scores.apply(lambda row: row[col] * 2.25 if row['hero_rarity_index'].endswith('3') else row[col], axis=1)
-            elif 'Z_Score' in col:
-                # Do not modify Z-scores
-                pass
-            else:
-                # For raw scores, averages, and standard deviations
-                portfolio_scores[col] = portfolio_scores.apply(lambda row: row[col] * 1.5 if row['hero_rarity_index'].endswith('3') else row[col], axis=1)
+    score_columns = [col for col in dict.fromkeys(ALL_SCORES) if col in portfolio_scores.columns]
+    portfolio_scores[score_columns] = portfolio_scores[score_columns].apply(pd.to_numeric, errors='coerce')
+
+    # The card's rarity is the suffix of its hero_rarity_index (e.g. '1234_3')
+    card_rarity = pd.to_numeric(portfolio_scores['hero_rarity_index'].astype(str).str.rsplit('_', n=1).str[-1], errors='coerce')
+    multiplier = card_rarity.map(RARITY_MULTIPLIERS).fillna(1.0).to_numpy()[:, None]
+
+    # Variances scale with the square of the multiplier, Z-scores are not modified
+    variance_columns = [col for col in score_columns if 'Variance' in col]
+    linear_columns = [col for col in score_columns if 'Variance' not in col and 'Z_Score' not in col]
+    portfolio_scores[variance_columns] = portfolio_scores[variance_columns].to_numpy() * multiplier ** 2
+    portfolio_scores[linear_columns] = portfolio_scores[linear_columns].to_numpy() * multiplier
 
     return portfolio_scores
 
 
-# Main Execution
+# Names of the rarities in the Value Analysis columns
+VALUE_RARITIES = {4: 'Bronze', 3: 'Silver', 2: 'Gold', 1: 'Diamond'}
+
+def calculate_value_analysis(all_hero_data, score_column='Main_Tournaments_Ave', deviation_column='Main_Tournaments_Standard_Deviation'):
+    """Adds the Value Analysis columns of every rarity, computed for all heroes and rarities at once.
+
+    A card's price is its rarity's lowest listing, or the last sale when none is listed, and its
+    performance is the hero's tournament average times the rarity multiplier. Price to Performance
+    is price per point; the adjusted version is scaled up by the hero's coefficient of variation,
+    so erratic scorers look dearer. Market Relative divides by the rarity's median, and the rank is
+    1 for the best value of the rarity."""
+    rarities = list(VALUE_RARITIES)
+    lowest = all_hero_data.reindex(columns=[f'rarity{level}_lowest_price' for level in rarities]).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    last_sale = all_hero_data.reindex(columns=[f'rarity{level}lastSalePrice' for level in rarities]).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    # Missing prices and averages are compiled as 0
+    price = np.where(lowest > 0, lowest, last_sale)
+    price[~(price > 0)] = np.nan
+    average = pd.to_numeric(all_hero_data[score_column], errors='coerce').to_numpy(dtype=float)
+    average[~(average > 0)] = np.nan
+    deviation = pd.to_numeric(all_hero_data[deviation_column], errors='coerce').to_numpy(dtype=float)
+
+    performance = average[:, None] * np.array([RARITY_MULTIPLIERS[level] for level in rarities])
+    variation = np.broadcast_to((deviation / average)[:, None], price.shape)
+    price_to_performance = price / performance
+    adjusted = price_to_performance * (1 + variation)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        market_relative = adjusted / np.nanmedian(adjusted, axis=0)
+    rank = pd.DataFrame(adjusted).rank(method='min').to_numpy()
+
+    columns = {}
+    for i, level in enumerate(rarities):
+        name = VALUE_RARITIES[level]
+        columns[f'Price_to_Performance_{name}'] = price_to_performance[:, i]
+        columns[f'Coefficient_of_Variation_{name}'] = variation[:, i]
+        columns[f'Adjusted_Price_to_Performance_{name}'] = adjusted[:, i]
+        columns[f'Market_Relative_Price_to_Perf_{name}'] = market_relative[:, i]
+        columns[f'Adj_Price_to_Performance_Rank_{name}'] = rank[:, i]
+    value_columns = pd.DataFrame(columns, index=all_hero_data.index)
+    return pd.concat([all_hero_data.drop(columns=value_columns.columns, errors='ignore'), value_columns], axis=1)
+
+
+# Compile Pipeline Stages
+
+# Snapshot prefixes that feed the compiled outputs
+COMPILE_INPUTS = ['basic_hero_stats', 'hero_stats', 'hero_card_supply', 'listings', 'hero_trades', 'portfolio']
+
+def read_snapshot_csv(file_path):
+    """Reads a single snapshot CSV, returning None if it is empty."""
+    print(f"Reading file: {file_path}")
+    try:
+        df = pd.read_csv(file_path)
+    except pd.errors.EmptyDataError:
+        print(f"Warning: File {file_path} is empty or has no columns to parse. Skipping.")
+        return None
+    if df.empty:
+        print(f"Warning: File {file_path} is empty. Skipping.")
+        return None
+    return df
 
-def compile_data():
-    """Main function to compile the data."""
-    dataframes = import_latest_csv_files(DATA_FOLDER)
-    # Load tournament data from all CSVs
-    
-    all_hero_data, tournament_columns = import_all_tournament_csvs(os.path.join(DATA_FOLDER, "tournament_results"))
-    dataframes['tournament_scores'] = all_hero_data
+def hero_dimension_stage(folder_path, tournament_import, *snapshots):
+    """Registers every hero in the compile inputs (including snapshots saved before they carried a hero_key)."""
+    frames = [df.rename(columns={'id': 'hero_id', 'handle': 'hero_handle'}) for df in snapshots if df is not None] + [tournament_import[0]]
+    dimension, changed = register_hero_frames(load_hero_dimension(folder_path), frames)
+    if changed:
+        save_hero_dimension(dimension, folder_path)
+    return dimension
+
+def tournament_statistics_stage(state_path, tournament_import, hero_dimension):
+    all_hero_data, _ = tournament_import
+    return calculate_tournament_statistics(key_tournament_scores(all_hero_data, hero_dimension), state_path)
+
+def score_correlation_stage(state_path, tournament_import, hero_dimension):
+    all_hero_data, tournament_columns = tournament_import
+    scores_df = key_tournament_scores(all_hero_data, hero_dimension).set_index('hero_key')
+    # Columns are ordered most recent tournament first, the state is built oldest first
+    return update_score_correlation(state_path, scores_df, tournament_columns[::-1])
+
+def score_index_stage(index_path, tournament_folder, tournament_import, hero_dimension):
+    all_hero_data, tournament_columns = tournament_import
+    scores_df = key_tournament_scores(all_hero_data, hero_dimension).set_index('hero_key')
+    index = ScoreIndex.from_scores(scores_df, tournament_columns[::-1], get_tournament_start_dates(tournament_folder))
+    return save_score_index(index, index_path)
+
+def trade_candles_stage(folder_path):
+    """Updates the candle store. A failure (e.g. no Parquet engine installed) is logged and skipped,
+    so the rest of the compile still runs; the stage is retried on the next compile."""
+    try:
+        return update_trade_candles(folder_path)
+    except Exception as e:
+        print(f"Could not update the trade candles: {e}")
+        return None
+
+def hero_history_stage(history_path, tournament_folder, hero_dimension, hero_card_supply=None, listings=None):
+    tournament_scores, _ = import_tournament_scores_long(tournament_folder)
+    history = HeroHistory.from_snapshots(tournament_scores, hero_dimension, hero_card_supply, listings)
+    return save_hero_history(history, history_path)
+
+def all_scores_stage(tournament_import):
+    _, tournament_columns = tournament_import
+    return generate_all_scores_list(tournament_columns)
+
+def merge_stage(basic_hero_stats, hero_stats, hero_card_supply, listings, hero_trades, tournament_scores, hero_dimension):
+    return merge_dataframes({
+        'basic_hero_stats': basic_hero_stats,
+        'hero_stats': hero_stats,
+        'hero_card_supply': hero_card_supply,
+        'listings': listings,
+        'hero_trades': hero_trades,
+        'tournament_scores': tournament_scores,
+    }, hero_dimension)
+
+def build_compile_pipeline(folder_path=DATA_FOLDER):
+    """Builds the compile DAG from the latest snapshot files and all tournament files in folder_path."""
+    latest_files = get_latest_csv_files(folder_path)
+    tournament_folder = os.path.join(folder_path, "tournament_results")
+    all_hero_path = get_output_path('allHeroData.csv')
+    portfolio_path = get_output_path('portfolio.csv')
+    cache_dir = os.path.join(folder_path, '.compile_cache')
+    correlation_path = get_score_correlation_path(folder_path)
+    index_path = get_score_index_path(folder_path)
+    candle_paths = [get_candle_path(folder_path, resolution) for resolution in RESOLUTIONS]
+    history_path = get_hero_history_path(folder_path)
+
+    stages = [
+        Stage(prefix, read_snapshot_csv, args=(latest_files[prefix],), sources=[latest_files[prefix]])
+        for prefix in COMPILE_INPUTS if prefix in latest_files
+    ]
+    # The hero list holds every (id, handle) pair seen, which ties the old handle of a renamed hero to its id
+    dimension_inputs = [prefix for prefix in ['hero_list'] + COMPILE_INPUTS if prefix in latest_files]
+    if 'hero_list' in latest_files:
+        stages.append(Stage('hero_list', read_snapshot_csv, args=(latest_files['hero_list'],), sources=[latest_files['hero_list']]))
+    stages += [
+        Stage('tournament_import', import_all_tournament_csvs, args=(tournament_folder,), sources=get_sorted_tournament_files(tournament_folder)),
+        # Every new snapshot re-runs this stage, but it rarely adds a hero, so the stages using the
+        # dimension are keyed on the saved file and only re-run when it changes
+        Stage('hero_dimension', hero_dimension_stage, args=(folder_path,), deps=['tournament_import'] + dimension_inputs,
+              outputs=[get_hero_dimension_path(folder_path)], output_keyed=True),
+        Stage('tournament_scores', tournament_statistics_stage, args=(os.path.join(cache_dir, 'tournament_stats_state.pkl'),), deps=['tournament_import', 'hero_dimension']),
+        Stage('score_correlation', score_correlation_stage, args=(correlation_path,), deps=['tournament_import', 'hero_dimension'],
+              outputs=[correlation_path]),
+        Stage('score_index', score_index_stage, args=(index_path, tournament_folder), deps=['tournament_import', 'hero_dimension'],
+              outputs=[index_path]),
+        # Folds the trades of any new hero_trades snapshot into the candle store
+        Stage('trade_candles', trade_candles_stage, args=(folder_path,),
+              sources=[file_path for _, file_path in get_snapshot_files(folder_path, 'hero_trades')], outputs=candle_paths),
+        # Per-hero tables for the hero page
+        Stage('hero_history', hero_history_stage, args=(history_path, tournament_folder),
+              deps=['hero_dimension'] + [prefix for prefix in ['hero_card_supply', 'listings'] if prefix in latest_files],
+              sources=get_sorted_tournament_files(tournament_folder), outputs=[history_path]),
+        Stage('all_scores', all_scores_stage, deps=['tournament_import']),
+        Stage('all_hero_data', merge_stage, deps=['basic_hero_stats', 'hero_stats', 'hero_card_supply', 'listings', 'hero_trades', 'tournament_scores', 'hero_dimension']),
+        Stage('portfolio_scores', process_portfolio_scores, deps=['portfolio', 'all_hero_data', 'all_scores', 'hero_dimension']),
+        Stage('value_analysis', calculate_value_analysis, deps=['all_hero_data']),
+        Stage('save_all_hero_data', save_compiled_csv, args=(all_hero_path,), deps=['value_analysis'], outputs=[all_hero_path]),
+        Stage('save_portfolio', save_compiled_csv, args=(portfolio_path,), deps=['portfolio_scores'], outputs=[portfolio_path]),
+    ]
+    return Pipeline(stages, cache_dir=cache_dir)
 
-    # Calculate tournament statistics
-    dataframes['tournament_scores'] = calculate_tournament_statistics(dataframes['tournament_scores'])
 
-    # Generate ALL_SCORES list
-    ALL_SCORES = generate_all_scores_list(tournament_columns)
-        
-    # Merge all dataframes
-    final_merged_df = merge_dataframes(dataframes)
-    portfolio_scores = process_portfolio_scores(dataframes['portfolio'], final_merged_df, ALL_SCORES)
-    # Save the final merged data
-    save_final_dataframes(final_merged_df, portfolio_scores)
+# Main Execution
+
+def compile_data(max_workers=None, backend=None):
+    """Main function to compile the data. Only stages downstream of a changed input are re-run.
+
+    With max_workers > 1 (or the COMPILE_WORKERS environment variable), independent stages such as the
+    tournament statistics and the snapshot merges run in parallel worker processes.
+    backend='polars' (or COMPILE_BACKEND=polars) compiles everything as one Polars query plan instead.
+    Either way the change feed is brought up to date with any new snapshots."""
+    if backend is None:
+        backend = os.getenv("COMPILE_BACKEND", "pandas")
+    if backend == 'polars':
+        try:
+            from polars_backend import compile_data_polars
+            import polars  # noqa: F401
+        except ImportError:
+            print("Polars is not installed, falling back to the pandas backend")
+        else:
+            compile_data_polars(DATA_FOLDER)
+            update_change_feed(DATA_FOLDER)
+            return
+
+    if max_workers is None:
+        max_workers = int(os.getenv("COMPILE_WORKERS", "1"))
+    pipeline = build_compile_pipeline(DATA_FOLDER)
+    results = pipeline.run(['save_all_hero_data', 'save_portfolio', 'score_correlation', 'score_index', 'trade_candles', 'hero_history'], max_workers=max_workers)
+    if all(results.values()):
+        print(f"Files successfully saved to {DATA_FOLDER}")
+    update_change_feed(DATA_FOLDER)
 
 if __name__ == "__main__":
     compile_data()
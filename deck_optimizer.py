@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import heapq
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+DATA_FOLDER = os.getenv("DATA_FOLDER", "data")
+
+# Finds the best 5-card decks in the compiled portfolio for each league and writes them as
+# combined_best_decks_{league}_{timestamp}.csv, the files the Best Decks page shows.
+DECK_SIZE = 5
+TOP_K = 5
+SCORE_COLUMN = 'Main_Last_4_Ave'
+# Star cap and allowed card rarities (1 legendary ... 4 common) of each league; edit to match the current rules
+LEAGUES = {
+    'silver': {'max_stars': 25, 'rarities': (1, 2, 3, 4)},
+    'bronze': {'max_stars': 18, 'rarities': (3, 4)},
+}
+DECK_COLUMNS = ['hero_name', 'hero_handle', 'hero_id', 'hero_rarity_index', 'rarity', 'hero_stars', 'current_rank',
+                'gliding_score', 'picture_url', 'Main_Last_4_Ave', 'Main_Tournaments_Ave']
+
+
+def get_eligible_cards(portfolio_df, rarities, score_column=SCORE_COLUMN):
+    """Cards that can play in the league."""
+    cards = portfolio_df.copy()
+    cards['rarity'] = pd.to_numeric(cards['rarity'], errors='coerce')
+    cards[score_column] = pd.to_numeric(cards[score_column], errors='coerce')
+    cards['hero_stars'] = pd.to_numeric(cards['hero_stars'], errors='coerce')
+    cards = cards[cards['rarity'].isin(rarities) & cards[score_column].notna() & cards['hero_stars'].notna()]
+    return cards.reset_index(drop=True)
+
+
+def best_score_table(scores, stars, max_stars, deck_size=DECK_SIZE):
+    """best[j, r, b]: the highest score of r cards from position j onwards with at most b stars.
+
+    It ignores the one card per hero rule, so it is an upper bound for the search below
+    (and -inf where no r cards fit in b stars). Built from the last card back, one vectorized
+    update per card."""
+    n_cards = len(scores)
+    best = np.full((n_cards + 1, deck_size + 1, max_stars + 1), -np.inf)
+    best[:, 0, :] = 0
+    for j in range(n_cards - 1, -1, -1):
+        best[j] = best[j + 1]
+        card_stars = stars[j]
+        if card_stars <= max_stars:
+            # Taking card j leaves b - stars[j] stars for the other r - 1 cards
+            with_card = scores[j] + best[j + 1, :-1, :max_stars + 1 - card_stars]
+            best[j, 1:, card_stars:] = np.maximum(best[j, 1:, card_stars:], with_card)
+    return best
+
+
+def find_best_decks(scores, stars, heroes, max_stars, k=TOP_K, deck_size=DECK_SIZE):
+    """The k highest scoring decks as (score, card positions), best first.
+
+    A deck has deck_size cards of different heroes with at most max_stars stars in total.
+    Only the best card of each hero (and star count) is considered, so the decks differ in their
+    heroes rather than in which copy of a hero they use. Branch and bound over the cards in score
+    order: a branch is dropped as soon as the best the remaining cards could add within the star
+    budget (see best_score_table) cannot beat the k-th best deck found so far. The last card of
+    a deck is picked with one vectorized scan.
+    """
+    order = np.argsort(-np.asarray(scores, dtype=float), kind='stable')
+    # Sorted best first, so the first card of each hero and star count is its best one
+    candidates = pd.DataFrame({'hero': np.asarray(heroes)[order], 'stars': np.asarray(stars)[order]})
+    order = order[~candidates.duplicated().to_numpy()]
+    scores = np.asarray(scores, dtype=float)[order]
+    stars = np.asarray(stars).astype('int64')[order]
+    heroes = np.asarray(heroes)[order]
+    max_stars = int(max_stars)
+    n_cards = len(scores)
+    if n_cards < deck_size:
+        return []
+
+    bound = best_score_table(scores, stars, max_stars, deck_size)
+    best = []  # min-heap of (score, deck) holding the k best decks found so far
+
+    def threshold():
+        return best[0][0] if len(best) == k else -np.inf
+
+    def search(start, deck, score, stars_left):
+        remaining = deck_size - len(deck)
+        if remaining == 1:
+            # All cards that fit, in score order: only the first few can enter the top k
+            fits = stars[start:] <= stars_left
+            fits &= ~np.isin(heroes[start:], heroes[deck])
+            for j in np.flatnonzero(fits) + start:
+                total = score + scores[j]
+                if total <= threshold():
+                    break
+                entry = (total, tuple(int(order[i]) for i in deck + [j]))
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                else:
+                    heapq.heapreplace(best, entry)
+            return
+
+        for j in range(start, n_cards - remaining + 1):
+            if score + bound[j, remaining, stars_left] <= threshold():
+                # Cards further on can only add less, so no later branch can do better either
+                break
+            if stars[j] > stars_left or score + scores[j] + bound[j + 1, remaining - 1, stars_left - stars[j]] <= threshold():
+                continue
+            if heroes[j] in heroes[deck]:
+                continue
+            search(j + 1, deck + [j], score + scores[j], stars_left - stars[j])
+
+    search(0, [], 0.0, max_stars)
+    return [(score, list(deck)) for score, deck in sorted(best, reverse=True)]
+
+
+def build_deck_table(cards, decks, league, score_column=SCORE_COLUMN):
+    """One row per card of each deck, in the layout the Best Decks page reads."""
+    rows = []
+    for rank, (score, deck) in enumerate(decks, start=1):
+        deck_cards = cards.iloc[deck].reindex(columns=list(dict.fromkeys(DECK_COLUMNS + [score_column])))
+        deck_cards.insert(0, 'Deck_Name', f"{league.title()} Deck {rank}")
+        deck_cards.insert(1, 'Deck_Rank', rank)
+        deck_cards.insert(2, 'Deck_Score', score)
+        deck_cards.insert(3, 'Deck_Stars', cards['hero_stars'].iloc[deck].sum())
+        rows.append(deck_cards)
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+def optimize_decks(folder_path=DATA_FOLDER, k=TOP_K, score_column=SCORE_COLUMN, leagues=None):
+    """Writes the k best decks of each league from the compiled portfolio. Returns the tables by league."""
+    portfolio_path = os.path.join(folder_path, 'portfolio.csv')
+    if not os.path.exists(portfolio_path):
+        print(f"No compiled portfolio at {portfolio_path}, skipping the deck optimizer")
+        return {}
+    portfolio_df = pd.read_csv(portfolio_path, dtype={'hero_id': str})
+    if score_column not in portfolio_df.columns:
+        print(f"The portfolio has no {score_column} column, skipping the deck optimizer")
+        return {}
+
+    timestamp = datetime.now().strftime('%y%m%d_%H%M')
+    tables = {}
+    for league, rules in (LEAGUES if leagues is None else leagues).items():
+        cards = get_eligible_cards(portfolio_df, rules['rarities'], score_column)
+        # Cards of the same hero are told apart from other heroes by id (or handle for cards without one)
+        heroes = cards['hero_id'].fillna(cards['hero_handle']).astype(str).to_numpy()
+        decks = find_best_decks(cards[score_column].to_numpy(), cards['hero_stars'].to_numpy(), heroes, rules['max_stars'], k)
+        if not decks:
+            print(f"Not enough eligible cards for a {league} deck")
+            continue
+        tables[league] = build_deck_table(cards, decks, league, score_column)
+        file_path = os.path.join(folder_path, f"combined_best_decks_{league}_{timestamp}.csv")
+        tables[league].to_csv(file_path, index=False)
+        print(f"Best {league} decks saved to {file_path}")
+    return tables
+
+
+if __name__ == "__main__":
+    # python deck_optimizer.py --benchmark times the search on a synthetic 300 card portfolio
+    if '--benchmark' in sys.argv:
+        rng = np.random.default_rng(0)
+        n_cards = 300
+        hero_stars = rng.integers(1, 8, n_cards)
+        # Better heroes have more stars, so the star cap binds
+        scores = hero_stars * 60 + rng.normal(0, 40, n_cards)
+        heroes = rng.integers(0, 200, n_cards)
+        for league, rules in LEAGUES.items():
+            start = time.perf_counter()
+            decks = find_best_decks(scores, hero_stars, heroes, rules['max_stars'], TOP_K)
+            print(f"{league}: best {len(decks)} decks of {n_cards} cards in {(time.perf_counter() - start) * 1000:.1f} ms, top score {decks[0][0]:.1f}")
+    else:
+        optimize_decks(DATA_FOLDER)
@@ -12,19 +12,15 @@ import pickle
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from fake_useragent import UserAgent
 import platform
+from hero_dimension import key_snapshot
+from update_scheduler import RequestBudget, UpdateJob, UpdateScheduler
+from price_alerts import check_price_alerts
 
 
+# Nothing here runs at import beyond reading the environment: the app imports this module on every start.
+# Selenium, webdriver_manager and fake_useragent are imported by the functions that drive the browser.
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -33,9 +29,7 @@ load_dotenv()
 PLAYER_ID = os.getenv("PLAYER_ID")
 URL_GRAPHQL = os.getenv("URL_GRAPHQL")
 URL_REST = os.getenv("URL_REST")
-DATA_FOLDER = os.getenv("DATA_FOLDER")
-
-print(DATA_FOLDER)
+DATA_FOLDER = os.getenv("DATA_FOLDER", "data")
 
 # Required environment variables
 required_env_vars = [
@@ -47,15 +41,14 @@ required_env_vars = [
     'DATA_FOLDER',
 ]
 
-# Check if all required environment variables are set
-missing_env_vars = [var for var in required_env_vars if not os.getenv(var)]
+def get_missing_env_vars():
+    return [var for var in required_env_vars if not os.getenv(var)]
 
-if missing_env_vars:
-    print(f"Error: Missing required environment variables: {', '.join(missing_env_vars)}")
-    print("Please ensure all required environment variables are set.")
-    sys.exit(1)  # Exit the script if any environment variables are missing
-
-# If all environment variables are loaded, proceed with the rest of the script
+def check_env_vars():
+    """Raises if any required environment variable is missing (checked before logging in)."""
+    missing_env_vars = get_missing_env_vars()
+    if missing_env_vars:
+        raise RuntimeError(f"Missing required environment variables: {', '.join(missing_env_vars)}")
 
 # Determine the platform
 is_windows = platform.system().lower() == "windows"
@@ -66,10 +59,11 @@ if DATA_FOLDER.startswith("~") and not is_windows:
 else:
     DATA_FOLDER = os.path.abspath(DATA_FOLDER)
 
-# Create the directory if it doesn't exist
-if not os.path.exists(DATA_FOLDER):
-    print (f"Creating directory: {DATA_FOLDER}")
-    os.makedirs(DATA_FOLDER)
+def ensure_data_folder():
+    # Create the directory if it doesn't exist
+    if not os.path.exists(DATA_FOLDER):
+        print (f"Creating directory: {DATA_FOLDER}")
+        os.makedirs(DATA_FOLDER)
 
 COOKIES_FILE = 'cookies.pkl'
 SESSION_FILE = 'session.pkl'
@@ -160,6 +154,12 @@ def save_df_as_csv(df, filename, folder=DATA_FOLDER):
         print(f"DataFrame {df} is empty. No {filename} file will be saved.")
         return
     
+    # Store the canonical hero key with every snapshot that identifies heroes
+    if 'hero_id' in df.columns or 'hero_handle' in df.columns:
+        df = key_snapshot(df, folder)
+    elif 'id' in df.columns and 'handle' in df.columns:
+        df = key_snapshot(df, folder, id_column='id', handle_column='handle')
+
     # Proceed with saving the file if not empty
     timestamp = datetime.now().strftime('%y%m%d_%H%M')
     filename_with_timestamp = f"{filename}_{timestamp}.csv"
@@ -184,11 +184,15 @@ def print_runtime(func, *args, **kwargs):
 ############################################################################
 
 def get_random_user_agent():
+    from fake_useragent import UserAgent
     ua = UserAgent(platforms='pc')
     return ua.random
 
 def setup_driver():
-    
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
     options = webdriver.ChromeOptions()
     options.add_argument(f"user-agent={get_random_user_agent()}")
     options.add_argument("--headless")
@@ -205,6 +209,13 @@ def setup_driver():
     return driver
 
 def login_to_fantasy(driver, username, password):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
     driver.get("https://www.fantasy.top/home")
     wait = WebDriverWait(driver, 5)
 
@@ -242,6 +253,11 @@ def login_to_fantasy(driver, username, password):
             print("Twitter login flow elements not found. Login might have failed.")
 
 def check_login_success(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
     try:
         # Wait for the element to be present
         element = WebDriverWait(driver, 10).until(
@@ -265,6 +281,11 @@ def check_login_success(driver):
         return False
     
 def close_popup_if_appears(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
     try:
         close_popup_button = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-testid='xMigrationBottomBar']"))
@@ -274,6 +295,11 @@ def close_popup_if_appears(driver):
         print("Close popup button did not appear.")
 
 def authorize_if_appears(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
     try:
         authorize_button = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-testid='OAuth_Consent_Button']"))
@@ -283,6 +309,11 @@ def authorize_if_appears(driver):
         print("Authorize app button did not appear.")
 
 def accept_terms_if_appears(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
     try:
         accept_button = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, "button.sc-fqkvVR.sc-iGgWBj.dQeymh.httOiR"))
@@ -292,6 +323,11 @@ def accept_terms_if_appears(driver):
         print("Accept button did not appear.")
 
 def login():
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.common.action_chains import ActionChains
+
+    check_env_vars()
+    ensure_data_folder()
     driver = setup_driver()
     driver.get("https://www.fantasy.top/home")
 
@@ -318,7 +354,14 @@ def login():
 # Data Download Supporting Functions
 ############################################################################
 
+# Shared by every update job, so jobs running in parallel stay within one request rate
+REQUEST_BUDGET = RequestBudget()
+
 def send_graphql_request(query=None, variables=None, token=None, request_type='graphql', params=None, cookies=None):
+    with REQUEST_BUDGET:
+        return send_request(query, variables, token, request_type, params, cookies)
+
+def send_request(query=None, variables=None, token=None, request_type='graphql', params=None, cookies=None):
     if request_type == 'graphql':
         payload = json.dumps({
             "query": query,
@@ -398,6 +441,11 @@ def retry_request(func, max_retries=5, base_delay=1, max_delay=60, *args, **kwar
 ############################################################################
 
 def download_listings(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.common.exceptions import ElementClickInterceptedException
+
     actions = ActionChains(driver)
     actions.send_keys(Keys.F12).perform() 
     driver.get('https://fantasy.top/marketplace')
@@ -1497,6 +1545,7 @@ def update_tournaments_stats(token, check_existing=True):
 
             if len(tournament_stats_df) > 0:
                 # Save to CSV
+                tournament_stats_df = key_snapshot(tournament_stats_df, DATA_FOLDER)
                 tournament_stats_df.to_csv(file_path, index=False)
                 print(f"DataFrame for {simplified_name} saved to {file_path} with {len(tournament_stats_df)} rows")
             else:
@@ -1505,7 +1554,7 @@ def update_tournaments_stats(token, check_existing=True):
         except Exception as e:
             print(f"Failed to fetch data for tournament {tournament_id} with error: {str(e)}")
 
-def get_tournament_status(player_id, token):
+def get_tournament_status(player_id, token, include_rewards=False):
     def get_registered_tournament_data(player_id, token):
         query_get_registered_tournament_ids = """
         query GET_REGISTERED_TOURNAMENT_IDS($player_id: String!) {
@@ -1611,17 +1660,36 @@ def get_tournament_status(player_id, token):
         
         return pd.DataFrame(data)
 
-    def create_trournament_rank_rewards_table(token):
-        response = get_registered_tournament_data(player_id, token)
-        tournament_standings = extract_registered_tournament_data(response)
-        
-        # Convert the tournament data to a DataFrame (if necessary) and save it as a CSV
-        
-        return tournament_standings
-        #  save_df_as_csv(tournaments_df, 'registered_tournaments')
-
-    current_tournaments_standings = create_trournament_rank_rewards_table(token)
+    def extract_tournament_rewards(response):
+        # One row per rank range of each reward type, with the number of registered players
+        tournaments = response.get('data', {}).get('tournaments_current_players', [])
+        data = []
 
+        for tournament_entry in tournaments:
+            tournament = tournament_entry['tournament']
+            players = ((tournament.get('current_players_aggregate') or {}).get('aggregate') or {}).get('count')
+            for reward in tournament['rewards']:
+                total_distribution = reward['total_distribution']
+                if not isinstance(total_distribution, list):
+                    continue
+                for dist in total_distribution:
+                    data.append({
+                        'Description': tournament['description'],
+                        'League': tournament.get('league'),
+                        'Players': players,
+                        'Type': reward['type'],
+                        'Start': dist['start'],
+                        'End': dist['end'],
+                        'Reward': dist['reward'],
+                    })
+
+        return pd.DataFrame(data, columns=['Description', 'League', 'Players', 'Type', 'Start', 'End', 'Reward'])
+
+    response = get_registered_tournament_data(player_id, token)
+    current_tournaments_standings = extract_registered_tournament_data(response)
+
+    if include_rewards:
+        return current_tournaments_standings, extract_tournament_rewards(response)
     return current_tournaments_standings
 
 
@@ -1687,6 +1755,7 @@ def update_last_trades(driver, token):
 def update_listings(driver):
     listings_df = print_runtime(download_listings, driver)
     save_df_as_csv(listings_df, 'listings')
+    check_price_alerts(DATA_FOLDER)
 
 def update_hero_stats(driver, token):
     hero_handles = get_hero_data_list('handle')
@@ -1697,6 +1766,7 @@ def update_hero_trades(driver, token):
     hero_ids = get_hero_data_list('id')
     hero_trades_df = print_runtime(download_hero_trades, hero_ids, token)
     save_df_as_csv(hero_trades_df, 'hero_trades')
+    check_price_alerts(DATA_FOLDER)
     
 def update_hero_supply(driver, token):
     hero_ids = get_hero_data_list('id')
@@ -1708,6 +1778,7 @@ def update_bids(driver, token):
     cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
     bids_df = print_runtime(get_bids, hero_ids, token, cookies)
     save_df_as_csv(bids_df, 'bids')
+    check_price_alerts(DATA_FOLDER)
 
 def update_star_history(driver, token):
     star_history_df = print_runtime(get_hero_stars, token)
@@ -1717,30 +1788,59 @@ def update_tournament_history(driver, token):
     print_runtime(update_tournaments_stats, token)
 
 def update_tournament_status(driver, token):
-    tournament_standings = print_runtime(get_tournament_status, PLAYER_ID, token)
+    tournament_standings, tournament_rewards = print_runtime(get_tournament_status, PLAYER_ID, token, include_rewards=True)
     tournament_standings.to_csv(DATA_FOLDER +'/current_tournament_standings.csv')
+    # Rank ranges and rewards of the current tournaments, used by the tournament simulator
+    tournament_rewards.to_csv(os.path.join(DATA_FOLDER, 'current_tournament_rewards.csv'), index=False)
 
 
-# Main Execution Function with Reusable Driver and Token
+############################################################################
+# Update jobs
+############################################################################
 
-update_unique_hero_list()
+def login_job(session):
+    if session.get('driver') is None or session.get('token') is None:
+        session['driver'], session['token'] = login()
+
+# Every update with what it needs. Most only need the token (and the hero list), so they run side by side;
+# the browser driver is held by one job at a time. Jobs are listed after the jobs they depend on.
+UPDATE_JOBS = [
+    UpdateJob("Log In", login_job, resources=['driver']),
+    UpdateJob("Update Star History", lambda session: update_star_history(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    # The hero list is built from the star history files
+    UpdateJob("Update Hero List", lambda session: update_unique_hero_list(), after=["Update Star History"]),
+    UpdateJob("Update Tournament Scores", lambda session: update_tournament_status(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    UpdateJob("Update Tournament Hero History", lambda session: update_tournament_history(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    UpdateJob("Update Basic Hero Stats", lambda session: update_basic_hero_stats(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    UpdateJob("Update Portfolio", lambda session: update_portfolio(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    UpdateJob("Update Last Trades", lambda session: update_last_trades(session['driver'], session['token']), deps=["Log In"], resources=['token']),
+    UpdateJob("Update Listings", lambda session: update_listings(session['driver']), deps=["Log In"], resources=['driver']),
+    UpdateJob("Update Hero Stats", lambda session: update_hero_stats(session['driver'], session['token']), deps=["Log In", "Update Hero List"], resources=['token']),
+    UpdateJob("Update Hero Trades", lambda session: update_hero_trades(session['driver'], session['token']), deps=["Log In", "Update Hero List"], resources=['token']),
+    UpdateJob("Update Hero Supply", lambda session: update_hero_supply(session['driver'], session['token']), deps=["Log In", "Update Hero List"], resources=['token']),
+    UpdateJob("Update Bids", lambda session: update_bids(session['driver'], session['token']), deps=["Log In", "Update Hero List"], resources=['token', 'driver']),
+]
+
+# Main Execution Function with Reusable Driver and Token
 
 def main():
-    driver, token = login()
+    missing_env_vars = get_missing_env_vars()
+    if missing_env_vars:
+        print(f"Error: Missing required environment variables: {', '.join(missing_env_vars)}")
+        print("Please ensure all required environment variables are set.")
+        sys.exit(1)  # Exit the script if any environment variables are missing
+
+    session = {}
     try:
-        update_star_history(driver, token)
-        update_tournament_status(PLAYER_ID, token)
-        update_basic_hero_stats(driver, token)
-        update_portfolio(driver, token) 
-        # update_last_trades(driver, token)
-        update_listings(driver)
-        update_hero_stats(driver, token)
-        update_hero_trades(driver, token)
-        update_hero_supply(driver, token)
-        update_bids(driver, token)
-        update_tournament_history(driver, token)
+        UpdateScheduler(UPDATE_JOBS).run([
+            "Update Star History", "Update Tournament Scores", "Update Basic Hero Stats", "Update Portfolio",
+            # "Update Last Trades",
+            "Update Listings", "Update Hero Stats", "Update Hero Trades", "Update Hero Supply", "Update Bids",
+            "Update Tournament Hero History",
+        ], session)
     finally:
-        driver.quit()
+        if session.get('driver') is not None:
+            session['driver'].quit()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
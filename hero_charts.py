@@ -0,0 +1,40 @@
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Charts of the hero page, drawn from one hero's rows of the hero history and the trade candles.
+
+
+def build_hero_score_chart(results, hero_name):
+    """The hero's score in every tournament, oldest first, with the rank in the hover."""
+    fig = go.Figure(go.Scatter(
+        x=results['tournament'], y=results['fantasy_score'], customdata=results[['rank', 'heroes', 'start_date']].to_numpy(),
+        mode='lines+markers', name=hero_name,
+        hovertemplate='Tournament: %{x}<br>Starts: %{customdata[2]}<br>Points: %{y}<br>Rank: %{customdata[0]:.0f} of %{customdata[1]:.0f}<extra></extra>',
+    ))
+    fig.update_layout(
+        title=f"{hero_name} Tournament Scores",
+        xaxis_title="Tournament",
+        yaxis_title="Points",
+        xaxis=dict(categoryorder="array", categoryarray=list(results['tournament'])),
+        height=450,
+    )
+    return fig
+
+
+def build_candle_chart(candles, title):
+    """OHLC bars with the VWAP line on top and the volume (trades per bar) below."""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25], vertical_spacing=0.03)
+    fig.add_trace(go.Candlestick(
+        x=candles['start'], open=candles['open'], high=candles['high'], low=candles['low'], close=candles['close'], name='Price (ETH)',
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(x=candles['start'], y=candles['vwap'], mode='lines', name='VWAP'), row=1, col=1)
+    fig.add_trace(go.Bar(x=candles['start'], y=candles['volume'], name='Trades'), row=2, col=1)
+    fig.update_layout(
+        title=title,
+        xaxis_rangeslider_visible=False,
+        legend=dict(orientation="h", yanchor="top", y=-0.15, xanchor="center", x=0.5),
+        height=600,
+    )
+    fig.update_yaxes(title_text="ETH", row=1, col=1)
+    fig.update_yaxes(title_text="Trades", row=2, col=1)
+    return fig
@@ -0,0 +1,206 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Canonical hero table: a dense integer hero_key per hero, with one row per (hero_id, hero_handle) alias it
+# has been seen under, so a renamed handle keeps its key. Rows are only ever appended, later rows are newer.
+HERO_DIMENSION_FILE = 'hero_dimension.csv'
+DIMENSION_COLUMNS = ['hero_key', 'hero_id', 'hero_handle']
+# Update jobs run in parallel threads, and each read-register-save of the dimension file must not interleave
+_DIMENSION_LOCK = threading.Lock()
+
+
+def get_hero_dimension_path(folder_path):
+    return os.path.join(folder_path, HERO_DIMENSION_FILE)
+
+
+def empty_hero_dimension():
+    return pd.DataFrame({'hero_key': pd.Series(dtype='int64'), 'hero_id': pd.Series(dtype=object), 'hero_handle': pd.Series(dtype=object)})
+
+
+def normalise_hero_ids(values):
+    """Hero ids as strings ('1000', never '1000.0'), None where missing."""
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    numeric = pd.to_numeric(values, errors='coerce')
+    ids = values.astype(str).where(values.notna(), None)
+    is_integral = numeric.notna() & (numeric % 1 == 0)
+    ids[is_integral] = numeric[is_integral].astype('int64').astype(str)
+    return ids.to_numpy(dtype=object)
+
+
+def normalise_hero_handles(values):
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    return values.astype(str).where(values.notna(), None).to_numpy(dtype=object)
+
+
+def load_hero_dimension(folder_path):
+    dimension_path = get_hero_dimension_path(folder_path)
+    if not os.path.exists(dimension_path):
+        return empty_hero_dimension()
+    try:
+        dimension = pd.read_csv(dimension_path, dtype={'hero_id': str, 'hero_handle': str})
+    except Exception as e:
+        print(f"Error reading hero dimension {dimension_path}: {e}")
+        return empty_hero_dimension()
+    dimension['hero_id'] = normalise_hero_ids(dimension['hero_id'])
+    dimension['hero_handle'] = normalise_hero_handles(dimension['hero_handle'])
+    return dimension[DIMENSION_COLUMNS]
+
+
+def save_hero_dimension(dimension, folder_path):
+    dimension_path = get_hero_dimension_path(folder_path)
+    try:
+        os.makedirs(folder_path, exist_ok=True)
+        dimension.to_csv(dimension_path, index=False)
+    except Exception as e:
+        print(f"Error saving hero dimension {dimension_path}: {e}")
+
+
+def register_heroes(dimension, hero_ids=None, hero_handles=None):
+    """Assigns keys to heroes not yet in the dimension and records new handles of known heroes.
+
+    Heroes are matched on hero_id first (it never changes), then on hero_handle. Returns the
+    updated dimension and whether anything was added."""
+    n_rows = len(hero_ids) if hero_ids is not None else len(hero_handles)
+    pairs = pd.DataFrame({
+        'hero_id': normalise_hero_ids(hero_ids) if hero_ids is not None else [None] * n_rows,
+        'hero_handle': normalise_hero_handles(hero_handles) if hero_handles is not None else [None] * n_rows,
+    }).dropna(how='all').drop_duplicates()
+
+    id_keys = dict(zip(dimension['hero_id'], dimension['hero_key']))
+    id_keys.pop(None, None)
+    handle_keys = dict(zip(dimension['hero_handle'], dimension['hero_key']))
+    handle_keys.pop(None, None)
+    keys_with_id = set(dimension.loc[dimension['hero_id'].notna(), 'hero_key'])
+    next_key = int(dimension['hero_key'].max()) + 1 if len(dimension) else 0
+
+    new_rows = []
+    for hero_id, hero_handle in pairs.itertuples(index=False):
+        key = id_keys.get(hero_id) if hero_id is not None else None
+        if key is None and hero_handle is not None:
+            candidate = handle_keys.get(hero_handle)
+            # A handle only counts as the same hero if it has not already been tied to another id
+            if candidate is not None and (hero_id is None or candidate not in keys_with_id):
+                key = candidate
+        if key is None:
+            key = next_key
+            next_key += 1
+
+        is_new_id = hero_id is not None and hero_id not in id_keys
+        is_new_handle = hero_handle is not None and handle_keys.get(hero_handle) != key
+        if is_new_id or is_new_handle:
+            new_rows.append((key, hero_id, hero_handle))
+            if hero_id is not None:
+                id_keys[hero_id] = key
+                keys_with_id.add(key)
+            if hero_handle is not None:
+                handle_keys[hero_handle] = key
+
+    if not new_rows:
+        return dimension, False
+    added = pd.DataFrame(new_rows, columns=DIMENSION_COLUMNS)
+    added['hero_key'] = added['hero_key'].astype('int64')
+    return pd.concat([dimension, added], ignore_index=True), True
+
+
+def register_hero_frames(dimension, frames):
+    """Registers the heroes of several frames (any with a hero_id and/or hero_handle column)."""
+    # Frames with both an id and a handle go first, so an id-only and a handle-only sighting resolve to one hero
+    frames = sorted(frames, key=lambda df: not ('hero_id' in df.columns and 'hero_handle' in df.columns))
+    changed = False
+    for df in frames:
+        if 'hero_id' not in df.columns and 'hero_handle' not in df.columns:
+            continue
+        hero_ids = df['hero_id'] if 'hero_id' in df.columns else None
+        hero_handles = df['hero_handle'] if 'hero_handle' in df.columns else None
+        dimension, added = register_heroes(dimension, hero_ids, hero_handles)
+        changed = changed or added
+    return dimension, changed
+
+
+def get_hero_keys(dimension, hero_ids=None, hero_handles=None):
+    """Looks up hero keys by hero_id, falling back to hero_handle. Unknown heroes get -1."""
+    n_rows = len(hero_ids) if hero_ids is not None else len(hero_handles)
+    keys = np.full(n_rows, -1, dtype='int64')
+    if dimension.empty:
+        return keys
+    dimension_keys = dimension['hero_key'].to_numpy(dtype='int64')
+    if hero_ids is not None:
+        positions = lookup_positions(dimension['hero_id'], normalise_hero_ids(hero_ids))
+        keys = np.where(positions >= 0, dimension_keys[positions], keys)
+    if hero_handles is not None:
+        positions = lookup_positions(dimension['hero_handle'], normalise_hero_handles(hero_handles))
+        keys = np.where((keys < 0) & (positions >= 0), dimension_keys[positions], keys)
+    return keys
+
+
+def lookup_positions(dimension_column, values):
+    """Position of the latest dimension row holding each value, -1 if there is none."""
+    column = pd.Series(dimension_column.to_numpy(dtype=object))
+    latest = column[column.notna()].drop_duplicates(keep='last')
+    if latest.empty:
+        return np.full(len(values), -1, dtype='int64')
+    positions = pd.Index(latest.to_numpy()).get_indexer(values)
+    return np.where(positions >= 0, latest.index.to_numpy()[positions], -1)
+
+
+def get_current_handles(dimension, keys):
+    """The most recent handle of each hero key (None for unknown keys)."""
+    with_handle = dimension[dimension['hero_handle'].notna()].drop_duplicates('hero_key', keep='last')
+    return align_to_hero_keys(with_handle, keys)['hero_handle'].to_numpy(dtype=object)
+
+
+def get_hero_ids(dimension, keys):
+    with_id = dimension[dimension['hero_id'].notna()].drop_duplicates('hero_key', keep='last')
+    return align_to_hero_keys(with_id, keys)['hero_id'].to_numpy(dtype=object)
+
+
+def add_hero_keys(df, dimension, id_column='hero_id', handle_column='hero_handle'):
+    """Returns a copy of df with the hero_key of every row as its first column."""
+    hero_ids = df[id_column] if id_column in df.columns else None
+    hero_handles = df[handle_column] if handle_column in df.columns else None
+    keyed = df.drop(columns=['hero_key'], errors='ignore')
+    keyed.insert(0, 'hero_key', get_hero_keys(dimension, hero_ids, hero_handles))
+    return keyed
+
+
+def key_snapshot(df, folder_path, id_column='hero_id', handle_column='hero_handle'):
+    """Registers the heroes of a freshly downloaded snapshot and stores their keys in it."""
+    hero_ids = df[id_column] if id_column in df.columns else None
+    hero_handles = df[handle_column] if handle_column in df.columns else None
+    if hero_ids is None and hero_handles is None:
+        return df
+    with _DIMENSION_LOCK:
+        dimension, changed = register_heroes(load_hero_dimension(folder_path), hero_ids, hero_handles)
+        if changed:
+            save_hero_dimension(dimension, folder_path)
+    return add_hero_keys(df, dimension, id_column, handle_column)
+
+
+def align_to_hero_keys(frame, keys):
+    """Rows of frame (which has a hero_key column) in the order of keys, NaN rows for keys it lacks.
+
+    Keys are dense integers, so this is a positional gather through a key -> row array rather
+    than a hash join. Only the first row of a key is used."""
+    keys = np.asarray(keys, dtype='int64')
+    frame_keys = frame['hero_key'].to_numpy(dtype='int64')
+    size = int(max(frame_keys.max(initial=-1), keys.max(initial=-1))) + 1
+    if size == 0:
+        # No valid key on either side (e.g. no hero dimension yet), so every row is missing
+        return frame.iloc[:0].reindex(range(len(keys))).reset_index(drop=True)
+    lookup = np.full(size, -1, dtype='int64')
+    valid_frame_keys = frame_keys >= 0
+    # Assigning in reverse leaves the first row of a duplicated key in the lookup
+    lookup[frame_keys[valid_frame_keys][::-1]] = np.flatnonzero(valid_frame_keys)[::-1]
+    rows = np.where(keys >= 0, lookup[np.maximum(keys, 0)], -1)
+    return frame.reset_index(drop=True).reindex(rows).reset_index(drop=True)
+
+
+def join_on_hero_key(left, right):
+    """Left join of right onto left by hero_key, suffixing shared columns with _x/_y like pd.merge."""
+    aligned = align_to_hero_keys(right, left['hero_key']).drop(columns=['hero_key'])
+    overlap = [col for col in aligned.columns if col in left.columns]
+    left = left.reset_index(drop=True).rename(columns={col: f"{col}_x" for col in overlap})
+    aligned = aligned.rename(columns={col: f"{col}_y" for col in overlap})
+    return pd.concat([left, aligned], axis=1)
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from hero_dimension import add_hero_keys
+
+# What the hero page shows about one hero, grouped by hero: every tournament result, the latest card supply and
+# the latest listings. Each table is sorted by hero once, when compile_data saves HERO_HISTORY_FILE, so a page
+# view is a dictionary lookup and a slice per table instead of a scan of the snapshots and tournament files.
+# Usage: python hero_history.py <hero_handle>
+HERO_HISTORY_FILE = 'hero_history.pkl'
+
+
+def get_hero_history_path(folder_path):
+    return os.path.join(folder_path, HERO_HISTORY_FILE)
+
+
+class HeroRows:
+    """The rows of a frame grouped by one key column, so all the rows of a key are one slice.
+
+    Rows keep their order within a key (e.g. oldest first)."""
+
+    def __init__(self, df, key):
+        # Integer codes sort much faster than the keys themselves (e.g. hero_id strings), and numpy
+        # radix-sorts 16-bit integers, which hold the codes of any realistic number of heroes
+        codes, keys = pd.factorize(df[key])
+        if len(keys) < 2 ** 15:
+            codes = codes.astype('int16')
+        # Positions of the rows of each key; the frame itself is not reordered
+        self.order = np.argsort(codes, kind='stable')
+        self.df = df
+        # Rows without a key (code -1) sort first and belong to no slice
+        ends = np.searchsorted(codes[self.order], np.arange(len(keys)), side='right')
+        starts = ends - np.bincount(codes[codes >= 0], minlength=len(keys))
+        self.slices = dict(zip(keys.tolist(), zip(starts.tolist(), ends.tolist())))
+
+    def get(self, key):
+        start, end = self.slices.get(key, (0, 0))
+        return self.df.iloc[self.order[start:end]]
+
+
+def key_latest_rows(df, hero_dimension):
+    """One row per hero of a snapshot, keyed by hero_key."""
+    if df is None:
+        return pd.DataFrame(columns=['hero_key'])
+    keyed = add_hero_keys(df, hero_dimension)
+    return keyed[keyed['hero_key'] >= 0].drop_duplicates('hero_key')
+
+
+class HeroHistory:
+    """Tournament results, card supply and listings of every hero, by hero_key."""
+
+    def __init__(self, tournament_results, supply, listings):
+        self.tournaments = HeroRows(tournament_results, 'hero_key')
+        self.supply = HeroRows(supply, 'hero_key')
+        self.listings = HeroRows(listings, 'hero_key')
+
+    @classmethod
+    def from_snapshots(cls, tournament_scores, hero_dimension, supply_df=None, listings_df=None):
+        """Builds the history from the long (hero_handle, tournament, start_date, fantasy_score) tournament
+        table and the latest supply and listings snapshots."""
+        scores = pd.to_numeric(tournament_scores['fantasy_score'], errors='coerce')
+        by_tournament = scores.groupby(tournament_scores['tournament'])
+        # Ranked against every hero in the tournament, including those missing from the hero dimension
+        results = tournament_scores.assign(
+            fantasy_score=scores,
+            rank=by_tournament.rank(ascending=False, method='min'),
+            heroes=by_tournament.transform('count'),
+        )
+        results['percentile'] = (1 - (results['rank'] - 1) / results['heroes']) * 100
+        results = add_hero_keys(results, hero_dimension, handle_column='hero_handle')
+        results = results[results['hero_key'] >= 0].sort_values('start_date', kind='stable')
+        results = results[['hero_key', 'tournament', 'start_date', 'fantasy_score', 'rank', 'heroes', 'percentile']]
+        return cls(results, key_latest_rows(supply_df, hero_dimension), key_latest_rows(listings_df, hero_dimension))
+
+    def hero(self, hero_key):
+        """The tournament results (oldest first), supply and listings rows of one hero."""
+        return {
+            'tournaments': self.tournaments.get(hero_key),
+            'supply': self.supply.get(hero_key),
+            'listings': self.listings.get(hero_key),
+        }
+
+
+def load_hero_history(history_path):
+    if history_path and os.path.exists(history_path):
+        try:
+            with open(history_path, 'rb') as file:
+                return pickle.load(file)
+        except Exception as e:
+            print(f"Could not load hero history {history_path}: {e}")
+    return None
+
+
+def save_hero_history(history, history_path):
+    """Saves the history, returning the path (or None if the write failed)."""
+    try:
+        os.makedirs(os.path.dirname(history_path) or '.', exist_ok=True)
+        with open(history_path, 'wb') as file:
+            pickle.dump(history, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return history_path
+    except Exception as e:
+        print(f"Could not save hero history {history_path}: {e}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from hero_dimension import load_hero_dimension, get_hero_keys
+    load_dotenv()
+    folder_path = os.getenv("DATA_FOLDER", "data")
+    history = load_hero_history(get_hero_history_path(folder_path))
+    if history is None:
+        print("No hero history yet, run compile_data first")
+        sys.exit(1)
+    handle = sys.argv[1] if len(sys.argv) > 1 else None
+    hero_key = int(get_hero_keys(load_hero_dimension(folder_path), None, pd.Series([handle]))[0]) if handle else next(iter(history.tournaments.slices))
+    start = time.perf_counter()
+    for _ in range(100):
+        hero = history.hero(hero_key)
+    print(f"Hero {handle or hero_key}: lookup in {(time.perf_counter() - start) * 10:.3f} ms")
+    for name, rows in hero.items():
+        print(f"{name}:")
+        print(rows.to_string(index=False))
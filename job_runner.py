@@ -0,0 +1,208 @@
+import os
+import json
+import sqlite3
+import threading
+import traceback
+import uuid
+from contextlib import closing
+from datetime import datetime
+from update_scheduler import JobCancelled
+
+# Background runner for the data update jobs. Jobs live in a small SQLite table in the data folder, so their
+# progress survives browser refreshes and is shared by every session of the app; a worker thread in the
+# Streamlit server hands each job to an UpdateScheduler, off the script thread.
+JOBS_FILE = 'jobs.sqlite'
+ACTIVE_STATUSES = ('queued', 'running', 'cancelling')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+# Seconds the worker sleeps between checks for queued jobs (submit wakes it straight away)
+POLL_INTERVAL = 5
+# Identifies this server process in the jobs it runs. A PID cannot: in Docker the app is PID 1 after every
+# restart, and PIDs are reused
+RUN_ID = uuid.uuid4().hex
+
+JOB_COLUMNS = ['id', 'status', 'steps', 'current_step', 'completed_steps', 'total_steps', 'message',
+               'error', 'worker_pid', 'run_id', 'created_at', 'started_at', 'finished_at']
+
+
+def get_jobs_path(folder_path):
+    return os.path.join(folder_path, JOBS_FILE)
+
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobRunner:
+    """Runs jobs in a background thread, one job at a time.
+
+    A job is a list of update job names, run by the scheduler with the runner's session dict,
+    which keeps the logged-in driver and token between jobs. Only one job can be queued or
+    running at once; submit refuses another until it finishes. Cancelling stops any more update
+    jobs from starting, since one already downloading cannot be interrupted safely.
+    """
+
+    def __init__(self, db_path, scheduler):
+        self.db_path = db_path
+        self.scheduler = scheduler
+        self.session = {'driver': None, 'token': None}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.init_db()
+
+    def connect(self):
+        # A connection per call, as the worker thread and the script threads all use the table
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def init_db(self):
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with closing(self.connect()) as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT NOT NULL,
+                    steps TEXT NOT NULL,
+                    current_step TEXT,
+                    completed_steps INTEGER NOT NULL DEFAULT 0,
+                    total_steps INTEGER NOT NULL,
+                    message TEXT,
+                    error TEXT,
+                    worker_pid INTEGER,
+                    run_id TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )""")
+            # Tables made before jobs recorded the run id of their worker
+            if 'run_id' not in [row['name'] for row in connection.execute("PRAGMA table_info(jobs)")]:
+                connection.execute("ALTER TABLE jobs ADD COLUMN run_id TEXT")
+            # Jobs started by an earlier run of the app (e.g. before a restart) will never finish
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, message = ?, finished_at = ? "
+                "WHERE status IN ('running', 'cancelling') AND (run_id IS NULL OR run_id != ?)",
+                ('Interrupted: the app stopped while the job was running', 'Interrupted', now(), RUN_ID))
+
+    def submit(self, targets):
+        """Queues a job running the targets and the update jobs they need. Returns its id, or None if a job is already active."""
+        steps = self.scheduler.plan(targets)
+        connection = self.connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock, so two sessions cannot both see no active job and insert one
+            connection.execute("BEGIN IMMEDIATE")
+            placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+            active = connection.execute(f"SELECT id FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES).fetchone()
+            if active is not None:
+                connection.execute("ROLLBACK")
+                return None
+            cursor = connection.execute(
+                "INSERT INTO jobs (status, steps, total_steps, message, created_at) VALUES ('queued', ?, ?, 'Queued', ?)",
+                (json.dumps(list(steps)), len(steps), now()))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def cancel(self, job_id):
+        """Asks a job to stop. A queued job is cancelled at once, a running one after its current step."""
+        with closing(self.connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (now(), job_id))
+            connection.execute("UPDATE jobs SET status = 'cancelling', message = 'Cancelling...' WHERE id = ? AND status = 'running'", (job_id,))
+
+    def get_job(self, job_id):
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self.row_to_job(row)
+
+    def get_active_job(self):
+        placeholders = ', '.join('?' for _ in ACTIVE_STATUSES)
+        with closing(self.connect()) as connection:
+            row = connection.execute(f"SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY id LIMIT 1", ACTIVE_STATUSES).fetchone()
+        return self.row_to_job(row)
+
+    def get_last_job(self):
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT 1").fetchone()
+        return self.row_to_job(row)
+
+    @staticmethod
+    def row_to_job(row):
+        if row is None:
+            return None
+        job = {col: row[col] for col in JOB_COLUMNS}
+        job['steps'] = json.loads(job['steps'])
+        return job
+
+    def update_job(self, job_id, **fields):
+        assignments = ', '.join(f"{col} = ?" for col in fields)
+        with closing(self.connect()) as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def is_cancel_requested(self, job_id):
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row['status'] == 'cancelling'
+
+    def claim_next_job(self):
+        """Marks the oldest queued job as running in this process and returns it."""
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            claimed = connection.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, run_id = ?, started_at = ? WHERE id = ? AND status = 'queued'",
+                (os.getpid(), RUN_ID, now(), row['id'])).rowcount
+        return self.get_job(row['id']) if claimed else None
+
+    def run_job(self, job):
+        job_id = job['id']
+        running = []
+        completed = []
+
+        def on_start(step):
+            running.append(step)
+            self.update_job(job_id, current_step=', '.join(running), message=f"{', '.join(running)}...")
+
+        def on_finish(step):
+            running.remove(step)
+            completed.append(step)
+            self.update_job(job_id, current_step=', '.join(running), completed_steps=len(completed),
+                            message=f"{', '.join(running)}..." if running else f"Finished {step}")
+
+        try:
+            self.scheduler.run(job['steps'], self.session, on_start=on_start, on_finish=on_finish,
+                               is_cancelled=lambda: self.is_cancel_requested(job_id))
+            self.update_job(job_id, status='completed', current_step=None, message='Completed', finished_at=now())
+        except JobCancelled:
+            self.update_job(job_id, status='cancelled', current_step=None, message='Cancelled', finished_at=now())
+        except Exception as e:
+            traceback.print_exc()
+            self.update_job(job_id, status='failed', current_step=None, message='Failed', error=str(e), finished_at=now())
+
+    def run(self):
+        while not self._stop.is_set():
+            job = self.claim_next_job()
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            print(f"Running job {job['id']}: {', '.join(job['steps'])}")
+            self.run_job(job)
+
+    def start(self):
+        """Starts the worker thread (once per process)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="job-runner", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,296 @@
+import os
+import pandas as pd
+from data_compiler import (
+    DATA_FOLDER, COMPILE_INPUTS, RARITY_MULTIPLIERS, get_latest_csv_files, get_sorted_tournament_files,
+    get_tournament_column_names, generate_all_scores_list, save_compiled_csv, calculate_value_analysis,
+    get_tournament_start_dates, hero_history_stage, trade_candles_stage
+)
+from hero_dimension import load_hero_dimension, save_hero_dimension, register_hero_frames
+from score_correlation import get_score_correlation_path, update_score_correlation
+from score_index import ScoreIndex, get_score_index_path, save_score_index
+from hero_history import get_hero_history_path
+
+# Polars is optional: this backend is only used when it is installed and selected with COMPILE_BACKEND=polars
+
+
+def scan_snapshot(pl, file_path):
+    # Full schema inference, so a float further down an integer-looking column is not misread
+    return pl.scan_csv(file_path, infer_schema_length=None)
+
+
+def get_columns(frame):
+    return frame.collect_schema().names()
+
+
+def join_like_pandas(pl, left, right, on):
+    """Left join that keeps the left row order and suffixes overlapping columns with _x/_y like pd.merge."""
+    left_columns = get_columns(left)
+    right_columns = get_columns(right)
+    overlap = [col for col in left_columns if col in right_columns and col not in on]
+    left = left.rename({col: f"{col}_x" for col in overlap}).with_row_index('__row')
+    right = right.rename({col: f"{col}_y" for col in overlap})
+    joined = left.join(right, on=on, how='left', coalesce=True).sort('__row', maintain_order=True)
+    return joined.drop('__row')
+
+
+def join_on_hero_key(pl, left, right):
+    """Left join on hero_key using only the first row of each key in right, like the pandas backend."""
+    right = right.unique(subset=['hero_key'], keep='first', maintain_order=True)
+    return join_like_pandas(pl, left, right, ['hero_key'])
+
+
+def hero_id_as_text(pl, dtype):
+    """hero_id as the dimension stores it ('1000', never '1000.0')."""
+    if dtype.is_integer():
+        return pl.col('hero_id').cast(pl.Utf8)
+    if dtype.is_float():
+        return pl.col('hero_id').cast(pl.Int64, strict=False).cast(pl.Utf8)
+    return pl.col('hero_id').cast(pl.Utf8)
+
+
+def with_hero_keys(pl, frame, dimension):
+    """Adds hero_key as the first column, looked up by hero_id and then by hero_handle (-1 if unknown)."""
+    schema = frame.collect_schema()
+    key = pl.lit(None, dtype=pl.Int64)
+    if 'hero_id' in schema:
+        with_id = dimension.dropna(subset=['hero_id']).drop_duplicates('hero_id', keep='last')
+        key = hero_id_as_text(pl, schema['hero_id']).replace_strict(
+            with_id['hero_id'].tolist(), with_id['hero_key'].tolist(), default=None, return_dtype=pl.Int64)
+    if 'hero_handle' in schema:
+        with_handle = dimension.dropna(subset=['hero_handle']).drop_duplicates('hero_handle', keep='last')
+        key = key.fill_null(pl.col('hero_handle').cast(pl.Utf8).replace_strict(
+            with_handle['hero_handle'].tolist(), with_handle['hero_key'].tolist(), default=None, return_dtype=pl.Int64))
+    columns = [col for col in schema.names() if col != 'hero_key']
+    return frame.select(key.fill_null(-1).alias('hero_key'), *columns)
+
+
+def replace_hero_key(pl, dimension, column):
+    """Maps hero_key to the latest value of a dimension column (hero_id or hero_handle)."""
+    latest = dimension.dropna(subset=[column]).drop_duplicates('hero_key', keep='last')
+    return pl.col('hero_key').replace_strict(latest['hero_key'].tolist(), latest[column].tolist(), default=None, return_dtype=pl.Utf8)
+
+
+def hero_pairs(frame):
+    """The distinct (hero_id, hero_handle) pairs of a scan, reading only those columns."""
+    columns = [col for col in ['hero_id', 'hero_handle'] if col in get_columns(frame)]
+    return frame.select(columns).unique(maintain_order=True) if columns else None
+
+
+def build_hero_dimension(pl, folder_path, pairs):
+    """Registers the distinct heroes of the inputs, like the pandas hero_dimension stage."""
+    dimension, changed = register_hero_frames(load_hero_dimension(folder_path), pairs)
+    if changed:
+        save_hero_dimension(dimension, folder_path)
+    return dimension
+
+
+def scan_tournament_scores(pl, folder_path):
+    """Lazily reads all tournament files into one long (hero_handle, fantasy_score, tournament) table."""
+    frames = []
+    tournament_columns = []
+    tournament_files = get_sorted_tournament_files(folder_path)
+    column_names = get_tournament_column_names(tournament_files)
+    for file_path in tournament_files:
+        column_name = column_names[file_path]
+        header = pl.read_csv(file_path, n_rows=0).columns
+        if 'hero_handle' not in header or 'fantasy_score' not in header:
+            print(f"Warning: File {file_path} does not have the required columns. Skipping.")
+            continue
+        tournament_columns.append(column_name)
+        frames.append(
+            scan_snapshot(pl, file_path)
+            .select(pl.col('hero_handle'), pl.col('fantasy_score').cast(pl.Float64), pl.lit(column_name).alias('tournament'))
+        )
+
+    return pl.concat(frames, how='vertical'), tournament_columns
+
+
+def pivot_tournament_scores(pl, long_scores, tournament_columns, dimension):
+    """Pivots to one row per hero_key and one column per tournament (most recent first).
+
+    A pivot expressed as conditional aggregations, so it stays part of the lazy plan. Rows of a hero who
+    played under several handles are combined."""
+    keyed = with_hero_keys(pl, long_scores, dimension).filter(pl.col('hero_key') >= 0)
+    wide_scores = keyed.group_by('hero_key').agg([
+        pl.col('fantasy_score').filter((pl.col('tournament') == col) & pl.col('fantasy_score').is_not_null()).first().alias(col)
+        for col in tournament_columns
+    ]).sort('hero_key')
+    return wide_scores.select('hero_key', replace_hero_key(pl, dimension, 'hero_handle').alias('hero_handle'), *tournament_columns)
+
+
+def with_tournament_statistics(pl, scores, tournament_columns):
+    """Adds the same statistics as calculate_tournament_statistics as horizontal expressions."""
+    main_columns = [col for col in tournament_columns if 'Main' in col]
+    last_4_columns = main_columns[:4]
+
+    def mean_of(columns):
+        return pl.mean_horizontal([pl.col(col) for col in columns]) if columns else pl.lit(None, dtype=pl.Float64)
+
+    def variance_of(columns, mean_name):
+        if not columns:
+            return pl.lit(None, dtype=pl.Float64)
+        count = pl.sum_horizontal([pl.col(col).is_not_null().cast(pl.Int64) for col in columns])
+        squares = pl.sum_horizontal([(pl.col(col) - pl.col(mean_name)) ** 2 for col in columns])
+        return pl.when(count > 1).then(squares / (count - 1)).otherwise(None)
+
+    scores = scores.with_columns(
+        mean_of(tournament_columns).alias('Average'),
+        mean_of(main_columns).alias('Main_Tournaments_Ave'),
+        mean_of(last_4_columns).alias('Main_Last_4_Ave'),
+    ).with_columns(
+        variance_of(tournament_columns, 'Average').alias('Variance'),
+        variance_of(main_columns, 'Main_Tournaments_Ave').alias('Main_Tournaments_Variance'),
+        variance_of(last_4_columns, 'Main_Last_4_Ave').alias('Main_Last_4_Variance'),
+    ).with_columns(
+        pl.col('Variance').sqrt().alias('Standard_Deviation'),
+        pl.col('Main_Tournaments_Variance').sqrt().alias('Main_Tournaments_Standard_Deviation'),
+        pl.col('Main_Last_4_Variance').sqrt().alias('Main_Last_4_Standard_Deviation'),
+    ).with_columns([
+        ((pl.col(col) - pl.col('Average')) / pl.col('Standard_Deviation')).alias(f"Z_Score_{col}")
+        for col in tournament_columns
+    ])
+
+    # Mean of the three most recent main tournaments, only for heroes that played all three
+    recent_main = [pl.col(col) for col in main_columns[:3]]
+    if len(recent_main) < 3:
+        moving_average = pl.lit(None, dtype=pl.Float64)
+    else:
+        moving_average = pl.when(pl.all_horizontal([col.is_not_null() for col in recent_main])).then(pl.mean_horizontal(recent_main))
+    scores = scores.with_columns(moving_average.alias('Moving_Avg_3'))
+
+    # Like fillna(0): every missing value except the moving average becomes 0
+    schema = scores.collect_schema()
+    return scores.with_columns([
+        pl.col(col).fill_nan(0).fill_null(0) if schema[col].is_float() else pl.col(col).fill_null(0)
+        for col in schema.names() if col != 'Moving_Avg_3' and schema[col].is_numeric()
+    ])
+
+
+def scan_compile(pl, folder_path):
+    """Builds the lazy plans for allHeroData, portfolio and the pivoted tournament scores.
+
+    Also returns the input snapshot scans by prefix, for callers that need them as they are. Only the
+    hero (id, handle) pairs and the trade rarities are read here, as the plans depend on them."""
+    latest_files = get_latest_csv_files(folder_path)
+    long_scores, tournament_columns = scan_tournament_scores(pl, os.path.join(folder_path, "tournament_results"))
+    snapshots = {prefix: scan_snapshot(pl, latest_files[prefix]) for prefix in COMPILE_INPUTS}
+    # Registered in the same order as the pandas backend, so new heroes get the same keys. The hero list holds
+    # every (id, handle) pair seen, which ties the old handle of a renamed hero to its id
+    dimension_scans = list(snapshots.values()) + [long_scores]
+    if 'hero_list' in latest_files:
+        dimension_scans.insert(0, scan_snapshot(pl, latest_files['hero_list']).rename({'id': 'hero_id', 'handle': 'hero_handle'}, strict=False))
+    pair_scans = [pairs for pairs in map(hero_pairs, dimension_scans) if pairs is not None]
+    # Projected scans, so only the id, handle and rarity columns are read for these
+    *pairs, trade_rarities = pl.collect_all(pair_scans + [snapshots['hero_trades'].select(pl.col('rarity').cast(pl.Int64)).unique()])
+    dimension = build_hero_dimension(pl, folder_path, [to_pandas(frame) for frame in pairs])
+    keyed = {prefix: with_hero_keys(pl, snapshot, dimension) for prefix, snapshot in snapshots.items()}
+
+    raw_scores = pivot_tournament_scores(pl, long_scores, tournament_columns, dimension)
+    tournament_scores = with_tournament_statistics(pl, raw_scores, tournament_columns)
+    tournament_scores = tournament_scores.drop(['Name', 'hero_handle'], strict=False)
+
+    merged = keyed['basic_hero_stats'].unique(subset=['hero_key'], keep='first', maintain_order=True)
+    merged = join_on_hero_key(pl, merged, keyed['hero_stats'].drop('hero_handle'))
+    merged = join_on_hero_key(pl, merged, keyed['hero_card_supply'].drop('hero_id', strict=False))
+    merged = join_on_hero_key(pl, merged, keyed['listings'].drop(['hero_id', 'hero_handle'], strict=False))
+
+    # Latest trade price per hero and rarity, one column per rarity present in the trades
+    trades = keyed['hero_trades'].with_columns(pl.col('rarity').cast(pl.Int64))
+    rarities = sorted(trade_rarities.get_column('rarity').drop_nulls().to_list())
+    latest_trades = trades.sort(['hero_key', 'rarity', 'timestamp'], descending=True, maintain_order=True).group_by('hero_key').agg([
+        pl.col('price').filter(pl.col('rarity') == rarity).first().alias(f'rarity{rarity}lastSalePrice')
+        for rarity in rarities
+    ])
+    merged = join_on_hero_key(pl, merged, latest_trades)
+    merged = join_on_hero_key(pl, merged, tournament_scores)
+
+    # The dimension knows the id of every hero, missing ids become 'nan' like astype(str)
+    hero_id = replace_hero_key(pl, dimension, 'hero_id').fill_null('nan').alias('hero_id')
+    columns = get_columns(merged)
+    if 'hero_id' in columns:
+        merged = merged.with_columns(hero_id)
+    else:
+        position = columns.index('hero_handle') + 1
+        merged = merged.select(*columns[:position], hero_id, *columns[position:])
+
+    portfolio = scan_portfolio_scores(pl, keyed['portfolio'], merged, generate_all_scores_list(tournament_columns))
+    return merged, portfolio, raw_scores, snapshots
+
+
+def scan_portfolio_scores(pl, portfolio, merged, all_scores):
+    """The lazy equivalent of process_portfolio_scores."""
+    portfolio_scores = join_on_hero_key(pl, portfolio, merged.drop('hero_handle'))
+    portfolio_scores = portfolio_scores.drop(['hero_name_y', 'hero_stars_y', 'hero_followers_count_y', 'hero_profile_image_url_y', 'token_id'])
+    columns = get_columns(portfolio_scores)
+    portfolio_scores = portfolio_scores.rename({col: col.replace('_x', '') for col in columns if '_x' in col})
+    columns = [col.replace('_x', '') for col in columns]
+    columns_order = ['hero_name', 'hero_handle'] + [col for col in columns if col not in ['hero_name', 'hero_handle']]
+    portfolio_scores = portfolio_scores.select(columns_order)
+
+    schema = portfolio_scores.collect_schema()
+
+    def gather_by_rarity(column_template):
+        sources = [column_template.format(level) for level in RARITY_MULTIPLIERS]
+        # numpy picks a float result as soon as one rarity column is float or missing
+        as_float = any(col not in schema or schema[col].is_float() for col in sources)
+        gathered = pl.lit(None)
+        for level, col in zip(RARITY_MULTIPLIERS, sources):
+            if col in schema:
+                gathered = pl.when(pl.col('rarity') == level).then(pl.col(col)).otherwise(gathered)
+        return gathered.cast(pl.Float64) if as_float else gathered
+
+    portfolio_scores = portfolio_scores.with_columns(
+        gather_by_rarity('rarity{}lastSalePrice').alias('lastSalePrice'),
+        gather_by_rarity('rarity{}_lowest_price').alias('lowestPrice'),
+        gather_by_rarity('rarity{}Count').alias('rarityCount'),
+    )
+    columns_to_drop = [
+        'rarity1_lowest_price', 'rarity2_lowest_price', 'rarity3_lowest_price', 'rarity4_lowest_price',
+        'rarity1lastSalePrice', 'rarity2lastSalePrice', 'rarity3lastSalePrice', 'rarity4lastSalePrice',
+        'rarity1Count', 'rarity2Count', 'rarity3Count', 'rarity4Count',
+        'rarity1_order_count', 'rarity2_order_count', 'rarity3_order_count', 'rarity4_order_count'
+    ]
+    portfolio_scores = portfolio_scores.drop(columns_to_drop)
+
+    columns = get_columns(portfolio_scores)
+    score_columns = [col for col in dict.fromkeys(all_scores) if col in columns]
+    card_rarity = pl.col('hero_rarity_index').cast(pl.Utf8).str.split('_').list.last().cast(pl.Int64, strict=False)
+    multiplier = card_rarity.replace_strict(list(RARITY_MULTIPLIERS), list(RARITY_MULTIPLIERS.values()), default=1.0, return_dtype=pl.Float64).fill_null(1.0)
+    return portfolio_scores.with_columns([
+        pl.col(col).cast(pl.Float64, strict=False) * (multiplier ** 2 if 'Variance' in col else multiplier)
+        if 'Z_Score' not in col else pl.col(col).cast(pl.Float64, strict=False)
+        for col in score_columns
+    ])
+
+
+def to_pandas(frame):
+    """Converts column by column through numpy, so pyarrow is not needed for the hand-over."""
+    return pd.DataFrame({col: frame.get_column(col).to_numpy() for col in frame.columns})
+
+
+def compile_data_polars(folder_path=DATA_FOLDER):
+    """Compiles allHeroData.csv and portfolio.csv as a single optimised Polars query plan."""
+    import polars as pl
+
+    all_hero_plan, portfolio_plan, scores_plan, snapshots = scan_compile(pl, folder_path)
+    # Collecting the plans together lets Polars share the common sub-plans (the snapshot scans and the merged hero frame)
+    all_hero_data, portfolio_scores, raw_scores, supply, listings = pl.collect_all(
+        [all_hero_plan, portfolio_plan, scores_plan, snapshots['hero_card_supply'], snapshots['listings']])
+
+    # Written through pandas so the CSVs are formatted exactly like the pandas backend's
+    results = [
+        # The value analysis is the same vectorized pass as in the pandas pipeline
+        save_compiled_csv(os.path.join(folder_path, 'allHeroData.csv'), calculate_value_analysis(to_pandas(all_hero_data))),
+        save_compiled_csv(os.path.join(folder_path, 'portfolio.csv'), to_pandas(portfolio_scores)),
+    ]
+    # Score columns are most recent tournament first, the correlation state is built oldest first
+    tournament_columns = [col for col in raw_scores.columns if col not in ['hero_key', 'hero_handle']]
+    scores_df = to_pandas(raw_scores).set_index('hero_key')
+    update_score_correlation(get_score_correlation_path(folder_path), scores_df, tournament_columns[::-1])
+    start_dates = get_tournament_start_dates(os.path.join(folder_path, "tournament_results"))
+    save_score_index(ScoreIndex.from_scores(scores_df, tournament_columns[::-1], start_dates), get_score_index_path(folder_path))
+    trade_candles_stage(folder_path)
+    hero_history_stage(get_hero_history_path(folder_path), os.path.join(folder_path, "tournament_results"), load_hero_dimension(folder_path),
+                       to_pandas(supply), to_pandas(listings))
+    if all(results):
+        print(f"Files successfully saved to {folder_path}")
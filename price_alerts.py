@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import threading
+import operator
+import urllib.request
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from snapshot_diff import get_snapshot_files
+
+# Price alerts over the latest listings, bids and hero_trades snapshots. Rules are read from ALERT_RULES_FILE in the
+# data folder, a JSON list such as
+#   [{"name": "Cheap commons", "metric": "floor", "op": "<", "value": 0.002, "rarity": 4},
+#    {"name": "Wide spread", "metric": "spread_pct", "op": ">", "value": 50},
+#    {"name": "Sold over floor", "metric": "sale_premium_pct", "op": ">", "value": 30, "hero": "some_handle"}]
+# where rarity (1-4) and hero (handle or id) are optional. All rules are checked against every hero in a few
+# array operations. A match is delivered once, when it first appears, to ALERTS_FILE (one JSON object per line)
+# and, if the ALERT_WEBHOOK_URL environment variable is set, posted there as JSON.
+# Usage: python price_alerts.py [--benchmark]
+ALERT_RULES_FILE = 'alert_rules.json'
+ALERTS_FILE = 'alerts.jsonl'
+ALERT_STATE_FILE = 'alert_state.json'
+RARITIES = [1, 2, 3, 4]
+METRICS = ['floor', 'bid', 'last_sale', 'listed', 'spread', 'spread_pct', 'sale_premium_pct']
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Listings, bids and trades are saved by update jobs that may finish at the same time
+_ALERT_LOCK = threading.Lock()
+
+
+def read_latest_snapshot(folder_path, prefix):
+    files = get_snapshot_files(folder_path, prefix)
+    if not files:
+        return None, None
+    timestamp, file_path = files[-1]
+    try:
+        return pd.read_csv(file_path, dtype={'hero_id': str}), timestamp
+    except pd.errors.EmptyDataError:
+        return None, None
+
+
+def by_rarity(df, hero_ids, column_template):
+    """(heroes, rarities) array of column_template.format(rarity) for the heroes, NaN where missing or 0."""
+    if df is None or 'hero_id' not in df.columns:
+        return np.full((len(hero_ids), len(RARITIES)), np.nan)
+    columns = [column_template.format(rarity) for rarity in RARITIES]
+    values = df.drop_duplicates('hero_id').set_index('hero_id').reindex(index=hero_ids, columns=columns)
+    values = values.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    values[values == 0] = np.nan
+    return values
+
+
+def last_sale_prices(trades_df, hero_ids):
+    """(heroes, rarities) array of the latest trade price of each hero and rarity."""
+    if trades_df is None or trades_df.empty:
+        return np.full((len(hero_ids), len(RARITIES)), np.nan)
+    latest = trades_df.sort_values('timestamp').drop_duplicates(['hero_id', 'rarity'], keep='last')
+    latest = latest.assign(rarity=pd.to_numeric(latest['rarity'], errors='coerce'))
+    prices = latest.pivot(index='hero_id', columns='rarity', values='price').reindex(index=hero_ids, columns=RARITIES)
+    return prices.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+class MarketSnapshot:
+    """Every metric of every hero and rarity as one (heroes, metrics x rarities) array."""
+
+    def __init__(self, listings_df=None, bids_df=None, trades_df=None, snapshot=None):
+        frames = [df for df in [listings_df, bids_df] if df is not None and 'hero_id' in df.columns]
+        self.hero_ids = pd.Index(pd.unique(pd.concat([df['hero_id'] for df in frames]).dropna()) if frames else [])
+        handles = listings_df.drop_duplicates('hero_id').set_index('hero_id')['hero_handle'] if listings_df is not None and 'hero_handle' in listings_df.columns else pd.Series(dtype=object)
+        self.hero_handles = handles.reindex(self.hero_ids).to_numpy(dtype=object)
+        self.snapshot = snapshot
+
+        floor = by_rarity(listings_df, self.hero_ids, 'rarity{}_lowest_price')
+        bid = by_rarity(bids_df, self.hero_ids, 'rarity{}HighestBid')
+        last_sale = last_sale_prices(trades_df, self.hero_ids)
+        listed = by_rarity(listings_df, self.hero_ids, 'rarity{}_order_count')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics = {
+                'floor': floor,
+                'bid': bid,
+                'last_sale': last_sale,
+                'listed': np.nan_to_num(listed),
+                'spread': floor - bid,
+                'spread_pct': (floor - bid) / floor * 100,
+                'sale_premium_pct': (last_sale - floor) / floor * 100,
+            }
+        # Column METRICS.index(metric) * 4 + rarity - 1
+        self.values = np.concatenate([metrics[metric] for metric in METRICS], axis=1)
+        # Heroes of each column in ascending order of value (NaN last), so the heroes above or below a
+        # threshold are one run of a row
+        self.order = np.argsort(self.values.T, axis=1, kind='stable')
+        self.sorted_values = np.take_along_axis(self.values.T, self.order, axis=1)
+        self.valid_counts = (~np.isnan(self.values)).sum(axis=0)
+        self.hero_rows = {}
+        for row, handle in enumerate(self.hero_handles):
+            if isinstance(handle, str):
+                self.hero_rows[handle] = row
+        self.hero_rows.update({hero_id: row for row, hero_id in enumerate(self.hero_ids)})
+
+    @classmethod
+    def load(cls, folder_path):
+        listings_df, listings_time = read_latest_snapshot(folder_path, 'listings')
+        bids_df, bids_time = read_latest_snapshot(folder_path, 'bids')
+        trades_df, trades_time = read_latest_snapshot(folder_path, 'hero_trades')
+        snapshot = max([t for t in [listings_time, bids_time, trades_time] if t is not None], default=None)
+        return cls(listings_df, bids_df, trades_df, snapshot)
+
+
+class AlertRules:
+    """Rules compiled to arrays: the metric column, threshold and hero of each (rule, rarity) pair.
+
+    A rule over every hero matches a run of its column's sorted order, found with a binary search,
+    so evaluating hundreds of rules costs a few array operations plus one step per match. A rule
+    about one hero is a single lookup."""
+
+    def __init__(self, rules):
+        names, columns, thresholds, ops, heroes, rarities = [], [], [], [], [], []
+        for i, rule in enumerate(rules):
+            metric = rule.get('metric')
+            if metric not in METRICS:
+                raise ValueError(f"Rule {rule.get('name', i)}: unknown metric '{metric}', expected one of {METRICS}")
+            if rule.get('op') not in OPERATORS:
+                raise ValueError(f"Rule {rule.get('name', i)}: unknown operator '{rule.get('op')}', expected one of {list(OPERATORS)}")
+            rule_rarities = [int(rule['rarity'])] if rule.get('rarity') is not None else RARITIES
+            for rarity in rule_rarities:
+                names.append(rule.get('name', f"Rule {i + 1}"))
+                columns.append(METRICS.index(metric) * len(RARITIES) + RARITIES.index(rarity))
+                thresholds.append(float(rule['value']))
+                ops.append(rule['op'])
+                heroes.append(str(rule['hero']) if rule.get('hero') is not None else '')
+                rarities.append(rarity)
+        self.names = np.asarray(names, dtype=object)
+        self.columns = np.asarray(columns, dtype='int64')
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.ops = np.asarray(ops, dtype=object)
+        self.heroes = np.asarray(heroes, dtype=object)
+        self.rarities = np.asarray(rarities, dtype='int64')
+        self.metrics = np.asarray([METRICS[column // len(RARITIES)] for column in columns], dtype=object)
+
+    @classmethod
+    def load(cls, rules_path):
+        if not os.path.exists(rules_path):
+            return cls([])
+        with open(rules_path) as file:
+            return cls(json.load(file))
+
+    def evaluate(self, market):
+        """Matches as (hero row, rule) index arrays, plus the matched values."""
+        targeted = self.heroes != ''
+        broad = np.flatnonzero(~targeted)
+
+        # Start and end of each broad rule's run in its sorted column: below the threshold for < and <=,
+        # from it up to the last non-NaN value for > and >=. '<' and '>=' split at the first value equal
+        # to the threshold, '<=' and '>' after the last.
+        columns = self.columns[broad]
+        thresholds = self.thresholds[broad]
+        ops = self.ops[broad]
+        split = np.zeros(len(broad), dtype='int64')
+        left = np.isin(ops, ['<', '>='])
+        for column in np.unique(columns):
+            in_column = columns == column
+            values = market.sorted_values[column, :market.valid_counts[column]]
+            split[in_column & left] = np.searchsorted(values, thresholds[in_column & left], side='left')
+            split[in_column & ~left] = np.searchsorted(values, thresholds[in_column & ~left], side='right')
+        below = np.isin(ops, ['<', '<='])
+        start = np.where(below, 0, split)
+        end = np.where(below, split, market.valid_counts[columns] if len(columns) else split)
+
+        # Every (rule, position in run) pair at once
+        lengths = end - start
+        rule_index = np.repeat(np.arange(len(broad)), lengths)
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(start, lengths)
+        rows = market.order[columns[rule_index], positions]
+        rules = broad[rule_index]
+
+        # Rules about one hero, by id or handle
+        one_hero = np.flatnonzero(targeted)
+        hero_rows = np.array([market.hero_rows.get(hero, -1) for hero in self.heroes[one_hero]], dtype='int64')
+        one_hero, hero_rows = one_hero[hero_rows >= 0], hero_rows[hero_rows >= 0]
+        hero_values = market.values[hero_rows, self.columns[one_hero]]
+        matched = np.zeros(len(one_hero), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for symbol, compare in OPERATORS.items():
+                rule_mask = self.ops[one_hero] == symbol
+                matched[rule_mask] = compare(hero_values[rule_mask], self.thresholds[one_hero][rule_mask])
+
+        rows = np.concatenate([rows, hero_rows[matched]])
+        rules = np.concatenate([rules, one_hero[matched]])
+        return rows, rules, market.values[rows, self.columns[rules]]
+
+    def find_matches(self, market):
+        rows, rules, values = self.evaluate(market)
+        return pd.DataFrame({
+            'rule': self.names[rules],
+            'hero_id': np.asarray(market.hero_ids, dtype=object)[rows],
+            'hero_handle': market.hero_handles[rows],
+            'rarity': self.rarities[rules],
+            'metric': self.metrics[rules],
+            'op': self.ops[rules],
+            'threshold': self.thresholds[rules],
+            'value': values,
+            'snapshot': market.snapshot,
+        })
+
+
+def deliver_alerts(alerts, folder_path):
+    """Appends the alerts to ALERTS_FILE and posts them to ALERT_WEBHOOK_URL, if it is set."""
+    webhook_url = os.getenv("ALERT_WEBHOOK_URL")
+    records = json.loads(alerts.to_json(orient='records'))
+    with open(os.path.join(folder_path, ALERTS_FILE), 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+    if webhook_url:
+        try:
+            request = urllib.request.Request(webhook_url, data=json.dumps(records).encode(), headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(request, timeout=10).close()
+        except Exception as e:
+            print(f"Could not post {len(records)} alerts to the webhook: {e}")
+
+
+def check_price_alerts(folder_path):
+    """Checks the rules against the latest snapshots and delivers the matches that are new. Returns them."""
+    rules_path = os.path.join(folder_path, ALERT_RULES_FILE)
+    if not os.path.exists(rules_path):
+        return pd.DataFrame()
+    with _ALERT_LOCK:
+        try:
+            rules = AlertRules.load(rules_path)
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            print(f"Could not read the alert rules in {rules_path}: {e}")
+            return pd.DataFrame()
+        matches = rules.find_matches(MarketSnapshot.load(folder_path))
+
+        # Only matches that were not already matching at the last check are delivered
+        state_path = os.path.join(folder_path, ALERT_STATE_FILE)
+        previous = set()
+        if os.path.exists(state_path):
+            with open(state_path) as file:
+                previous = {tuple(match) for match in json.load(file)}
+        current = list(zip(matches['rule'], matches['hero_id'], matches['rarity'].astype(int).tolist()))
+        is_new = np.array([match not in previous for match in current], dtype=bool)
+        new_alerts = matches[is_new] if len(matches) else matches
+        if len(new_alerts):
+            new_alerts = new_alerts.assign(alerted_at=datetime.now().isoformat(timespec='seconds'))
+            deliver_alerts(new_alerts, folder_path)
+            print(f"{len(new_alerts)} new price alerts")
+        with open(state_path, 'w') as file:
+            json.dump(current, file)
+        return new_alerts
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # python price_alerts.py --benchmark times 500 random rules against 3000 synthetic heroes
+    if '--benchmark' in sys.argv:
+        rng = np.random.default_rng(0)
+        n_heroes = 3000
+        hero_ids = [str(1000 + i) for i in range(n_heroes)]
+        listings_df = pd.DataFrame({'hero_id': hero_ids, 'hero_handle': [f"hero{i}" for i in range(n_heroes)]})
+        bids_df = pd.DataFrame({'hero_id': hero_ids})
+        for rarity in RARITIES:
+            listings_df[f'rarity{rarity}_lowest_price'] = rng.gamma(2, 0.01 * rarity, n_heroes)
+            listings_df[f'rarity{rarity}_order_count'] = rng.integers(0, 20, n_heroes)
+            bids_df[f'rarity{rarity}HighestBid'] = listings_df[f'rarity{rarity}_lowest_price'] * rng.uniform(0.3, 1, n_heroes)
+        trades_df = pd.DataFrame({'hero_id': rng.choice(hero_ids, 20000), 'timestamp': rng.integers(0, 10 ** 6, 20000),
+                                  'rarity': rng.integers(1, 5, 20000), 'price': rng.gamma(2, 0.02, 20000)})
+        start = time.perf_counter()
+        market = MarketSnapshot(listings_df, bids_df, trades_df)
+        build_time = time.perf_counter() - start
+
+        # Thresholds at the 1st or 99th percentile of the metric, so a rule matches a few heroes like a real one
+        rules = []
+        for i in range(500):
+            metric, op = METRICS[i % len(METRICS)], list(OPERATORS)[i % 4]
+            column = market.values[:, METRICS.index(metric) * len(RARITIES):(METRICS.index(metric) + 1) * len(RARITIES)]
+            value = np.nanpercentile(column, 1 if op.startswith('<') else 99)
+            rules.append({'name': f"Rule {i}", 'metric': metric, 'op': op, 'value': float(value),
+                          'rarity': int(rng.integers(1, 5)) if i % 2 else None, 'hero': f"hero{i}" if i % 10 == 0 else None})
+        compiled = AlertRules(rules)
+        start = time.perf_counter()
+        for _ in range(20):
+            matches = compiled.find_matches(market)
+        print(f"{n_heroes} heroes, {len(rules)} rules ({len(compiled.columns)} with rarities expanded): "
+              f"metrics in {build_time * 1000:.1f} ms, rules in {(time.perf_counter() - start) / 20 * 1000:.1f} ms, {len(matches)} matches")
+    else:
+        print(check_price_alerts(os.getenv("DATA_FOLDER", "data")).to_string(index=False))
@@ -0,0 +1,82 @@
+import re
+import numpy as np
+import plotly.graph_objects as go
+
+# Tournament score chart. Heroes that are not highlighted are drawn as a single WebGL trace, with None between
+# heroes to break the line, so the figure has one trace per highlighted hero plus one, however many heroes are shown.
+PRICE_COLUMNS = ['rarity1 lowest price', 'rarity2 lowest price', 'rarity3 lowest price', 'rarity4 lowest price']
+BACKGROUND_OPACITY = 0.2
+DATED_COLUMN_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2} ')
+
+HOVER_TEMPLATE = (
+    '<b>%{customdata[0]}</b><br>' +
+    'Tournament: %{x}<br>' +
+    'Points: %{y}<br>' +
+    'Rarity 1 Price: %{customdata[1]:.3f}<br>' +
+    'Rarity 2 Price: %{customdata[2]:.3f}<br>' +
+    'Rarity 3 Price: %{customdata[3]:.3f}<br>' +
+    'Rarity 4 Price: %{customdata[4]:.3f}<extra></extra>'
+)
+
+
+def get_tournament_columns(df):
+    """Tournament score columns of the compiled hero data, oldest tournament first."""
+    columns = [col for col in df.columns
+               if col.endswith(' Score') and not col.startswith('Z Score') and not DATED_COLUMN_PATTERN.match(col)]
+    # compile_data writes the most recent tournament first
+    return columns[::-1]
+
+
+def get_hover_data(df):
+    """Hero name and the four lowest prices of each hero, one row per hero."""
+    hover_data = np.empty((len(df), 1 + len(PRICE_COLUMNS)), dtype=object)
+    hover_data[:, 0] = df['hero name'].to_numpy(dtype=object)
+    for i, col in enumerate(PRICE_COLUMNS, start=1):
+        hover_data[:, i] = df[col].to_numpy(dtype=float) if col in df.columns else np.nan
+    return hover_data
+
+
+def background_trace(tournaments, scores, hover_data):
+    """One trace for many heroes: each hero's points followed by a None gap."""
+    n_heroes, n_points = scores.shape
+    # A trailing gap column per hero, flattened row by row
+    x = np.tile(np.append(np.asarray(tournaments, dtype=object), None), n_heroes)
+    y = np.full((n_heroes, n_points + 1), None, dtype=object)
+    y[:, :n_points] = scores
+    customdata = np.repeat(hover_data, n_points + 1, axis=0)
+    return go.Scattergl(
+        x=x, y=y.ravel(), customdata=customdata,
+        mode='lines+markers', name='Other heroes', opacity=BACKGROUND_OPACITY,
+        connectgaps=False, hovertemplate=HOVER_TEMPLATE,
+    )
+
+
+def build_tournament_chart(df, highlighted_heroes, tournament_columns=None):
+    """Scores of every hero in df across the tournaments, with the highlighted heroes drawn on top."""
+    if tournament_columns is None:
+        tournament_columns = get_tournament_columns(df)
+    scores = df[tournament_columns].to_numpy(dtype=float)
+    hover_data = get_hover_data(df)
+    is_highlighted = df['hero name'].isin(highlighted_heroes).to_numpy()
+
+    fig = go.Figure()
+    if (~is_highlighted).any():
+        fig.add_trace(background_trace(tournament_columns, scores[~is_highlighted], hover_data[~is_highlighted]))
+
+    for row in np.flatnonzero(is_highlighted):
+        fig.add_trace(go.Scattergl(
+            x=tournament_columns, y=scores[row], customdata=np.repeat(hover_data[row:row + 1], len(tournament_columns), axis=0),
+            mode='lines+markers', name=hover_data[row, 0], hovertemplate=HOVER_TEMPLATE,
+        ))
+
+    fig.update_layout(
+        title="Tournament Scores Over Time",
+        xaxis_title="Tournament",
+        yaxis_title="Points",
+        xaxis=dict(categoryorder="array", categoryarray=tournament_columns),
+        legend=dict(orientation="h", yanchor="top", y=-0.2, xanchor="center", x=0.5),
+        showlegend=True,
+        width=2000,
+        height=800
+    )
+    return fig
@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from tournament_stats import prepare_scores, column_checksum, is_processed_prefix
+
+# Hero by hero correlation of tournament scores. A pair of heroes is compared only over the tournaments both
+# played (pairwise complete), from running sums per pair that a new tournament updates in place, so the matrix
+# never has to be rebuilt from the whole history. The state is saved as SCORE_CORRELATION_FILE in the data folder.
+# Usage: python score_correlation.py <hero_handle> [--benchmark]
+SCORE_CORRELATION_FILE = 'score_correlation.pkl'
+# Pairs with fewer shared tournaments than this have no correlation (NaN)
+MIN_PERIODS = 3
+TOP_N = 10
+
+
+def get_score_correlation_path(folder_path):
+    return os.path.join(folder_path, SCORE_CORRELATION_FILE)
+
+
+class PairwiseMoments:
+    """Sums over the tournaments both heroes of a pair played: count, sum and sum of squares of the
+    row hero's scores, and the sum of the products. sums[i, j] is hero i's sum over the tournaments
+    shared with hero j, so it is not symmetric."""
+
+    def __init__(self, n_heroes=0):
+        self.count = np.zeros((n_heroes, n_heroes))
+        self.sums = np.zeros((n_heroes, n_heroes))
+        self.squares = np.zeros((n_heroes, n_heroes))
+        self.products = np.zeros((n_heroes, n_heroes))
+
+    @classmethod
+    def from_scores(cls, scores):
+        """Moments of a (heroes x tournaments) score matrix with NaN where a hero did not play, as four matrix products."""
+        scores = np.asarray(scores, dtype=float)
+        played = (~np.isnan(scores)).astype(float)
+        values = np.nan_to_num(scores)
+        moments = cls()
+        moments.count = played @ played.T
+        moments.sums = values @ played.T
+        moments.squares = (values ** 2) @ played.T
+        moments.products = values @ values.T
+        return moments
+
+    def grow(self, n_heroes):
+        extra = n_heroes - len(self.count)
+        for name in ['count', 'sums', 'squares', 'products']:
+            setattr(self, name, np.pad(getattr(self, name), ((0, extra), (0, extra))))
+
+    def update(self, rows, values):
+        """Adds one tournament in which the heroes in rows scored values."""
+        pairs = np.ix_(rows, rows)
+        self.count[pairs] += 1
+        self.sums[pairs] += values[:, None]
+        self.squares[pairs] += (values ** 2)[:, None]
+        self.products[pairs] += np.outer(values, values)
+
+    def get_covariance(self, min_periods=MIN_PERIODS):
+        """Sample covariance (ddof=1) of every pair over their shared tournaments."""
+        count = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = (self.products - self.sums * self.sums.T / count) / (count - 1)
+        return np.where(count >= max(min_periods, 2), covariance, np.nan)
+
+    def get_correlation(self, min_periods=MIN_PERIODS):
+        """Pearson correlation of every pair over their shared tournaments, like DataFrame.corr(min_periods)."""
+        count = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centred_products = self.products - self.sums * self.sums.T / count
+            # Each hero's spread over the tournaments of the pair only
+            spread = np.maximum(self.squares - self.sums ** 2 / count, 0)
+            correlation = centred_products / np.sqrt(spread * spread.T)
+        valid = (count >= max(min_periods, 2)) & (spread > 0) & (spread.T > 0)
+        return np.where(valid, np.clip(correlation, -1, 1), np.nan)
+
+
+def pairwise_correlation(scores, min_periods=MIN_PERIODS):
+    """Correlation between the rows of a (heroes x tournaments) score matrix, NaN where a hero did not play."""
+    return PairwiseMoments.from_scores(scores).get_correlation(min_periods)
+
+
+class ScoreCorrelationState:
+    """Pairwise score moments of every hero (by hero_key), updated one tournament at a time.
+
+    The correlation matrix is worked out once per change and kept, so looking up the heroes
+    that score most or least like a hero is a partial sort of one row.
+    """
+
+    def __init__(self, min_periods=MIN_PERIODS):
+        self.min_periods = min_periods
+        self.tournaments = []  # (column, checksum), oldest first
+        self.keys = []
+        self.key_rows = {}
+        self.handles = []
+        self.moments = PairwiseMoments()
+        self._correlation = None
+
+    def get_rows(self, keys, add_missing=False):
+        """Maps hero keys to state rows (-1 for unknown heroes unless add_missing)."""
+        if add_missing:
+            new_keys = [key for key in pd.unique(np.asarray(keys)) if key not in self.key_rows]
+            if new_keys:
+                for key in new_keys:
+                    self.key_rows[key] = len(self.keys)
+                    self.keys.append(key)
+                    self.handles.append(None)
+                self.moments.grow(len(self.keys))
+        return pd.Index(self.keys).get_indexer(keys)
+
+    def set_handles(self, handles):
+        """Records the current handle of each hero from a Series of handles indexed by hero_key."""
+        handles = handles[handles.notna()]
+        for row, handle in zip(self.get_rows(handles.index, add_missing=True), handles):
+            self.handles[row] = handle
+
+    def add_tournament(self, column, scores):
+        """Adds one tournament's scores (a Series indexed by hero_key)."""
+        scores = prepare_scores(scores)
+        rows = self.get_rows(scores.index, add_missing=True)
+        self.moments.update(rows, scores.to_numpy(dtype=float))
+        self.tournaments.append((column, column_checksum(scores)))
+        self._correlation = None
+
+    def get_correlation(self):
+        if self._correlation is None:
+            self._correlation = self.moments.get_correlation(self.min_periods)
+        return self._correlation
+
+    def get_covariance(self):
+        return self.moments.get_covariance(self.min_periods)
+
+    def get_row(self, handle):
+        if handle not in self.handles:
+            raise KeyError(f"No tournament scores for hero {handle}")
+        return self.handles.index(handle)
+
+    def top_correlated(self, handle, n=TOP_N, least=False):
+        """The n heroes whose scores move most (or, with least, most oppositely) with the hero's."""
+        row = self.get_row(handle)
+        correlation = self.get_correlation()[row].copy()
+        correlation[row] = np.nan
+        candidates = np.flatnonzero(~np.isnan(correlation))
+        ordering = correlation[candidates] if least else -correlation[candidates]
+        if len(candidates) > n:
+            nearest = np.argpartition(ordering, n)[:n]
+            candidates = candidates[nearest]
+            ordering = ordering[nearest]
+        candidates = candidates[np.argsort(ordering, kind='stable')]
+        return pd.DataFrame({
+            'hero_handle': [self.handles[i] for i in candidates],
+            'Correlation': correlation[candidates],
+            'Shared_Tournaments': self.moments.count[row, candidates].astype(int),
+        })
+
+
+def load_score_correlation_state(state_path):
+    if state_path and os.path.exists(state_path):
+        try:
+            with open(state_path, 'rb') as file:
+                return pickle.load(file)
+        except Exception as e:
+            print(f"Could not load score correlation state {state_path}: {e}")
+    return ScoreCorrelationState()
+
+
+def save_score_correlation_state(state, state_path):
+    """Saves the state, returning the path (or None if the write failed)."""
+    try:
+        os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+        with open(state_path, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return state_path
+    except Exception as e:
+        print(f"Could not save score correlation state {state_path}: {e}")
+
+
+def update_score_correlation_state(state, scores_df, tournament_columns):
+    """Brings the state up to date with scores_df (indexed by hero_key, with a hero_handle column).
+
+    tournament_columns must be in chronological order. Only tournaments that are new since
+    the state was saved are added; if an earlier tournament is missing, or the last one added
+    has changed, the state is rebuilt from scratch.
+    """
+    if not is_processed_prefix(state.tournaments, scores_df, tournament_columns):
+        print("Tournament history changed, rebuilding score correlation state")
+        state = ScoreCorrelationState(state.min_periods)
+
+    for column in tournament_columns[len(state.tournaments):]:
+        print(f"Adding {column} to score correlations")
+        state.add_tournament(column, scores_df[column])
+    if 'hero_handle' in scores_df.columns:
+        state.set_handles(scores_df['hero_handle'])
+    state.get_correlation()
+    return state
+
+
+def update_score_correlation(state_path, scores_df, tournament_columns):
+    """Updates and saves the state at state_path. Returns the path, or None if it could not be saved."""
+    state = update_score_correlation_state(load_score_correlation_state(state_path), scores_df, tournament_columns)
+    return save_score_correlation_state(state, state_path)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    state = load_score_correlation_state(get_score_correlation_path(os.getenv("DATA_FOLDER", "data")))
+    if not state.keys:
+        print("No score correlations yet, run compile_data first")
+        sys.exit(1)
+    handle = next((arg for arg in sys.argv[1:] if not arg.startswith('--')), state.handles[0])
+
+    # python score_correlation.py <hero_handle> --benchmark times the lookups
+    if '--benchmark' in sys.argv:
+        state.get_correlation()
+        start = time.perf_counter()
+        for _ in range(100):
+            state.top_correlated(handle)
+        print(f"{len(state.keys)} heroes, {len(state.tournaments)} tournaments: top {TOP_N} lookup in {(time.perf_counter() - start) * 10:.2f} ms")
+    print(f"Most correlated with {handle}:")
+    print(state.top_correlated(handle).to_string(index=False))
+    print(f"Least correlated with {handle}:")
+    print(state.top_correlated(handle, least=True).to_string(index=False))
@@ -0,0 +1,97 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from tournament_stats import is_main_tournament
+
+# Running totals of every hero's main tournament scores, oldest tournament first. The count, sum and sum of
+# squares over any run of consecutive tournaments is the difference of two columns, so the mean and variance of
+# a window ("last 6", "since 2024-06-01") cost the same for every window and are computed for all heroes at once.
+SCORE_INDEX_FILE = 'score_index.pkl'
+
+
+def get_score_index_path(folder_path):
+    return os.path.join(folder_path, SCORE_INDEX_FILE)
+
+
+class ScoreIndex:
+    """Prefix sums over the main tournaments of every hero.
+
+    count[:, t], sums[:, t] and squares[:, t] cover the first t tournaments, so column 0 is zero.
+    A hero who missed a tournament adds nothing to it.
+    """
+
+    def __init__(self, keys, handles, tournaments, dates, scores):
+        scores = np.asarray(scores, dtype=float).reshape(len(keys), len(tournaments))
+        played = ~np.isnan(scores)
+        values = np.where(played, scores, 0.0)
+        self.keys = np.asarray(keys)
+        self.handles = np.asarray(handles, dtype=object)
+        self.tournaments = list(tournaments)
+        self.dates = list(dates)
+        self.count = np.pad(np.cumsum(played, axis=1), ((0, 0), (1, 0)))
+        self.sums = np.pad(np.cumsum(values, axis=1), ((0, 0), (1, 0)))
+        self.squares = np.pad(np.cumsum(values ** 2, axis=1), ((0, 0), (1, 0)))
+
+    @classmethod
+    def from_scores(cls, scores_df, tournament_columns, start_dates):
+        """Builds the index from scores_df (indexed by hero_key, with a hero_handle column).
+
+        tournament_columns must be in chronological order; only main tournaments are kept.
+        start_dates maps each tournament column to its start date (YYYY-MM-DD)."""
+        main_columns = [col for col in tournament_columns if is_main_tournament(col)]
+        scores = scores_df.reindex(columns=main_columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        handles = scores_df['hero_handle'] if 'hero_handle' in scores_df.columns else scores_df.index
+        return cls(scores_df.index.to_numpy(), np.asarray(handles, dtype=object), main_columns,
+                   [start_dates.get(col) for col in main_columns], scores)
+
+    def window_bounds(self, last=None, since=None):
+        """First and past-the-end tournament of the last `last` tournaments, or of those starting on or after `since`."""
+        end = len(self.tournaments)
+        if since is not None:
+            since = pd.Timestamp(since).strftime('%Y-%m-%d')
+            start = next((i for i, date in enumerate(self.dates) if date is not None and date >= since), end)
+        elif last is not None:
+            start = max(end - int(last), 0)
+        else:
+            start = 0
+        return start, end
+
+    def window_stats(self, last=None, since=None):
+        """Count, mean and sample variance (ddof=1) of every hero's scores in the window."""
+        start, end = self.window_bounds(last, since)
+        count = self.count[:, end] - self.count[:, start]
+        sums = self.sums[:, end] - self.sums[:, start]
+        squares = self.squares[:, end] - self.squares[:, start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, sums / count, np.nan)
+            variance = np.where(count > 1, np.maximum(squares - sums * mean, 0) / (count - 1), np.nan)
+        return pd.DataFrame({
+            'hero_key': self.keys,
+            'hero_handle': self.handles,
+            'Window_Tournaments': count,
+            'Window_Ave': mean,
+            'Window_Variance': variance,
+            'Window_Standard_Deviation': np.sqrt(variance),
+        })
+
+
+def load_score_index(index_path):
+    if index_path and os.path.exists(index_path):
+        try:
+            with open(index_path, 'rb') as file:
+                return pickle.load(file)
+        except Exception as e:
+            print(f"Could not load score index {index_path}: {e}")
+    return None
+
+
+def save_score_index(index, index_path):
+    """Saves the index, returning the path (or None if the write failed)."""
+    try:
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        with open(index_path, 'wb') as file:
+            pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return index_path
+    except Exception as e:
+        print(f"Could not save score index {index_path}: {e}")
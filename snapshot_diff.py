@@ -0,0 +1,154 @@
+import os
+import re
+import glob
+import numpy as np
+import pandas as pd
+from hero_dimension import load_hero_dimension, add_hero_keys, get_hero_ids
+
+# Compares consecutive snapshots of each dataset and keeps what changed as a compact feed: one row per changed
+# value (dataset, hero_id, key, field, old, new, delta, pct). Each pair of snapshots is diffed once and saved as
+# CHANGES_FOLDER/{dataset}_{timestamp of the newer snapshot}.csv, so the app only reads the changes.
+CHANGES_FOLDER = 'changes'
+# Row key of each dataset; the others have one row per hero and are matched on hero_key
+DIFF_DATASETS = {
+    'basic_hero_stats': None,
+    'hero_stats': None,
+    'hero_card_supply': None,
+    'listings': None,
+    'bids': None,
+    'portfolio': 'hero_rarity_index',
+}
+# Columns that identify a row rather than describe it
+ID_COLUMNS = ['hero_key', 'hero_id', 'hero_handle', 'hero_rarity_index', 'token_id']
+# Snapshot pairs diffed the first time a dataset is seen, newest first
+MAX_BACKFILL = 10
+CHANGE_COLUMNS = ['dataset', 'snapshot', 'hero_id', 'key', 'field', 'old', 'new', 'delta', 'pct']
+
+SNAPSHOT_PATTERN = re.compile(r'_(\d{6}_\d{4})\.csv$')
+
+
+def get_changes_folder(folder_path):
+    return os.path.join(folder_path, CHANGES_FOLDER)
+
+
+def get_snapshot_files(folder_path, prefix):
+    """Snapshot files of a dataset as (timestamp, path), oldest first."""
+    files = []
+    for file_path in glob.glob(os.path.join(folder_path, f"{prefix}_*.csv")):
+        match = SNAPSHOT_PATTERN.search(file_path)
+        # The prefix must be the whole name before the timestamp (hero_stats is not hero_stats_long)
+        if match and os.path.basename(file_path) == f"{prefix}_{match.group(1)}.csv":
+            files.append((match.group(1), file_path))
+    return sorted(files)
+
+
+def key_rows(df, dimension, key_column=None):
+    """Indexes a snapshot by its row key (as text), with the hero_id of every row from the hero dimension."""
+    keyed = add_hero_keys(df, dimension)
+    hero_ids = pd.Series(get_hero_ids(dimension, keyed['hero_key']), index=keyed.index)
+    keyed['hero_id'] = hero_ids.fillna(keyed['hero_id']) if 'hero_id' in keyed.columns else hero_ids
+    if key_column is None:
+        keyed = keyed[keyed['hero_key'] >= 0]
+        key = keyed['hero_key']
+    else:
+        keyed = keyed[keyed[key_column].notna()]
+        key = keyed[key_column]
+    keyed.index = pd.Index(key.astype(str), name='key')
+    return keyed[~keyed.index.duplicated()]
+
+
+def diff_snapshots(old_df, new_df, dimension, key_column=None, dataset=None, snapshot=None):
+    """Change feed between two snapshots of a dataset.
+
+    Rows are matched by key with one index join, every shared numeric column is compared at
+    once, and only the changed cells are gathered into the feed, so building it costs in
+    proportion to the changes. Rows that appear or disappear are reported with field 'added' or 'removed'."""
+    old_rows = key_rows(old_df, dimension, key_column)
+    new_rows = key_rows(new_df, dimension, key_column)
+    fields = [col for col in new_rows.columns if col in old_rows.columns and col not in ID_COLUMNS
+              and pd.api.types.is_numeric_dtype(new_rows[col]) and pd.api.types.is_numeric_dtype(old_rows[col])]
+
+    shared = new_rows.index.intersection(old_rows.index)
+    old_values = old_rows.loc[shared, fields].to_numpy(dtype=float)
+    new_values = new_rows.loc[shared, fields].to_numpy(dtype=float)
+    changed = (old_values != new_values) & ~(np.isnan(old_values) & np.isnan(new_values))
+    rows, cols = np.nonzero(changed)
+
+    old_changed = old_values[rows, cols]
+    new_changed = new_values[rows, cols]
+    delta = new_changed - old_changed
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct = np.where(old_changed != 0, delta / np.abs(old_changed) * 100, np.nan)
+    changes = pd.DataFrame({
+        'hero_id': new_rows.loc[shared, 'hero_id'].to_numpy()[rows],
+        'key': shared.to_numpy()[rows],
+        'field': np.asarray(fields, dtype=object)[cols],
+        'old': old_changed,
+        'new': new_changed,
+        'delta': delta,
+        'pct': pct,
+    })
+
+    added = new_rows.index.difference(old_rows.index)
+    removed = old_rows.index.difference(new_rows.index)
+    row_changes = pd.DataFrame({
+        'hero_id': np.concatenate([new_rows.loc[added, 'hero_id'].to_numpy(), old_rows.loc[removed, 'hero_id'].to_numpy()]),
+        'key': np.concatenate([added.to_numpy(), removed.to_numpy()]),
+        'field': ['added'] * len(added) + ['removed'] * len(removed),
+    })
+    changes = pd.concat([changes, row_changes], ignore_index=True) if len(row_changes) else changes
+    changes.insert(0, 'dataset', dataset)
+    changes.insert(1, 'snapshot', snapshot)
+    return changes.reindex(columns=CHANGE_COLUMNS)
+
+
+def read_snapshot(file_path):
+    try:
+        return pd.read_csv(file_path, dtype={'hero_id': str})
+    except pd.errors.EmptyDataError:
+        print(f"Warning: File {file_path} is empty. Skipping.")
+        return None
+
+
+def update_change_feed(folder_path, datasets=None):
+    """Diffs every pair of consecutive snapshots that has no change file yet. Returns the files written."""
+    changes_folder = get_changes_folder(folder_path)
+    dimension = load_hero_dimension(folder_path)
+    written = []
+    for dataset, key_column in (DIFF_DATASETS if datasets is None else datasets).items():
+        snapshots = get_snapshot_files(folder_path, dataset)[-(MAX_BACKFILL + 1):]
+        snapshot_cache = {}
+        for (old_time, old_path), (new_time, new_path) in zip(snapshots, snapshots[1:]):
+            change_path = os.path.join(changes_folder, f"{dataset}_{new_time}.csv")
+            if os.path.exists(change_path):
+                continue
+            for path in (old_path, new_path):
+                if path not in snapshot_cache:
+                    snapshot_cache[path] = read_snapshot(path)
+            old_df, new_df = snapshot_cache[old_path], snapshot_cache[new_path]
+            if old_df is None or new_df is None:
+                continue
+            changes = diff_snapshots(old_df, new_df, dimension, key_column, dataset, new_time)
+            os.makedirs(changes_folder, exist_ok=True)
+            changes.to_csv(change_path, index=False)
+            print(f"{dataset}: {len(changes)} changes since {old_time} saved to {change_path}")
+            written.append(change_path)
+            # Snapshots are walked oldest first, so the older one is not needed again
+            snapshot_cache.pop(old_path)
+    return written
+
+
+def load_latest_changes(folder_path):
+    """The latest change file of every dataset, combined."""
+    frames = []
+    for dataset in DIFF_DATASETS:
+        files = get_snapshot_files(get_changes_folder(folder_path), dataset)
+        if files:
+            frames.append(pd.read_csv(files[-1][1], dtype={'hero_id': str, 'key': str, 'snapshot': str}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CHANGE_COLUMNS)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    update_change_feed(os.getenv("DATA_FOLDER", "data"))
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Measures how long a fresh process takes to import the fetch module and to start and render the app, and
+# whether importing anything wrote files to DATA_FOLDER. Each run is a new interpreter, so nothing is cached.
+# Usage: python startup_benchmark.py [--runs 5]
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SCRIPT = """
+import os, sys, time, json
+start = time.perf_counter()
+import get_data_script
+elapsed = time.perf_counter() - start
+heavy = [name for name in ('selenium.webdriver', 'webdriver_manager.chrome', 'fake_useragent') if name in sys.modules]
+print(json.dumps({'seconds': elapsed, 'heavy_modules': heavy}))
+"""
+
+RENDER_SCRIPT = """
+import time, json
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('app.py', default_timeout=300)
+at.run()
+print(json.dumps({'seconds': time.perf_counter() - start}))
+"""
+
+
+def list_data_files(data_folder):
+    if not os.path.isdir(data_folder):
+        return set()
+    return set(os.listdir(data_folder))
+
+
+def run_script(script):
+    """Runs a script in a new interpreter in the app folder and returns the JSON it prints last."""
+    result = subprocess.run([sys.executable, '-c', script], cwd=APP_DIR, capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"Benchmark script failed:\n{result.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def benchmark(script, runs):
+    results = [run_script(script) for _ in range(runs)]
+    return statistics.median(result['seconds'] for result in results), results[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the app's cold start")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--skip-render', action='store_true', help="Only time the import of get_data_script")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    data_folder = os.path.abspath(os.getenv("DATA_FOLDER", "data"))
+
+    files_before = list_data_files(data_folder)
+    import_seconds, last_import = benchmark(IMPORT_SCRIPT, args.runs)
+    written = sorted(list_data_files(data_folder) - files_before)
+    print(f"import get_data_script: {import_seconds * 1000:.0f} ms (median of {args.runs})")
+    print(f"  browser modules loaded at import: {', '.join(last_import['heavy_modules']) or 'none'}")
+    print(f"  files written to {data_folder} at import: {', '.join(written) or 'none'}")
+
+    if not args.skip_render:
+        render_seconds, _ = benchmark(RENDER_SCRIPT, args.runs)
+        print(f"app cold start and first render: {render_seconds * 1000:.0f} ms (median of {args.runs})")
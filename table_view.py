@@ -0,0 +1,51 @@
+import math
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Rows sent to the browser per page. st.dataframe already scrolls virtually; paging also keeps the
+# per-cell styling (star-tier backgrounds) limited to the rows on screen.
+PAGE_SIZES = [50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+HERO_PAGE_PATTERN = r"https://fantasy\.top/hero/(.*)"
+
+
+def get_column_config(df):
+    """Native image and link columns for the prepared image and hero page URL columns."""
+    column_config = {}
+    if 'Profile Image' in df.columns:
+        column_config['Profile Image'] = st.column_config.ImageColumn('Profile Image', width='small')
+    if 'Card Image' in df.columns:
+        column_config['Card Image'] = st.column_config.ImageColumn('Card Image', width='small')
+    if 'Hero Page' in df.columns:
+        # Shows the hero handle, links to the hero's page
+        column_config['Hero Page'] = st.column_config.LinkColumn('Hero Page', display_text=HERO_PAGE_PATTERN)
+    return column_config
+
+
+def style_rows(page_df, row_styles):
+    """Styler applying one CSS string (e.g. a star-tier background) to every cell of each row."""
+    cell_styles = np.repeat(np.asarray(row_styles, dtype=object)[:, None], page_df.shape[1], axis=1)
+    return page_df.style.apply(lambda frame: pd.DataFrame(cell_styles, index=frame.index, columns=frame.columns), axis=None)
+
+
+def render_table(df, key, row_styles=None, height=700):
+    """Shows df one page at a time with st.dataframe (sent as Arrow, with a sticky header and row hover).
+
+    row_styles is an optional CSS string per row of df, applied to the rows of the current page."""
+    col1, col2, col3 = st.columns([1, 1, 2])
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_page_size")
+    n_pages = max(1, math.ceil(len(df) / page_size))
+
+    # Filtering can leave fewer pages than the one that was selected
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    page = col2.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    page_df = df.iloc[start:start + page_size]
+    data = page_df if row_styles is None else style_rows(page_df, row_styles[start:start + page_size])
+
+    st.dataframe(data, column_config=get_column_config(page_df), hide_index=True, use_container_width=True, height=height)
+    col3.caption(f"Rows {start + 1 if len(df) else 0}-{start + len(page_df)} of {len(df)}")
@@ -0,0 +1,266 @@
+import os
+import re
+import sys
+import glob
+import time
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from data_compiler import RARITY_MULTIPLIERS
+from deck_optimizer import LEAGUES
+from score_correlation import pairwise_correlation
+
+load_dotenv()
+DATA_FOLDER = os.getenv("DATA_FOLDER", "data")
+
+# Monte Carlo estimate of how decks would do in a tournament. Hero scores are drawn from a multivariate normal
+# with each hero's main tournament mean and variance and the correlation of their main tournament histories, in
+# batches of draws at once. Opponents are a fixed sample of decks built from the heroes in circulation, scored
+# on the same draws, and a deck's rank in each draw is looked up in the tournament's reward table.
+# Usage: python tournament_simulator.py [--benchmark]
+MAIN_SCORE_PATTERN = re.compile(r'^Main \d+ Score$')
+DECK_SIZE = 5
+# Weight of the identity in the correlation matrix, so a short shared history still gives a valid matrix
+SHRINKAGE = 0.2
+# Common factors kept from the correlation matrix; the rest of each hero's variance is drawn independently
+N_FACTORS = 20
+BATCH_SIZE = 5000
+# Opponent decks scored in every draw; a deck's rank is read off its place among them
+FIELD_SIZE = 200
+DEFAULT_PLAYERS = 1000
+REWARD_TYPES = ['ETH', 'PACK', 'GOLD']
+
+
+def get_main_score_columns(df):
+    return [col for col in df.columns if MAIN_SCORE_PATTERN.match(col)]
+
+
+def factor_loadings(correlation, shrinkage=SHRINKAGE, n_factors=N_FACTORS):
+    """Splits a correlation matrix into common factor loadings and each hero's remaining variance.
+
+    The matrix is first blended with the identity. Its top eigenvectors become the loadings, and
+    the rest of the diagonal is left to an independent term, so every hero keeps unit variance.
+    Drawing z = loadings @ f + sqrt(residual) * e then costs heroes x factors per draw instead of
+    the heroes x heroes of a Cholesky factor."""
+    n_heroes = len(correlation)
+    correlation = np.nan_to_num(np.asarray(correlation, dtype=float), nan=0.0)
+    np.fill_diagonal(correlation, 1.0)
+    shrunk = (1 - shrinkage) * correlation + shrinkage * np.eye(n_heroes)
+    values, vectors = np.linalg.eigh(shrunk)
+    top = np.argsort(values)[::-1][:min(n_factors, n_heroes)]
+    # Negative eigenvalues (possible with pairwise estimates) carry no common variance
+    loadings = vectors[:, top] * np.sqrt(np.maximum(values[top], 0))
+    common = (loadings ** 2).sum(axis=1)
+    # Rows whose common part exceeds 1 (from clipping) are scaled back to unit variance
+    scale = np.where(common > 1, 1 / np.sqrt(np.maximum(common, 1e-12)), 1.0)
+    loadings *= scale[:, None]
+    residual = np.maximum(1 - (loadings ** 2).sum(axis=1), 0)
+    return loadings, residual
+
+
+def load_rewards(folder_path, tournament=None):
+    """Reward table of one current tournament (the first one if not given), or None."""
+    rewards_path = os.path.join(folder_path, 'current_tournament_rewards.csv')
+    if not os.path.exists(rewards_path):
+        return None
+    rewards = pd.read_csv(rewards_path)
+    if rewards.empty:
+        return None
+    if tournament is None:
+        tournament = rewards['Description'].iloc[0]
+    return rewards[rewards['Description'] == tournament].reset_index(drop=True)
+
+
+class TournamentSimulator:
+    """Draws correlated hero scores and scores decks, ranks and rewards on them.
+
+    hero_df is the compiled hero data (allHeroData.csv). Every method takes its randomness from
+    the simulator's own generator, so the same seed and calls give the same results.
+    """
+
+    def __init__(self, hero_df, seed=None, shrinkage=SHRINKAGE, field_size=FIELD_SIZE, max_stars=None):
+        self.rng = np.random.default_rng(seed)
+        hero_df = hero_df[hero_df['hero_id'].notna()].drop_duplicates('hero_id').reset_index(drop=True)
+        self.hero_ids = hero_df['hero_id'].astype(str).to_numpy()
+        self.hero_index = {hero_id: i for i, hero_id in enumerate(self.hero_ids)}
+
+        # Compiled scores are 0 for tournaments a hero was not in
+        history = hero_df[get_main_score_columns(hero_df)].to_numpy(dtype=float)
+        history[history == 0] = np.nan
+        self.means = np.nan_to_num(pd.to_numeric(hero_df['Main_Tournaments_Ave'], errors='coerce').to_numpy(dtype=float))
+        variances = np.nan_to_num(pd.to_numeric(hero_df['Main_Tournaments_Variance'], errors='coerce').to_numpy(dtype=float))
+        self.stds = np.sqrt(np.maximum(variances, 0))
+        loadings, residual = factor_loadings(self.correlation(hero_df, history), shrinkage)
+        # Standard deviations folded in, in float32 for speed
+        self.means = self.means.astype(np.float32)
+        self.factor_scale = (loadings * self.stds[:, None]).T.astype(np.float32)
+        self.residual_scale = (np.sqrt(residual) * self.stds).astype(np.float32)
+
+        self.field = self.build_field(hero_df, field_size, max_stars)
+
+    def correlation(self, hero_df, history):
+        # Each pair over the tournaments both heroes played; pairs with too few are treated as uncorrelated
+        return pairwise_correlation(history)
+
+    def deck_cards(self, decks):
+        """Hero positions and rarity multipliers of each deck's cards, as two (decks, 5) arrays.
+
+        decks is a list of decks, each a list of (hero_id, rarity) cards."""
+        positions = np.zeros((len(decks), DECK_SIZE), dtype='int64')
+        multipliers = np.zeros((len(decks), DECK_SIZE), dtype=np.float32)
+        for d, deck in enumerate(decks):
+            for c, (hero_id, rarity) in enumerate(deck):
+                position = self.hero_index.get(str(hero_id))
+                if position is None:
+                    raise KeyError(f"Hero {hero_id} has no tournament statistics")
+                positions[d, c] = position
+                multipliers[d, c] = RARITY_MULTIPLIERS.get(int(rarity), 1.0)
+        return positions, multipliers
+
+    def build_field(self, hero_df, field_size, max_stars=None):
+        """Opponent decks: heroes picked in proportion to their card supply, rarities by the hero's supply of each."""
+        supply = hero_df.reindex(columns=[f'rarity{level}Count' for level in RARITY_MULTIPLIERS]).fillna(0).to_numpy(dtype=float)
+        hero_supply = supply.sum(axis=1)
+        if field_size == 0 or (hero_supply > 0).sum() < DECK_SIZE:
+            return self.deck_cards([])
+        hero_probabilities = hero_supply / hero_supply.sum()
+        stars = pd.to_numeric(hero_df['hero_stars'], errors='coerce').fillna(0).to_numpy()
+        rarity_levels = np.array(list(RARITY_MULTIPLIERS))
+
+        decks = []
+        attempts = 0
+        while len(decks) < field_size and attempts < field_size * 50:
+            attempts += 1
+            heroes = self.rng.choice(len(self.hero_ids), size=DECK_SIZE, replace=False, p=hero_probabilities)
+            if max_stars is not None and stars[heroes].sum() > max_stars:
+                continue
+            rarities = [self.rng.choice(rarity_levels, p=supply[h] / hero_supply[h]) for h in heroes]
+            decks.append(list(zip(self.hero_ids[heroes], rarities)))
+        return self.deck_cards(decks)
+
+    def sample_hero_rows(self, n_draws, heroes):
+        """(heroes, n_draws) array of correlated scores of the heroes at the given positions, floored at 0.
+
+        One row per hero, so picking a hero's draws is a contiguous row copy."""
+        factors = self.rng.standard_normal((len(self.factor_scale), n_draws), dtype=np.float32)
+        scores = self.rng.standard_normal((len(heroes), n_draws), dtype=np.float32)
+        scores *= self.residual_scale[heroes, None]
+        scores += self.factor_scale[:, heroes].T @ factors
+        scores += self.means[heroes, None]
+        return np.maximum(scores, 0, out=scores)
+
+    def sample_scores(self, n_draws):
+        """(n_draws, heroes) array of correlated hero scores, floored at 0."""
+        return self.sample_hero_rows(n_draws, np.arange(len(self.hero_ids))).T
+
+    def simulate_deck_scores(self, decks, n_draws, batch_size=BATCH_SIZE):
+        """(n_draws, decks) array of deck scores, plus each deck's rank among the field per draw (as a fraction)."""
+        positions, multipliers = self.deck_cards(decks)
+        field_positions, field_multipliers = self.field
+        # Only the heroes in a deck are drawn, renumbered to their row in the batch
+        heroes, rows = np.unique(np.concatenate([positions.ravel(), field_positions.ravel()]), return_inverse=True)
+        rows = rows.astype('int64')
+        deck_rows = rows[:positions.size].reshape(positions.shape)
+        field_rows = rows[positions.size:].reshape(field_positions.shape)
+
+        deck_scores = np.empty((len(decks), n_draws), dtype=np.float32)
+        beaten_by = np.zeros((len(decks), n_draws), dtype=np.float32)
+        for start in range(0, n_draws, batch_size):
+            stop = min(start + batch_size, n_draws)
+            hero_scores = self.sample_hero_rows(stop - start, heroes)
+            deck_scores[:, start:stop] = deck_totals(hero_scores, deck_rows, multipliers)
+            if len(field_rows):
+                # Share of the field scoring more than each deck in each draw
+                field_scores = deck_totals(hero_scores, field_rows, field_multipliers)
+                for d in range(len(decks)):
+                    beaten_by[d, start:stop] = (field_scores > deck_scores[d, start:stop]).mean(axis=0)
+        return deck_scores.T, beaten_by.T
+
+    def simulate(self, decks, n_draws=100000, rewards=None, n_players=None, deck_names=None):
+        """Summary per deck of its simulated score, rank and (with a reward table) expected rewards."""
+        deck_scores, beaten_by = self.simulate_deck_scores(decks, n_draws)
+        if n_players is None:
+            n_players = int(rewards['Players'].dropna().iloc[0]) if rewards is not None and rewards['Players'].notna().any() else DEFAULT_PLAYERS
+        ranks = 1 + np.floor(beaten_by * n_players).astype('int64')
+
+        summary = pd.DataFrame({
+            'Deck': deck_names if deck_names is not None else [f"Deck {d + 1}" for d in range(len(decks))],
+            'Mean Score': deck_scores.mean(axis=0),
+            'Std Score': deck_scores.std(axis=0),
+            'P5 Score': np.percentile(deck_scores, 5, axis=0),
+            'Median Score': np.median(deck_scores, axis=0),
+            'P95 Score': np.percentile(deck_scores, 95, axis=0),
+            'Mean Rank': ranks.mean(axis=0),
+            'Median Rank': np.median(ranks, axis=0),
+            'P Top 10%': (ranks <= max(1, n_players // 10)).mean(axis=0),
+        })
+        if rewards is not None:
+            paid = np.zeros(ranks.shape, dtype=bool)
+            for reward_type in REWARD_TYPES:
+                amounts = reward_for_ranks(rewards[rewards['Type'] == reward_type], ranks)
+                summary[f'Expected {reward_type}'] = amounts.mean(axis=0)
+                paid |= amounts > 0
+            summary['P Reward'] = paid.mean(axis=0)
+        return summary
+
+
+def deck_totals(hero_scores, deck_rows, multipliers):
+    """(decks, draws) scores of decks from (heroes, draws) hero scores, summed card by card."""
+    totals = hero_scores[deck_rows[:, 0]] * multipliers[:, :1]
+    for card in range(1, deck_rows.shape[1]):
+        totals += hero_scores[deck_rows[:, card]] * multipliers[:, card:card + 1]
+    return totals
+
+
+def reward_for_ranks(reward_table, ranks):
+    """Reward of each rank from a table of (Start, End, Reward) rank ranges, 0 outside them."""
+    if reward_table.empty:
+        return np.zeros(ranks.shape)
+    reward_table = reward_table.sort_values('Start')
+    starts = reward_table['Start'].to_numpy()
+    ends = reward_table['End'].to_numpy()
+    amounts = pd.to_numeric(reward_table['Reward'], errors='coerce').fillna(0).to_numpy()
+    row = np.searchsorted(starts, ranks, side='right') - 1
+    in_range = (row >= 0) & (ranks <= ends[np.maximum(row, 0)])
+    return np.where(in_range, amounts[np.maximum(row, 0)], 0.0)
+
+
+def load_best_decks(folder_path, league):
+    """The latest optimizer decks of a league as (names, decks of (hero_id, rarity))."""
+    files = glob.glob(os.path.join(folder_path, f'combined_best_decks_{league}_*.csv'))
+    if not files:
+        return [], []
+    decks_df = pd.read_csv(max(files, key=os.path.getmtime), dtype={'hero_id': str})
+    names, decks = [], []
+    for name, deck_df in decks_df.groupby('Deck_Name', sort=False):
+        names.append(name)
+        decks.append(list(zip(deck_df['hero_id'], deck_df['rarity'])))
+    return names, decks
+
+
+if __name__ == "__main__":
+    hero_df = pd.read_csv(os.path.join(DATA_FOLDER, 'allHeroData.csv'), dtype={'hero_id': str})
+
+    # python tournament_simulator.py --benchmark reports draws per second
+    if '--benchmark' in sys.argv:
+        simulator = TournamentSimulator(hero_df, seed=0)
+        print(f"{len(simulator.hero_ids)} heroes, field of {len(simulator.field[0])} decks")
+        decks = [[(hero_id, 4) for hero_id in simulator.hero_ids[i:i + DECK_SIZE]] for i in range(0, 5 * DECK_SIZE, DECK_SIZE)]
+        n_draws = 100000
+        for label, method in [('hero scores', simulator.sample_scores),
+                              ('deck scores and ranks of 5 decks', lambda n: simulator.simulate_deck_scores(decks, n))]:
+            method(BATCH_SIZE)
+            start = time.perf_counter()
+            method(n_draws)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {n_draws / elapsed:,.0f} draws per second")
+    else:
+        rewards = load_rewards(DATA_FOLDER)
+        for league in LEAGUES:
+            names, decks = load_best_decks(DATA_FOLDER, league)
+            if not decks:
+                print(f"No {league} decks to simulate, run deck_optimizer.py first")
+                continue
+            # Opponents in the league play under the same star cap
+            simulator = TournamentSimulator(hero_df, seed=0, max_stars=LEAGUES[league]['max_stars'])
+            print(simulator.simulate(decks, rewards=rewards, deck_names=names).to_string(index=False))
@@ -0,0 +1,182 @@
+import os
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+
+# Number of most recent main tournaments kept per hero for windowed statistics
+MAX_WINDOW = 52
+
+
+def is_main_tournament(column):
+    return 'Main' in column
+
+
+def prepare_scores(scores):
+    """Numeric scores of one tournament, without missing values or duplicate heroes."""
+    scores = pd.to_numeric(scores, errors='coerce')
+    scores = scores[scores.notna() & scores.index.notna()]
+    return scores[~scores.index.duplicated()]
+
+
+def column_checksum(scores):
+    """Fingerprint of a tournament's scores, used to detect a tournament file that has been rewritten."""
+    return int(pd.util.hash_pandas_object(scores, index=True).sum())
+
+
+def is_processed_prefix(processed, scores_df, tournament_columns):
+    """Whether the (column, checksum) tournaments a state has processed still start tournament_columns.
+
+    Every name is compared but only the last processed tournament's scores are checksummed, so a
+    compile costs one tournament rather than the whole history; that column is the one a
+    re-downloaded tournament file (e.g. one saved while still running) changes."""
+    if len(processed) > len(tournament_columns):
+        return False
+    if any(column != tournament_columns[i] for i, (column, _) in enumerate(processed)):
+        return False
+    if not processed:
+        return True
+    column, checksum = processed[-1]
+    return checksum == column_checksum(prepare_scores(scores_df[column]))
+
+
+class RunningStats:
+    """Welford accumulators (count, mean, M2) for every hero, updated one tournament at a time."""
+
+    def __init__(self):
+        self.count = np.zeros(0)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+
+    def grow(self, n_heroes):
+        extra = n_heroes - len(self.count)
+        self.count = np.concatenate([self.count, np.zeros(extra)])
+        self.mean = np.concatenate([self.mean, np.zeros(extra)])
+        self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+
+    def update(self, rows, values):
+        """Adds one score for each hero in rows."""
+        self.count[rows] += 1
+        delta = values - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows]
+        self.m2[rows] += delta * (values - self.mean[rows])
+
+    def get_mean(self, rows):
+        return np.where(self.count[rows] > 0, self.mean[rows], np.nan)
+
+    def get_variance(self, rows):
+        """Sample variance (ddof=1), NaN for heroes with fewer than two scores."""
+        count = self.count[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 1, self.m2[rows] / (count - 1), np.nan)
+
+
+class TournamentStatsState:
+    """Running per-hero statistics over all tournaments and over main tournaments.
+
+    Adding a tournament is O(1) per hero. The scores of the last max_window main
+    tournaments are kept in a ring buffer so windowed statistics (e.g. "Main Last 4")
+    can be answered for any window up to max_window without going back to the history.
+    """
+
+    def __init__(self, max_window=MAX_WINDOW):
+        self.max_window = max_window
+        self.tournaments = []  # (column, checksum), oldest first
+        self.handles = []
+        self.hero_rows = {}
+        self.overall = RunningStats()
+        self.main = RunningStats()
+        self.window = np.full((0, max_window), np.nan)
+        self.window_position = 0
+        self.main_tournament_count = 0
+
+    def get_rows(self, handles, add_missing=False):
+        """Maps hero handles to state rows (-1 for unknown heroes unless add_missing)."""
+        if add_missing:
+            new_handles = [handle for handle in pd.unique(np.asarray(handles)) if handle not in self.hero_rows]
+            if new_handles:
+                for handle in new_handles:
+                    self.hero_rows[handle] = len(self.handles)
+                    self.handles.append(handle)
+                self.overall.grow(len(self.handles))
+                self.main.grow(len(self.handles))
+                self.window = np.vstack([self.window, np.full((len(new_handles), self.max_window), np.nan)])
+        return pd.Index(self.handles).get_indexer(handles)
+
+    def add_tournament(self, column, scores):
+        """Adds one tournament's scores (a Series indexed by hero_handle)."""
+        scores = prepare_scores(scores)
+        rows = self.get_rows(scores.index, add_missing=True)
+        values = scores.to_numpy(dtype=float)
+
+        self.overall.update(rows, values)
+        if is_main_tournament(column):
+            self.main.update(rows, values)
+            self.window[:, self.window_position] = np.nan
+            self.window[rows, self.window_position] = values
+            self.window_position = (self.window_position + 1) % self.max_window
+            self.main_tournament_count += 1
+        self.tournaments.append((column, column_checksum(scores)))
+
+    def get_window(self, n, rows):
+        """Scores of the last n main tournaments (most recent first), NaN where a hero did not play."""
+        if n > self.max_window:
+            raise ValueError(f"Window of {n} tournaments exceeds the {self.max_window} kept in the state")
+        n = min(n, self.main_tournament_count)
+        slots = (self.window_position - 1 - np.arange(n)) % self.max_window
+        return self.window[np.asarray(rows)[:, None], slots[None, :]]
+
+    def get_window_mean(self, n, rows):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return np.nanmean(self.get_window(n, rows), axis=1)
+
+    def get_window_variance(self, n, rows):
+        window = self.get_window(n, rows)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            variance = np.nanvar(window, axis=1, ddof=1)
+        return np.where(np.sum(~np.isnan(window), axis=1) > 1, variance, np.nan)
+
+    def get_moving_average(self, n, rows):
+        """Mean of the last n main tournaments, NaN unless the hero played all of them."""
+        window = self.get_window(n, rows)
+        if window.shape[1] < n:
+            return np.full(len(rows), np.nan)
+        return window.mean(axis=1)
+
+
+def load_tournament_stats_state(state_path):
+    if state_path and os.path.exists(state_path):
+        try:
+            with open(state_path, 'rb') as file:
+                return pickle.load(file)
+        except Exception as e:
+            print(f"Could not load tournament statistics state {state_path}: {e}")
+    return TournamentStatsState()
+
+
+def save_tournament_stats_state(state, state_path):
+    try:
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        with open(state_path, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        print(f"Could not save tournament statistics state {state_path}: {e}")
+
+
+def update_tournament_stats_state(state, scores_df, tournament_columns):
+    """Brings the state up to date with scores_df (indexed by hero_handle).
+
+    tournament_columns must be in chronological order. Only tournaments that are new since
+    the state was saved are added; if an earlier tournament is missing, or the last one added
+    has changed, the state is rebuilt from scratch.
+    """
+    if not is_processed_prefix(state.tournaments, scores_df, tournament_columns):
+        print("Tournament history changed, rebuilding tournament statistics state")
+        state = TournamentStatsState(state.max_window)
+
+    for column in tournament_columns[len(state.tournaments):]:
+        print(f"Adding {column} to tournament statistics")
+        state.add_tournament(column, scores_df[column])
+    return state
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from snapshot_diff import get_snapshot_files
+
+# OHLC, VWAP and volume bars of every hero and rarity at several resolutions, built from the hero_trades
+# snapshots. Each hero_trades snapshot only holds the last 30 days of trades, so the bars are the long-term
+# price history: trades newer than the last one already counted are folded into the bars they fall in, and
+# every resolution is kept as one Parquet file in CANDLES_FOLDER, in order of bar start.
+# Every trade is one card, so volume is the number of trades and VWAP is the turnover (ETH) over the volume.
+# Usage: python trade_candles.py [--benchmark]
+CANDLES_FOLDER = 'candles'
+CANDLE_STATE_FILE = 'state.json'
+HOUR = np.int64(3600 * 10 ** 9)
+# Bar width in nanoseconds and the start of one bar (weeks start on Monday, 1970-01-05)
+RESOLUTIONS = {
+    '1h': (HOUR, 0),
+    '1d': (24 * HOUR, 0),
+    '1w': (7 * 24 * HOUR, 4 * 24 * HOUR),
+}
+CANDLE_KEYS = ['hero_id', 'rarity', 'start']
+# Order of the bars in the store, so new bars go at the end
+CANDLE_ORDER = ['start', 'hero_id', 'rarity']
+CANDLE_COLUMNS = CANDLE_KEYS + ['open', 'high', 'low', 'close', 'volume', 'turnover', 'vwap']
+# Bars per volatility window, by resolution
+VOLATILITY_BARS = {'1h': 24 * 7, '1d': 30, '1w': 12}
+
+
+def get_candles_folder(folder_path):
+    return os.path.join(folder_path, CANDLES_FOLDER)
+
+
+def get_candle_path(folder_path, resolution):
+    return os.path.join(get_candles_folder(folder_path), f"candles_{resolution}.parquet")
+
+
+def empty_candles():
+    return pd.DataFrame({
+        'hero_id': pd.Series(dtype=str),
+        'rarity': pd.Series(dtype='int64'),
+        'start': pd.Series(dtype='datetime64[ns, UTC]'),
+        **{col: pd.Series(dtype=float) for col in ['open', 'high', 'low', 'close', 'turnover', 'vwap']},
+        'volume': pd.Series(dtype='int64'),
+    })[CANDLE_COLUMNS]
+
+
+def prepare_trades(trades_df):
+    """Trades with a UTC timestamp, numeric rarity and price, oldest first; unparseable rows are dropped."""
+    trades = pd.DataFrame({
+        'hero_id': trades_df['hero_id'].astype(str),
+        'rarity': pd.to_numeric(trades_df['rarity'], errors='coerce'),
+        'timestamp': pd.to_datetime(trades_df['timestamp'], utc=True, format='ISO8601', errors='coerce'),
+        'price': pd.to_numeric(trades_df['price'], errors='coerce'),
+    }).dropna()
+    trades['rarity'] = trades['rarity'].astype('int64')
+    return trades.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def bar_starts(timestamps, resolution):
+    """Start of the bar each UTC timestamp falls in."""
+    width, anchor = RESOLUTIONS[resolution]
+    ns = timestamps.to_numpy(dtype='datetime64[ns]').astype('int64')
+    return pd.to_datetime((ns - anchor) // width * width + anchor, utc=True)
+
+
+def build_candles(trades, resolution):
+    """Bars of prepared trades (oldest first) at one resolution."""
+    if trades.empty:
+        return empty_candles()
+    bars = trades.assign(start=bar_starts(trades['timestamp'], resolution))
+    candles = bars.groupby(CANDLE_KEYS, sort=True).agg(
+        open=('price', 'first'), high=('price', 'max'), low=('price', 'min'), close=('price', 'last'),
+        volume=('price', 'size'), turnover=('price', 'sum'),
+    ).reset_index()
+    candles['vwap'] = candles['turnover'] / candles['volume']
+    return candles.sort_values(CANDLE_ORDER, kind='stable', ignore_index=True)[CANDLE_COLUMNS]
+
+
+def merge_candles(candles, new_candles):
+    """Adds bars of trades that are all newer than those in candles.
+
+    Only bars starting at or after the first new bar can hold both old and new trades, so
+    the rest of the store is kept as it is and just that tail is combined and sorted."""
+    if new_candles.empty:
+        return candles
+    if candles.empty:
+        return new_candles
+    split = candles['start'].searchsorted(new_candles['start'].min())
+    tail = pd.concat([candles.iloc[split:], new_candles], ignore_index=True)
+    # The older bar's open and the newer bar's close, as the new trades come after the old ones
+    merged = tail.groupby(CANDLE_KEYS, sort=False).agg(
+        open=('open', 'first'), high=('high', 'max'), low=('low', 'min'), close=('close', 'last'),
+        volume=('volume', 'sum'), turnover=('turnover', 'sum'),
+    ).reset_index()
+    merged['vwap'] = merged['turnover'] / merged['volume']
+    merged = merged.sort_values(CANDLE_ORDER, kind='stable')[CANDLE_COLUMNS]
+    return pd.concat([candles.iloc[:split], merged], ignore_index=True)
+
+
+def load_candle_state(folder_path):
+    """The last trade and hero_trades snapshot already counted in the bars."""
+    state_path = os.path.join(get_candles_folder(folder_path), CANDLE_STATE_FILE)
+    if os.path.exists(state_path):
+        try:
+            with open(state_path) as file:
+                return json.load(file)
+        except Exception as e:
+            print(f"Could not load candle state {state_path}: {e}")
+    return {'last_trade': None, 'snapshot': None}
+
+
+def load_candles(folder_path, resolution, hero_id=None):
+    """Bars at one resolution, optionally of one hero only."""
+    candle_path = get_candle_path(folder_path, resolution)
+    if not os.path.exists(candle_path):
+        return empty_candles()
+    filters = [('hero_id', '==', str(hero_id))] if hero_id is not None else None
+    return pd.read_parquet(candle_path, filters=filters)
+
+
+def ingest_trades(folder_path, trades_df, state=None):
+    """Folds the trades that are newer than the last one counted into the bars of every resolution."""
+    if state is None:
+        state = load_candle_state(folder_path)
+    trades = prepare_trades(trades_df)
+    if state['last_trade'] is not None:
+        # hero_trades snapshots overlap, so only trades after the last one counted are new
+        trades = trades[trades['timestamp'] > pd.Timestamp(state['last_trade'])]
+    if trades.empty:
+        return state
+
+    os.makedirs(get_candles_folder(folder_path), exist_ok=True)
+    # Every resolution is written before any replaces the old file, so a failed write leaves the
+    # store and state as they were and the trades are added again, once, on the next update
+    for resolution in RESOLUTIONS:
+        candles = merge_candles(load_candles(folder_path, resolution), build_candles(trades, resolution))
+        candles.to_parquet(get_candle_path(folder_path, resolution) + '.tmp', index=False)
+    for resolution in RESOLUTIONS:
+        os.replace(get_candle_path(folder_path, resolution) + '.tmp', get_candle_path(folder_path, resolution))
+    state = dict(state, last_trade=trades['timestamp'].iloc[-1].isoformat())
+    print(f"Added {len(trades)} trades to the candles, up to {state['last_trade']}")
+    return state
+
+
+def update_trade_candles(folder_path):
+    """Ingests every hero_trades snapshot saved since the last update. Returns the candles folder."""
+    state = load_candle_state(folder_path)
+    for snapshot, file_path in get_snapshot_files(folder_path, 'hero_trades'):
+        if state['snapshot'] is not None and snapshot <= state['snapshot']:
+            continue
+        try:
+            trades_df = pd.read_csv(file_path, dtype={'hero_id': str})
+        except pd.errors.EmptyDataError:
+            print(f"Warning: File {file_path} is empty. Skipping.")
+            continue
+        state = dict(ingest_trades(folder_path, trades_df, state), snapshot=snapshot)
+        os.makedirs(get_candles_folder(folder_path), exist_ok=True)
+        with open(os.path.join(get_candles_folder(folder_path), CANDLE_STATE_FILE), 'w') as file:
+            json.dump(state, file)
+    return get_candles_folder(folder_path)
+
+
+def price_volatility(candles, bars=None, resolution='1d'):
+    """Standard deviation of the log returns between the closes of each hero and rarity's last bars."""
+    if bars is None:
+        bars = VOLATILITY_BARS[resolution]
+    recent = candles.sort_values(CANDLE_KEYS).groupby(['hero_id', 'rarity']).tail(bars + 1)
+    log_close = np.log(recent['close'].where(recent['close'] > 0))
+    returns = log_close.groupby([recent['hero_id'], recent['rarity']]).diff()
+    grouped = returns.groupby([recent['hero_id'], recent['rarity']])
+    return pd.DataFrame({'Price_Volatility': grouped.std(), 'Volatility_Bars': grouped.count()}).reset_index()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # python trade_candles.py --benchmark times building and updating the bars of synthetic trades
+    if '--benchmark' in sys.argv:
+        rng = np.random.default_rng(0)
+        n_trades = 200000
+        timestamps = pd.Timestamp('2024-06-01', tz='UTC') + pd.to_timedelta(np.sort(rng.uniform(0, 90 * 86400, n_trades)), unit='s')
+        trades = pd.DataFrame({'hero_id': rng.integers(1000, 2000, n_trades).astype(str), 'rarity': rng.integers(1, 5, n_trades),
+                               'timestamp': timestamps, 'price': rng.gamma(2, 0.02, n_trades)})
+        old, new = trades.iloc[:-2000], trades.iloc[-2000:]
+        start = time.perf_counter()
+        candles = {resolution: build_candles(old, resolution) for resolution in RESOLUTIONS}
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for resolution in RESOLUTIONS:
+            candles[resolution] = merge_candles(candles[resolution], build_candles(new, resolution))
+        merge_time = time.perf_counter() - start
+        print(f"{len(old)} trades to {sum(len(c) for c in candles.values())} bars in {build_time * 1000:.0f} ms, "
+              f"{len(new)} more merged in {merge_time * 1000:.0f} ms")
+    else:
+        print(f"Candles saved to {update_trade_candles(os.getenv('DATA_FOLDER', 'data'))}")
@@ -0,0 +1,93 @@
+import os
+import heapq
+import threading
+from datetime import datetime
+import feedparser
+
+# Seconds between feed refreshes
+DEFAULT_TTL = int(os.getenv("TWEET_FEED_TTL", "300"))
+
+
+def is_tweet_url(url):
+    return "twitter.com" in url or "x.com" in url
+
+
+class TweetFeed:
+    """Merged list of tweet URLs from several RSS feeds, newest first.
+
+    A background thread refreshes the feeds every ttl seconds, so readers get the cached list
+    immediately instead of waiting on the feed servers. Feeds can be URLs or local files
+    (anything feedparser.parse accepts).
+    """
+
+    def __init__(self, feed_urls, ttl=DEFAULT_TTL, parse=feedparser.parse):
+        self.feed_urls = list(feed_urls)
+        self.ttl = ttl
+        self.parse = parse
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._seen_urls = set()
+        self._tweets = []  # (published, url), newest first
+        self._validators = {}  # feed_url -> (etag, modified) for conditional requests
+        self._stop = threading.Event()
+        self._thread = None
+
+    def fetch_feed(self, feed_url):
+        """Returns the tweets of one feed as (published, url), or [] if it is unchanged or unavailable."""
+        etag, modified = self._validators.get(feed_url, (None, None))
+        try:
+            feed = self.parse(feed_url, etag=etag, modified=modified)
+        except Exception as e:
+            print(f"Error fetching feed {feed_url}: {e}")
+            return []
+        if feed.get('status') == 304:
+            return []
+        self._validators[feed_url] = (feed.get('etag'), feed.get('modified'))
+
+        tweets = []
+        for entry in feed.entries:
+            url = entry.get('link', '')
+            published = entry.get('published_parsed') or entry.get('updated_parsed')
+            if is_tweet_url(url) and published:
+                tweets.append((datetime(*published[:6]), url))
+        return tweets
+
+    def refresh(self):
+        """Fetches all feeds once and merges any tweets not seen before into the list."""
+        new_tweets = {}
+        for feed_url in self.feed_urls:
+            for published, url in self.fetch_feed(feed_url):
+                if url not in self._seen_urls and url not in new_tweets:
+                    new_tweets[url] = published
+
+        if new_tweets:
+            new_sorted = sorted(((published, url) for url, published in new_tweets.items()), reverse=True)
+            with self._lock:
+                # Both lists are already sorted, so a single merge pass keeps the order
+                self._tweets = list(heapq.merge(self._tweets, new_sorted, reverse=True))
+                self._seen_urls.update(new_tweets)
+        self.last_refresh = datetime.now()
+        return len(new_tweets)
+
+    def get_tweet_urls(self, count=None):
+        with self._lock:
+            tweets = self._tweets if count is None else self._tweets[:count]
+            return [url for _, url in tweets]
+
+    def run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.ttl)
+
+    def start(self):
+        """Starts refreshing in a background thread (the first refresh happens straight away)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="tweet-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Update jobs run at the same time in threads (they spend their time waiting on the API), as many as the
+# DAG allows. Every API request goes through one shared RequestBudget, so running jobs side by side does
+# not multiply the request rate.
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "4"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "4"))
+MAX_REQUESTS_PER_SECOND = float(os.getenv("MAX_REQUESTS_PER_SECOND", "5"))
+# Resources only one job can hold at a time; any other resource is shared
+RESOURCE_LIMITS = {'driver': 1}
+# Seconds between checks for cancellation while jobs are running
+CANCEL_POLL_INTERVAL = 1
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class RequestBudget:
+    """Limits the requests in flight and spaces them out to at most per_second, across all threads.
+
+    Used as a context manager around each request."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_REQUESTS, per_second=MAX_REQUESTS_PER_SECOND):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._interval = 1 / per_second if per_second > 0 else 0
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def __enter__(self):
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._slots.release()
+        return False
+
+
+class UpdateJob:
+    """A single data update.
+
+    func is called as func(session), where session is a dict shared by the jobs of a run (e.g. the
+    driver and token). deps are jobs that must succeed first and are added to a run automatically;
+    after are jobs that only go first if they are part of the same run. resources are what the
+    job uses while it runs, e.g. 'driver', which only one job may hold at a time.
+    """
+
+    def __init__(self, name, func, deps=(), after=(), resources=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.after = list(after)
+        self.resources = list(resources)
+
+
+class UpdateScheduler:
+    """Runs a DAG of update jobs, starting each one as soon as its predecessors and resources allow."""
+
+    def __init__(self, jobs, max_workers=UPDATE_WORKERS, resource_limits=None):
+        self.jobs = {}
+        for job in jobs:
+            for dep in job.deps + job.after:
+                if dep not in self.jobs:
+                    raise KeyError(f"Job '{job.name}' depends on unknown job '{dep}'")
+            self.jobs[job.name] = job
+        self.max_workers = max_workers
+        self.resource_limits = dict(RESOURCE_LIMITS if resource_limits is None else resource_limits)
+
+    def plan(self, targets):
+        """The targets plus every job they depend on, in the order the jobs were declared."""
+        selected = set()
+
+        def add(name):
+            if name not in self.jobs:
+                raise KeyError(f"Unknown job '{name}'")
+            if name not in selected:
+                selected.add(name)
+                for dep in self.jobs[name].deps:
+                    add(dep)
+
+        for name in targets:
+            add(name)
+        # Jobs are declared after their predecessors, so declaration order is a valid order
+        return [name for name in self.jobs if name in selected]
+
+    def predecessors(self, name, planned):
+        job = self.jobs[name]
+        return job.deps + [other for other in job.after if other in planned]
+
+    def run(self, targets, session=None, on_start=None, on_finish=None, is_cancelled=None):
+        """Runs the targets and their dependencies. Returns the names of the jobs that ran.
+
+        A failed job skips the jobs that depend on it, while the rest carry on; the failures are
+        raised together at the end. If is_cancelled() turns true, no more jobs are started and
+        JobCancelled is raised once the running ones finish."""
+        session = {} if session is None else session
+        planned = self.plan(targets)
+        pending = list(planned)
+        succeeded, failed, skipped = [], {}, []
+        in_use = {}
+
+        def can_start(name):
+            job = self.jobs[name]
+            # An 'after' job only orders the two, so it counts once it has finished either way
+            ended = set(succeeded) | set(failed) | set(skipped)
+            if any(dep not in succeeded for dep in job.deps) or any(dep not in ended for dep in self.predecessors(name, planned)):
+                return False
+            return all(in_use.get(resource, 0) < self.resource_limits.get(resource, float('inf')) for resource in job.resources)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            cancelled = False
+            while pending or running:
+                if not cancelled and is_cancelled is not None and is_cancelled():
+                    cancelled = True
+                    pending = []
+
+                # Jobs whose prerequisites failed or were skipped can never run
+                blocked = [name for name in pending if any(dep in failed or dep in skipped for dep in self.jobs[name].deps)]
+                while blocked:
+                    for name in blocked:
+                        print(f"Job {name}: skipped")
+                        skipped.append(name)
+                        pending.remove(name)
+                    blocked = [name for name in pending if any(dep in skipped for dep in self.jobs[name].deps)]
+
+                for name in list(pending):
+                    if len(running) >= self.max_workers or not can_start(name):
+                        continue
+                    job = self.jobs[name]
+                    for resource in job.resources:
+                        in_use[resource] = in_use.get(resource, 0) + 1
+                    print(f"Job {name}: running")
+                    if on_start is not None:
+                        on_start(name)
+                    running[executor.submit(job.func, session)] = name
+                    pending.remove(name)
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Jobs cannot be scheduled: {pending}")
+                    break
+                done, _ = wait(running, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    for resource in self.jobs[name].resources:
+                        in_use[resource] -= 1
+                    try:
+                        future.result()
+                        print(f"Job {name}: done")
+                        succeeded.append(name)
+                    except Exception as e:
+                        print(f"Job {name}: failed: {e}")
+                        failed[name] = e
+                    if on_finish is not None:
+                        on_finish(name)
+
+        if cancelled:
+            raise JobCancelled()
+        if failed:
+            raise RuntimeError("; ".join(f"{name}: {error}" for name, error in failed.items()))
+        return succeeded